@@ -0,0 +1,245 @@
+"""
+Acumulados mensais de arrecadação (somas de prefixo por CNPJ)
+
+Cada linha de ArrecadacaoAcumulada guarda o total de ISS e de IPTU+taxas
+recolhido por um CNPJ desde o primeiro registro até o mês `mes_indice`
+(ano * 12 + mês - 1). O total de qualquer período é a diferença entre
+duas linhas. O ISS entra no mês de competência (mes_ref) e o IPTU no
+mês de janeiro do ano de referência.
+"""
+import logging
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+from itertools import accumulate
+
+import numpy as np
+import pandas as pd
+from django.db import transaction
+from django.db.models import DecimalField, OuterRef, Subquery, Sum
+
+from .models import Empresa, ArrecadacaoISS, ArrecadacaoIPTU, ArrecadacaoAcumulada
+
+logger = logging.getLogger(__name__)
+
+ZERO = Decimal('0.00')
+
+# Fim de período aberto (sem data limite)
+FIM_INDEFINIDO = date.max
+
+# CNPJs reconstruídos por transação em atualizar_acumulados
+CNPJS_POR_GRUPO = 200
+
+# Chave composta (CNPJ, mês) usada nas buscas vetorizadas
+_FATOR_CHAVE = 10 ** 6
+
+
+def indice_mes(data):
+    """Índice sequencial do mês de uma data"""
+    return data.year * 12 + data.month - 1
+
+
+def intervalo_iss(periodo_inicio, periodo_fim):
+    """
+    Primeiro e último índice de competência de ISS dentro do período.
+    A competência é o dia 1 do mês, então um período que começa depois
+    do dia 1 não inclui o próprio mês de início.
+    """
+    inicio = indice_mes(periodo_inicio) + (1 if periodo_inicio.day > 1 else 0)
+    return inicio, indice_mes(periodo_fim)
+
+
+def intervalo_iptu(periodo_inicio, periodo_fim):
+    """Primeiro e último índice dos anos de IPTU dentro do período"""
+    return periodo_inicio.year * 12, periodo_fim.year * 12 + 11
+
+
+def montar_acumulados(linhas_iss, linhas_iptu):
+    """
+    Monta as somas de prefixo a partir de (cnpj, mes_indice, valor) de ISS
+    e de IPTU+taxas. Retorna {cnpj: [(mes_indice, iss_acumulado, iptu_acumulado), ...]}
+    """
+    mensal = defaultdict(lambda: defaultdict(lambda: [ZERO, ZERO]))
+    for cnpj, mes_indice, valor in linhas_iss:
+        mensal[cnpj][mes_indice][0] += valor or ZERO
+    for cnpj, mes_indice, valor in linhas_iptu:
+        mensal[cnpj][mes_indice][1] += valor or ZERO
+
+    acumulados = {}
+    for cnpj, meses in mensal.items():
+        indices = sorted(meses)
+        iss = accumulate(meses[i][0] for i in indices)
+        iptu = accumulate(meses[i][1] for i in indices)
+        acumulados[cnpj] = list(zip(indices, iss, iptu))
+    return acumulados
+
+
+def atualizar_acumulados(cnpjs=None):
+    """
+    Reconstrói os acumulados dos CNPJs informados (todos se None), em
+    grupos de CNPJs para limitar a memória usada
+    """
+    if cnpjs is None:
+        cnpjs = Empresa.objects.order_by('cnpj').values_list('cnpj', flat=True)
+    cnpjs = sorted({cnpj for cnpj in cnpjs if cnpj})
+
+    total = 0
+    for inicio in range(0, len(cnpjs), CNPJS_POR_GRUPO):
+        total += _reconstruir_acumulados(cnpjs[inicio:inicio + CNPJS_POR_GRUPO])
+    return total
+
+
+def _reconstruir_acumulados(cnpjs):
+    iss = ArrecadacaoISS.objects.filter(empresa_id__in=cnpjs)
+    iptu = ArrecadacaoIPTU.objects.filter(empresa_id__in=cnpjs)
+
+    linhas_iss = (
+        (cnpj, indice_mes(mes_ref), valor)
+        for cnpj, mes_ref, valor in iss.order_by().values_list('empresa_id', 'mes_ref', 'valor_iss')
+    )
+    linhas_iptu = (
+        (cnpj, ano_ref * 12, (valor_iptu or ZERO) + (valor_taxas or ZERO))
+        for cnpj, ano_ref, valor_iptu, valor_taxas in iptu.order_by().values_list(
+            'empresa_id', 'ano_ref', 'valor_iptu', 'valor_taxas'
+        )
+    )
+    acumulados = montar_acumulados(linhas_iss, linhas_iptu)
+
+    novos = [
+        ArrecadacaoAcumulada(
+            empresa_id=cnpj,
+            mes_indice=mes_indice,
+            iss_acumulado=iss_acumulado,
+            iptu_acumulado=iptu_acumulado
+        )
+        for cnpj, linhas in acumulados.items()
+        for mes_indice, iss_acumulado, iptu_acumulado in linhas
+    ]
+
+    with transaction.atomic():
+        ArrecadacaoAcumulada.objects.filter(empresa_id__in=cnpjs).delete()
+        ArrecadacaoAcumulada.objects.bulk_create(novos, batch_size=1000)
+
+    return len(novos)
+
+
+def _acumulado_ate(campo, limite):
+    """Subquery com o acumulado da última linha até o índice `limite`"""
+    return Subquery(
+        ArrecadacaoAcumulada.objects.filter(
+            empresa=OuterRef('cnpj'),
+            mes_indice__lte=limite
+        ).order_by('-mes_indice').values(campo)[:1],
+        output_field=DecimalField(max_digits=18, decimal_places=2)
+    )
+
+
+def totais_periodo(cnpj, periodo_inicio, periodo_fim):
+    """
+    Total de ISS e de IPTU+taxas de um CNPJ no período, com uma única
+    consulta que lê no máximo quatro linhas de acumulados
+    """
+    iss_inicio, iss_fim = intervalo_iss(periodo_inicio, periodo_fim)
+    iptu_inicio, iptu_fim = intervalo_iptu(periodo_inicio, periodo_fim)
+
+    linha = Empresa.objects.filter(cnpj=cnpj).annotate(
+        iss_ate_fim=_acumulado_ate('iss_acumulado', iss_fim),
+        iss_antes_inicio=_acumulado_ate('iss_acumulado', iss_inicio - 1),
+        iptu_ate_fim=_acumulado_ate('iptu_acumulado', iptu_fim),
+        iptu_antes_inicio=_acumulado_ate('iptu_acumulado', iptu_inicio - 1),
+    ).values('iss_ate_fim', 'iss_antes_inicio', 'iptu_ate_fim', 'iptu_antes_inicio').first()
+
+    if not linha:
+        return {'iss': ZERO, 'iptu': ZERO}
+
+    iss = ZERO
+    if iss_fim >= iss_inicio:
+        iss = (linha['iss_ate_fim'] or ZERO) - (linha['iss_antes_inicio'] or ZERO)
+    iptu = ZERO
+    if iptu_fim >= iptu_inicio:
+        iptu = (linha['iptu_ate_fim'] or ZERO) - (linha['iptu_antes_inicio'] or ZERO)
+
+    return {'iss': iss, 'iptu': iptu}
+
+
+def carregar_acumulados(empresas):
+    """
+    DataFrame com os acumulados dos CNPJs informados (lista ou queryset de
+    CNPJs), ordenado por (cnpj, mes_indice)
+    """
+    linhas = ArrecadacaoAcumulada.objects.filter(empresa_id__in=empresas).order_by(
+        'empresa_id', 'mes_indice'
+    ).values_list('empresa_id', 'mes_indice', 'iss_acumulado', 'iptu_acumulado')
+
+    return pd.DataFrame.from_records(
+        list(linhas),
+        columns=['cnpj', 'mes_indice', 'iss_acumulado', 'iptu_acumulado']
+    )
+
+
+def acumulado_ate(acumulados, cnpjs, limites, campo):
+    """
+    Busca vetorizada do acumulado de `campo` na última linha com
+    mes_indice <= limite, para cada par (cnpj, limite). Retorna um array
+    de Decimal, com zero onde não há linha.
+    """
+    cnpjs = np.asarray(cnpjs, dtype=object)
+    limites = np.asarray(limites, dtype=np.int64)
+    resultado = np.full(len(cnpjs), ZERO, dtype=object)
+    if acumulados.empty or len(cnpjs) == 0:
+        return resultado
+
+    categorias = pd.Index(acumulados['cnpj'].unique())
+    codigo_linhas = categorias.get_indexer(acumulados['cnpj']).astype(np.int64)
+    chaves = codigo_linhas * _FATOR_CHAVE + acumulados['mes_indice'].to_numpy(dtype=np.int64)
+
+    codigo_busca = categorias.get_indexer(pd.Index(cnpjs)).astype(np.int64)
+    posicoes = np.searchsorted(chaves, codigo_busca * _FATOR_CHAVE + limites, side='right') - 1
+    validas = (codigo_busca >= 0) & (posicoes >= 0)
+    validas[validas] = codigo_linhas[posicoes[validas]] == codigo_busca[validas]
+
+    valores = acumulados[campo].to_numpy(dtype=object)
+    resultado[validas] = valores[posicoes[validas]]
+    return resultado
+
+
+def totais_periodos(acumulados, cnpjs, periodos_inicio, periodos_fim):
+    """
+    Versão vetorizada de totais_periodo para vários (cnpj, período).
+    Retorna dois arrays de Decimal: ISS e IPTU+taxas.
+    """
+    inicio = pd.to_datetime(pd.Series(periodos_inicio))
+    fim = pd.to_datetime(pd.Series(periodos_fim))
+    mes_inicio = (inicio.dt.year * 12 + inicio.dt.month - 1).to_numpy(dtype=np.int64)
+    mes_fim = (fim.dt.year * 12 + fim.dt.month - 1).to_numpy(dtype=np.int64)
+
+    iss_inicio = mes_inicio + (inicio.dt.day > 1).to_numpy(dtype=np.int64)
+    iss_fim = mes_fim
+    iptu_inicio = inicio.dt.year.to_numpy(dtype=np.int64) * 12
+    iptu_fim = fim.dt.year.to_numpy(dtype=np.int64) * 12 + 11
+
+    iss = (
+        acumulado_ate(acumulados, cnpjs, iss_fim, 'iss_acumulado')
+        - acumulado_ate(acumulados, cnpjs, iss_inicio - 1, 'iss_acumulado')
+    )
+    iss[iss_fim < iss_inicio] = ZERO
+    iptu = (
+        acumulado_ate(acumulados, cnpjs, iptu_fim, 'iptu_acumulado')
+        - acumulado_ate(acumulados, cnpjs, iptu_inicio - 1, 'iptu_acumulado')
+    )
+    iptu[iptu_fim < iptu_inicio] = ZERO
+    return iss, iptu
+
+
+def total_acumulado_empresas(empresas):
+    """Total histórico de ISS e IPTU+taxas (última linha de cada CNPJ)"""
+    ultimas = ArrecadacaoAcumulada.objects.filter(
+        empresa_id__in=empresas,
+        mes_indice=Subquery(
+            ArrecadacaoAcumulada.objects.filter(
+                empresa=OuterRef('empresa')
+            ).order_by('-mes_indice').values('mes_indice')[:1]
+        )
+    )
+    totais = ultimas.aggregate(iss=Sum('iss_acumulado'), iptu=Sum('iptu_acumulado'))
+    return {'iss': totais['iss'] or ZERO, 'iptu': totais['iptu'] or ZERO}
@@ -3,6 +3,27 @@ from .models import (
     Empresa, Incentivo, ArrecadacaoISS, ArrecadacaoIPTU,
     Contrapartida, Alerta, CalculoImpacto, Auditoria
 )
+from .alteracoes import registrar_alteracao
+
+
+class RegistraAlteracaoAdminMixin:
+    """Propaga as escritas feitas pelo admin para acumulados e cache de impacto"""
+    altera_arrecadacao = True
+    
+    def save_model(self, request, obj, form, change):
+        cnpj_anterior = form.initial.get('empresa') if change else None
+        super().save_model(request, obj, form, change)
+        registrar_alteracao([cnpj_anterior, obj.empresa_id], acumulados=self.altera_arrecadacao)
+    
+    def delete_model(self, request, obj):
+        cnpj = obj.empresa_id
+        super().delete_model(request, obj)
+        registrar_alteracao([cnpj], acumulados=self.altera_arrecadacao)
+    
+    def delete_queryset(self, request, queryset):
+        cnpjs = list(queryset.values_list('empresa_id', flat=True))
+        super().delete_queryset(request, queryset)
+        registrar_alteracao(cnpjs, acumulados=self.altera_arrecadacao)
 
 
 @admin.register(Empresa)
@@ -13,18 +34,19 @@ class EmpresaAdmin(admin.ModelAdmin):
 
 
 @admin.register(Incentivo)
-class IncentivoAdmin(admin.ModelAdmin):
+class IncentivoAdmin(RegistraAlteracaoAdminMixin, admin.ModelAdmin):
     list_display = ['empresa', 'tipo_incentivo', 'data_inicio', 'status']
     list_filter = ['tipo_incentivo', 'status']
+    altera_arrecadacao = False
 
 
 @admin.register(ArrecadacaoISS)
-class ArrecadacaoISSAdmin(admin.ModelAdmin):
+class ArrecadacaoISSAdmin(RegistraAlteracaoAdminMixin, admin.ModelAdmin):
     list_display = ['empresa', 'mes_ref', 'valor_iss']
 
 
 @admin.register(ArrecadacaoIPTU)
-class ArrecadacaoIPTUAdmin(admin.ModelAdmin):
+class ArrecadacaoIPTUAdmin(RegistraAlteracaoAdminMixin, admin.ModelAdmin):
     list_display = ['empresa', 'ano_ref', 'valor_iptu']
 
 
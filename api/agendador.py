@@ -0,0 +1,102 @@
+"""
+Execução periódica das tarefas em segundo plano
+
+Cada tipo de tarefa de AGENDADOR_INTERVALOS_MINUTOS tem uma linha de
+Agendamento com a próxima execução. Para executar, o servidor toma a
+trava da linha com um UPDATE condicional (vencida e sem trava válida),
+então só um servidor executa cada tipo por vez, mesmo com vários
+rodando o comando `agendador`. A trava expira depois de
+TAREFA_TIMEOUT_MINUTOS, caso o servidor seja interrompido. A execução é
+registrada como Tarefa (parametros {'agendada': true}), que guarda o
+início, o fim e o resultado de cada rodada.
+"""
+import logging
+import random
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from . import cache, tarefas
+from .models import Agendamento
+
+logger = logging.getLogger(__name__)
+
+
+def intervalos_configurados():
+    """
+    {tipo: minutos} das tarefas periódicas ligadas, na ordem de execução.
+    O aquecimento do cache fica de fora se o cache não for compartilhado.
+    """
+    intervalos = {tipo: minutos for tipo, minutos in settings.AGENDADOR_INTERVALOS_MINUTOS.items() if minutos > 0}
+    if 'AQUECER_CACHE' in intervalos and not cache.cache_compartilhado():
+        logger.warning("Aquecimento do cache desligado: o cache de impacto não é compartilhado")
+        del intervalos['AQUECER_CACHE']
+    return intervalos
+
+
+def garantir_agendamentos(tipos):
+    """Cria, vencidos desde já, os agendamentos que ainda não existem"""
+    agora = timezone.now()
+    Agendamento.objects.bulk_create(
+        [Agendamento(tipo=tipo, proxima_execucao=agora) for tipo in tipos],
+        ignore_conflicts=True
+    )
+
+
+def adquirir(tipo, dono):
+    """Toma a trava do agendamento se estiver vencido e livre; retorna se conseguiu"""
+    agora = timezone.now()
+    return bool(Agendamento.objects.filter(
+        Q(trava_expira_em__isnull=True) | Q(trava_expira_em__lt=agora),
+        tipo=tipo,
+        proxima_execucao__lte=agora
+    ).update(
+        dono=dono,
+        trava_expira_em=agora + timedelta(minutes=settings.TAREFA_TIMEOUT_MINUTOS)
+    ))
+
+
+def liberar(tipo, dono, minutos, tarefa=None):
+    """Solta a trava e agenda a próxima execução daqui a `minutos` mais o jitter"""
+    atraso = timedelta(minutes=minutos, seconds=random.uniform(0, settings.AGENDADOR_JITTER_SEGUNDOS))
+    campos = {'dono': '', 'trava_expira_em': None, 'proxima_execucao': timezone.now() + atraso}
+    if tarefa is not None:
+        campos['ultima_tarefa'] = tarefa
+    Agendamento.objects.filter(tipo=tipo, dono=dono).update(**campos)
+
+
+def executar_tipo(tipo):
+    """
+    Executa uma rodada do tipo como Tarefa. Se já houver uma tarefa pendente
+    do tipo (enfileirada pela API), ela é executada no lugar; se estiver em
+    execução em outro worker, nada é feito. Retorna a Tarefa executada ou None.
+    """
+    tarefa, _ = tarefas.enfileirar(tipo, {'agendada': True})
+    if not tarefas.reservar(tarefa):
+        return None
+    return tarefas.executar(tarefa)
+
+
+def executar_vencidas():
+    """Executa os tipos com execução vencida cuja trava este servidor obteve; retorna as Tarefas"""
+    intervalos = intervalos_configurados()
+    garantir_agendamentos(intervalos)
+    tarefas.liberar_travadas()
+    dono = tarefas.identificacao_worker()
+
+    executadas = []
+    for tipo, minutos in intervalos.items():
+        if not adquirir(tipo, dono):
+            continue
+        tarefa = None
+        try:
+            tarefa = executar_tipo(tipo)
+        except Exception as e:
+            logger.error(f"Erro no agendamento {tipo}: {str(e)}")
+        finally:
+            liberar(tipo, dono, minutos, tarefa)
+        if tarefa is not None:
+            executadas.append(tarefa)
+    return executadas
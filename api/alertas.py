@@ -0,0 +1,209 @@
+"""
+Regras de alerta avaliadas em conjunto
+
+Cada tipo de alerta é declarado com @regra: severidade, modelo da
+descrição e uma função que monta a consulta com as linhas que disparam o
+alerta (um dict por linha, com 'cnpj' e os campos usados no modelo). A
+consulta cobre todas as empresas de uma vez (ou só os CNPJs informados),
+então uma regra nova custa uma consulta, não uma por empresa. Depois de
+avaliar as regras, os alertas novos de todas elas são gravados com um
+único bulk_create, pulando os que já estão ATIVOS, e os alertas ativos
+que deixaram de disparar são resolvidos com um UPDATE por regra. Uma
+regra pode declarar uma consulta própria para manter o alerta ativo
+(`mantido_por`), quando a condição de resolução é mais estreita que a de
+disparo.
+"""
+import time
+from datetime import datetime, timedelta
+
+from django.db.models import Exists, F, OuterRef, Subquery
+from django.utils import timezone
+
+from .models import Alerta, ArrecadacaoISS, CalculoImpacto, Contrapartida, Empresa, Incentivo
+
+# Janela (em dias) sem ISS recolhido do alerta SEM_RECOLHIMENTO
+DIAS_SEM_RECOLHIMENTO = 90
+
+# Antecedência dos alertas de vencimento de contrapartidas e incentivos
+DIAS_VENCIMENTO = 30
+
+
+class Regra:
+    """Tipo de alerta com a consulta das linhas que o disparam"""
+
+    def __init__(self, tipo_alerta, severidade, descricao, consulta, mantido_por=None):
+        self.tipo_alerta = tipo_alerta
+        self.severidade = severidade
+        self.descricao = descricao
+        self.consulta = consulta
+        # Consulta das empresas cujo alerta ativo não deve ser resolvido (padrão: as que disparam)
+        self.mantido_por = mantido_por or consulta
+
+    def avaliar(self, cnpjs=None, hoje=None):
+        """{cnpj: descrição} das empresas que disparam a regra (a primeira linha de cada uma)"""
+        descricoes = {}
+        for linha in self.consulta(cnpjs, hoje or datetime.now().date()):
+            descricoes.setdefault(linha['cnpj'], self.descricao.format(**linha))
+        return descricoes
+
+
+# Regras registradas, na ordem de declaração
+REGRAS = {}
+
+
+def regra(tipo_alerta, severidade, descricao, mantido_por=None):
+    """Registra a função decorada como consulta do tipo de alerta"""
+    if tipo_alerta not in dict(Alerta.TIPO_CHOICES):
+        raise ValueError(f'Tipo de alerta desconhecido: {tipo_alerta}')
+
+    def registrar(consulta):
+        REGRAS[tipo_alerta] = Regra(tipo_alerta, severidade, descricao, consulta, mantido_por)
+        return consulta
+    return registrar
+
+
+def empresas_com_incentivo_ativo(cnpjs=None):
+    """Empresas com ao menos um incentivo ATIVO (apenas dos CNPJs informados, se houver)"""
+    empresas = Empresa.objects.filter(incentivos__status='ATIVO').distinct()
+    if cnpjs is not None:
+        empresas = empresas.filter(cnpj__in=cnpjs)
+    return empresas
+
+
+def ultimo_calculo(campo):
+    """Subconsulta com o campo do cálculo de impacto mais recente da empresa"""
+    calculos = CalculoImpacto.objects.filter(empresa_id=OuterRef('cnpj')).order_by('-calculado_em', '-periodo_fim')
+    return Subquery(calculos.values(campo)[:1])
+
+
+@regra('BC_BAIXO', 'ALTA', 'Relação B/C abaixo de 1: {bc_ratio:.4f}')
+def bc_baixo(cnpjs, hoje):
+    return empresas_com_incentivo_ativo(cnpjs).annotate(
+        bc_ratio=ultimo_calculo('bc_ratio')
+    ).filter(bc_ratio__lt=1).values('cnpj', 'bc_ratio')
+
+
+@regra('IMPACTO_NEGATIVO', 'CRITICA', 'Impacto líquido negativo: R$ {impacto_liquido:.2f}')
+def impacto_negativo(cnpjs, hoje):
+    return empresas_com_incentivo_ativo(cnpjs).annotate(
+        impacto_liquido=ultimo_calculo('impacto_liquido')
+    ).filter(impacto_liquido__lt=0).values('cnpj', 'impacto_liquido')
+
+
+@regra('SEM_RECOLHIMENTO', 'MEDIA', 'Empresa sem recolhimento de ISS nos últimos 3 meses')
+def sem_recolhimento(cnpjs, hoje):
+    recolhimentos = ArrecadacaoISS.objects.filter(
+        empresa_id=OuterRef('cnpj'),
+        mes_ref__gte=hoje - timedelta(days=DIAS_SEM_RECOLHIMENTO),
+        valor_iss__gt=0
+    )
+    return empresas_com_incentivo_ativo(cnpjs).filter(~Exists(recolhimentos)).values('cnpj')
+
+
+def contrapartidas_pendentes(cnpjs, hoje):
+    """Contrapartidas PENDENTES que vencem em até DIAS_VENCIMENTO dias ou já venceram"""
+    contrapartidas = Contrapartida.objects.filter(
+        status='PENDENTE',
+        data_vencimento__lte=hoje + timedelta(days=DIAS_VENCIMENTO)
+    )
+    if cnpjs is not None:
+        contrapartidas = contrapartidas.filter(incentivo__empresa_id__in=cnpjs)
+    return contrapartidas
+
+
+def contrapartida_pendente(cnpjs, hoje):
+    # O alerta só é resolvido quando a contrapartida deixa de estar PENDENTE, não ao vencer
+    return contrapartidas_pendentes(cnpjs, hoje).values(cnpj=F('incentivo__empresa_id'))
+
+
+@regra(
+    'CONTRAPARTIDA_VENCENDO', 'ALTA', 'Contrapartida vencendo em {data_vencimento}: {descricao}',
+    mantido_por=contrapartida_pendente
+)
+def contrapartida_vencendo(cnpjs, hoje):
+    return contrapartidas_pendentes(cnpjs, hoje).filter(data_vencimento__gte=hoje).order_by(
+        'data_vencimento', 'pk'
+    ).values('data_vencimento', 'descricao', cnpj=F('incentivo__empresa_id'))
+
+
+@regra('INCENTIVO_VENCENDO', 'MEDIA', 'Incentivo {instrumento_legal} vence em {data_fim}')
+def incentivo_vencendo(cnpjs, hoje):
+    incentivos = Incentivo.objects.filter(
+        status='ATIVO',
+        data_fim__gte=hoje,
+        data_fim__lte=hoje + timedelta(days=DIAS_VENCIMENTO)
+    )
+    if cnpjs is not None:
+        incentivos = incentivos.filter(empresa_id__in=cnpjs)
+    return incentivos.order_by('data_fim', 'pk').values(
+        'instrumento_legal', 'data_fim', cnpj=F('empresa_id')
+    )
+
+
+def resolver_alertas(atual, cnpjs=None, hoje=None):
+    """
+    Resolve com um único UPDATE os alertas ATIVOS do tipo da regra cuja
+    condição deixou de ocorrer (fora de `mantido_por`); retorna quantos
+    foram resolvidos
+    """
+    ativos = Alerta.objects.filter(tipo_alerta=atual.tipo_alerta, status='ATIVO')
+    if cnpjs is not None:
+        ativos = ativos.filter(empresa_id__in=cnpjs)
+    mantidos = atual.mantido_por(cnpjs, hoje or datetime.now().date()).values('cnpj')
+    return ativos.exclude(empresa_id__in=mantidos).update(
+        status='RESOLVIDO',
+        resolvido_em=timezone.now(),
+        observacoes='Resolvido automaticamente: a condição do alerta deixou de ocorrer'
+    )
+
+
+def gerar_alertas(cnpjs=None, tipos=None, progresso=None):
+    """
+    Avalia as regras (todas ou só os `tipos` informados), grava os alertas
+    novos e resolve os que deixaram de disparar. Retorna dict com os
+    alertas criados ([{'cnpj', 'tipo'}, ...]), o total de resolvidos e o
+    tempo de cada regra em segundos.
+    `progresso(regras_avaliadas, total_regras)` é chamado ao fim de cada regra.
+    """
+    regras = [REGRAS[tipo] for tipo in (tipos or REGRAS)]
+    hoje = datetime.now().date()
+
+    disparos = []
+    resolvidos = 0
+    tempos = {}
+    for etapa, atual in enumerate(regras, start=1):
+        inicio = time.perf_counter()
+        disparos.extend((atual, cnpj, descricao) for cnpj, descricao in atual.avaliar(cnpjs, hoje).items())
+        resolvidos += resolver_alertas(atual, cnpjs, hoje)
+        tempos[atual.tipo_alerta] = round(time.perf_counter() - inicio, 4)
+        if progresso:
+            progresso(etapa, len(regras))
+
+    ativos = set(Alerta.objects.filter(
+        status='ATIVO', tipo_alerta__in=[atual.tipo_alerta for atual in regras]
+    ).values_list('empresa_id', 'tipo_alerta')) if disparos else set()
+    novos = [
+        Alerta(empresa_id=cnpj, tipo_alerta=atual.tipo_alerta, descricao=descricao, severidade=atual.severidade)
+        for atual, cnpj, descricao in disparos
+        if (cnpj, atual.tipo_alerta) not in ativos
+    ]
+    # Uma geração simultânea pode ter criado o mesmo alerta depois da leitura dos ativos:
+    # a restrição alerta_ativo_unico descarta a cópia
+    Alerta.objects.bulk_create(novos, batch_size=1000, ignore_conflicts=True)
+    if novos:
+        # Só contam os gravados por esta geração: o bulk_create marca data_alerta em cada objeto
+        gravados = set(Alerta.objects.filter(
+            status='ATIVO',
+            tipo_alerta__in={alerta.tipo_alerta for alerta in novos},
+            data_alerta__gte=min(alerta.data_alerta for alerta in novos)
+        ).values_list('empresa_id', 'tipo_alerta', 'data_alerta'))
+        novos = [
+            alerta for alerta in novos
+            if (alerta.empresa_id, alerta.tipo_alerta, alerta.data_alerta) in gravados
+        ]
+
+    return {
+        'alertas': [{'cnpj': alerta.empresa_id, 'tipo': alerta.tipo_alerta} for alerta in novos],
+        'resolvidos': resolvidos,
+        'tempos': tempos,
+    }
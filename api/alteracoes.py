@@ -0,0 +1,34 @@
+"""
+Propagação de escritas em arrecadação e incentivos
+"""
+from django.utils import timezone
+
+from .acumulados import atualizar_acumulados
+from .models import AlteracaoDados
+
+
+def marcar_alteracao(cnpjs):
+    """Grava agora como a última alteração de dados de cada CNPJ"""
+    agora = timezone.now()
+    AlteracaoDados.objects.bulk_create(
+        [AlteracaoDados(cnpj=cnpj, alterado_em=agora) for cnpj in sorted(cnpjs)],
+        update_conflicts=True,
+        unique_fields=['cnpj'],
+        update_fields=['alterado_em'],
+        batch_size=500
+    )
+
+
+def registrar_alteracao(cnpjs, acumulados=True):
+    """
+    Atualiza os dados derivados dos CNPJs alterados: acumulados mensais
+    (quando a alteração é de arrecadação) e marca de alteração, que também
+    é a versão do cache de impacto
+    """
+    cnpjs = {cnpj for cnpj in cnpjs if cnpj}
+    if not cnpjs:
+        return
+
+    if acumulados:
+        atualizar_acumulados(cnpjs)
+    marcar_alteracao(cnpjs)
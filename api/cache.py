@@ -0,0 +1,147 @@
+"""
+Cache de resultados de impacto fiscal
+
+Os resultados ficam no cache `impacto` (settings.CACHES) sob uma chave com
+CNPJ, período e a versão de dados do CNPJ. A versão vem do banco (a
+marca de AlteracaoDados, gravada a cada escrita em ISS, IPTU ou
+incentivos do CNPJ), então todos os processos veem a mesma versão e as
+entradas antigas deixam de ser encontradas em qualquer um deles. Na
+frente do backend fica um LRU limitado em memória, que também usa a
+versão na chave.
+"""
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+
+logger = logging.getLogger(__name__)
+
+ALIAS = 'impacto'
+
+# Marca resultado "sem incentivo ativo" (None) no cache
+_SEM_IMPACTO = '__sem_impacto__'
+
+
+class LRUCache:
+    """Dicionário limitado com descarte do item usado há mais tempo"""
+
+    def __init__(self, max_itens):
+        self.max_itens = max_itens
+        self._itens = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, chave, default=None):
+        with self._lock:
+            if chave not in self._itens:
+                return default
+            self._itens.move_to_end(chave)
+            return self._itens[chave]
+
+    def set(self, chave, valor):
+        with self._lock:
+            self._itens[chave] = valor
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.max_itens:
+                self._itens.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._itens.clear()
+
+    def __len__(self):
+        return len(self._itens)
+
+
+_lru = LRUCache(getattr(settings, 'IMPACTO_CACHE_LRU_MAX', 1024))
+
+
+def _backend():
+    return caches[ALIAS]
+
+
+def cache_compartilhado():
+    """Se o backend do cache de impacto é visto por todos os processos"""
+    return not isinstance(_backend(), (LocMemCache, DummyCache))
+
+
+def _chave_impacto(cnpj, versao, periodo_inicio, periodo_fim):
+    inicio = periodo_inicio.isoformat() if periodo_inicio else 'incentivo'
+    return f'impacto:{cnpj}:{inicio}:{periodo_fim.isoformat()}:v{versao}'
+
+
+def versoes_cnpjs(cnpjs):
+    """
+    Versão atual dos dados de cada CNPJ: o instante da última alteração
+    em microssegundos, ou 0 se os dados nunca foram alterados
+    """
+    from .models import AlteracaoDados
+
+    cnpjs = list(cnpjs)
+    alteracoes = dict(AlteracaoDados.objects.filter(cnpj__in=cnpjs).values_list('cnpj', 'alterado_em'))
+    return {
+        cnpj: int(alteracoes[cnpj].timestamp() * 1_000_000) if cnpj in alteracoes else 0
+        for cnpj in cnpjs
+    }
+
+
+def obter_impacto(cnpj, periodo_inicio=None, periodo_fim=None):
+    """
+    Impacto do CNPJ pelo cache; em caso de falta usa a leitura sem efeitos
+    colaterais da CalculadoraImpactoFiscal e guarda o resultado
+    """
+    from .calculadora import CalculadoraImpactoFiscal
+
+    fim = periodo_fim or datetime.now().date()
+    versao = versoes_cnpjs([cnpj])[cnpj]
+    chave = _chave_impacto(cnpj, versao, periodo_inicio, fim)
+
+    resultado = _lru.get(chave)
+    if resultado is None:
+        resultado = _backend().get(chave)
+        if resultado is not None:
+            _lru.set(chave, resultado)
+
+    if resultado is None:
+        calculo = CalculadoraImpactoFiscal(cnpj).obter_impacto(periodo_inicio, periodo_fim)
+        resultado = _SEM_IMPACTO if calculo is None else calculo
+        _backend().set(chave, resultado)
+        _lru.set(chave, resultado)
+
+    return None if resultado == _SEM_IMPACTO else resultado
+
+
+def aquecer(cnpjs=None):
+    """
+    Preenche o cache com o impacto do período padrão (início do incentivo
+    até hoje) de todas as empresas com incentivo ativo, calculado em lote.
+    Exige um backend compartilhado: com memória local, só o processo que
+    aquece seria beneficiado.
+    """
+    from .calculo_lote import CalculadoraImpactoLote
+
+    if not cache_compartilhado():
+        raise ImproperlyConfigured(
+            'O aquecimento exige um cache de impacto compartilhado entre os processos '
+            '(IMPACTO_CACHE_BACKEND); o backend atual é local de cada processo'
+        )
+
+    lote = CalculadoraImpactoLote(cnpjs=cnpjs)
+    resultados = CalculadoraImpactoLote.para_dicts(lote.calcular())
+    versoes = versoes_cnpjs([resultado['cnpj'] for resultado in resultados])
+
+    entradas = {
+        _chave_impacto(resultado['cnpj'], versoes[resultado['cnpj']], None, lote.periodo_fim): resultado
+        for resultado in resultados
+    }
+    _backend().set_many(entradas)
+    for chave, resultado in entradas.items():
+        _lru.set(chave, resultado)
+
+    logger.info(f"Cache de impacto aquecido para {len(entradas)} empresas")
+    return len(entradas)
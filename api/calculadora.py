@@ -1,25 +1,46 @@
 from decimal import Decimal
-from datetime import datetime
-from django.db.models import Sum
-from .models import Incentivo, ArrecadacaoISS, ArrecadacaoIPTU, CalculoImpacto
+from datetime import datetime, timedelta
+from django.db.models import Exists, OuterRef
+from .models import Incentivo, CalculoImpacto, ArrecadacaoAcumulada, AlteracaoDados
+from .acumulados import totais_periodo, intervalo_iss, intervalo_iptu
+
+
+class ContextoCalculo:
+    """
+    Agregados de arrecadação de um CNPJ já consultados, por período.
+    Pode ser compartilhado entre calculadoras do mesmo CNPJ para avaliar
+    vários incentivos ou períodos sem repetir consultas.
+    """
+    
+    def __init__(self, cnpj):
+        self.cnpj = cnpj
+        self._totais = {}
+    
+    def totais(self, periodo_inicio, periodo_fim):
+        """Totais de ISS e IPTU+taxas do período, consultados uma única vez"""
+        # Períodos que cobrem os mesmos meses de ISS e anos de IPTU têm os mesmos totais
+        chave = (intervalo_iss(periodo_inicio, periodo_fim), intervalo_iptu(periodo_inicio, periodo_fim))
+        if chave not in self._totais:
+            self._totais[chave] = totais_periodo(self.cnpj, periodo_inicio, periodo_fim)
+        return self._totais[chave]
 
 
 class CalculadoraImpactoFiscal:
     """Classe para cálculos de impacto fiscal"""
     
-    def __init__(self, cnpj):
+    def __init__(self, cnpj, contexto=None):
+        if contexto is not None and contexto.cnpj != cnpj:
+            raise ValueError(f'Contexto de cálculo pertence ao CNPJ {contexto.cnpj}, não a {cnpj}')
         self.cnpj = cnpj
+        self.contexto = contexto or ContextoCalculo(cnpj)
         
     def calcular_custo_fiscal(self, incentivo, periodo_inicio, periodo_fim):
         """Calcula o Custo Fiscal (CF) - renúncia fiscal total"""
         custo_total = Decimal('0.00')
+        totais = self.contexto.totais(periodo_inicio, periodo_fim)
         
         if 'ISS' in incentivo.tipo_incentivo or incentivo.tipo_incentivo == 'MISTO':
-            iss_periodo = ArrecadacaoISS.objects.filter(
-                empresa__cnpj=self.cnpj,
-                mes_ref__gte=periodo_inicio,
-                mes_ref__lte=periodo_fim
-            ).aggregate(total=Sum('valor_iss'))['total'] or Decimal('0.00')
+            iss_periodo = totais['iss']
             
             if incentivo.percentual_desconto:
                 custo_total += iss_periodo * (incentivo.percentual_desconto / 100)
@@ -28,16 +49,7 @@ class CalculadoraImpactoFiscal:
                 custo_total += incentivo.valor_fixo_desconto * meses
         
         if 'IPTU' in incentivo.tipo_incentivo or incentivo.tipo_incentivo in ['MISTO', 'TERRENO_GRATUITO']:
-            iptu_periodo = ArrecadacaoIPTU.objects.filter(
-                empresa__cnpj=self.cnpj,
-                ano_ref__gte=periodo_inicio.year,
-                ano_ref__lte=periodo_fim.year
-            ).aggregate(
-                total_iptu=Sum('valor_iptu'),
-                total_taxas=Sum('valor_taxas')
-            )
-            
-            iptu_total = (iptu_periodo['total_iptu'] or Decimal('0.00')) + (iptu_periodo['total_taxas'] or Decimal('0.00'))
+            iptu_total = totais['iptu']
             
             if incentivo.percentual_desconto:
                 custo_total += iptu_total * (incentivo.percentual_desconto / 100)
@@ -51,32 +63,17 @@ class CalculadoraImpactoFiscal:
         """Calcula a Arrecadação Incremental (AI)"""
         arrecadacao_atual = Decimal('0.00')
         baseline_total = Decimal('0.00')
+        totais = self.contexto.totais(periodo_inicio, periodo_fim)
         
         if 'ISS' in incentivo.tipo_incentivo or incentivo.tipo_incentivo == 'MISTO':
-            iss_atual = ArrecadacaoISS.objects.filter(
-                empresa__cnpj=self.cnpj,
-                mes_ref__gte=periodo_inicio,
-                mes_ref__lte=periodo_fim
-            ).aggregate(total=Sum('valor_iss'))['total'] or Decimal('0.00')
-            
-            arrecadacao_atual += iss_atual
+            arrecadacao_atual += totais['iss']
             
             if incentivo.baseline_iss_12m:
                 meses = (periodo_fim.year - periodo_inicio.year) * 12 + (periodo_fim.month - periodo_inicio.month) + 1
                 baseline_total += (incentivo.baseline_iss_12m / 12) * meses
         
         if 'IPTU' in incentivo.tipo_incentivo or incentivo.tipo_incentivo in ['MISTO', 'TERRENO_GRATUITO']:
-            iptu_atual = ArrecadacaoIPTU.objects.filter(
-                empresa__cnpj=self.cnpj,
-                ano_ref__gte=periodo_inicio.year,
-                ano_ref__lte=periodo_fim.year
-            ).aggregate(
-                total_iptu=Sum('valor_iptu'),
-                total_taxas=Sum('valor_taxas')
-            )
-            
-            iptu_total = (iptu_atual['total_iptu'] or Decimal('0.00')) + (iptu_atual['total_taxas'] or Decimal('0.00'))
-            arrecadacao_atual += iptu_total
+            arrecadacao_atual += totais['iptu']
             
             if incentivo.baseline_iptu_12m:
                 anos = periodo_fim.year - periodo_inicio.year + 1
@@ -84,9 +81,14 @@ class CalculadoraImpactoFiscal:
         
         return arrecadacao_atual - baseline_total
     
-    def calcular_impacto_completo(self, periodo_inicio=None, periodo_fim=None):
+    def obter_incentivo_ativo(self):
+        """Incentivo ativo considerado nos cálculos do CNPJ"""
+        return Incentivo.objects.filter(empresa__cnpj=self.cnpj, status='ATIVO').order_by('-data_inicio', 'pk').first()
+    
+    def calcular_impacto_completo(self, periodo_inicio=None, periodo_fim=None, persistir=True, incentivo=None):
         """Calcula todos os indicadores de impacto fiscal"""
-        incentivo = Incentivo.objects.filter(empresa__cnpj=self.cnpj, status='ATIVO').first()
+        if incentivo is None:
+            incentivo = self.obter_incentivo_ativo()
         
         if not incentivo:
             return None
@@ -101,25 +103,26 @@ class CalculadoraImpactoFiscal:
         impacto_liquido = arrecadacao_incremental - custo_fiscal
         bc_ratio = arrecadacao_incremental / custo_fiscal if custo_fiscal > 0 else Decimal('0.00')
         
-        if arrecadacao_incremental > 0:
-            meses_periodo = (periodo_fim.year - periodo_inicio.year) * 12 + (periodo_fim.month - periodo_inicio.month) + 1
+        meses_periodo = (periodo_fim.year - periodo_inicio.year) * 12 + (periodo_fim.month - periodo_inicio.month) + 1
+        if arrecadacao_incremental > 0 and meses_periodo > 0:
             arrecadacao_mensal = arrecadacao_incremental / meses_periodo
             payback_meses = int(custo_fiscal / arrecadacao_mensal) if arrecadacao_mensal > 0 else None
         else:
             payback_meses = None
         
-        calculo, created = CalculoImpacto.objects.update_or_create(
-            empresa=incentivo.empresa,
-            periodo_inicio=periodo_inicio,
-            periodo_fim=periodo_fim,
-            defaults={
-                'custo_fiscal': custo_fiscal,
-                'arrecadacao_incremental': arrecadacao_incremental,
-                'impacto_liquido': impacto_liquido,
-                'bc_ratio': bc_ratio,
-                'payback_meses': payback_meses
-            }
-        )
+        if persistir:
+            calculo, created = CalculoImpacto.objects.update_or_create(
+                empresa_id=incentivo.empresa_id,
+                periodo_inicio=periodo_inicio,
+                periodo_fim=periodo_fim,
+                defaults={
+                    'custo_fiscal': custo_fiscal,
+                    'arrecadacao_incremental': arrecadacao_incremental,
+                    'impacto_liquido': impacto_liquido,
+                    'bc_ratio': bc_ratio,
+                    'payback_meses': payback_meses
+                }
+            )
         
         return {
             'cnpj': self.cnpj,
@@ -131,3 +134,66 @@ class CalculadoraImpactoFiscal:
             'periodo_inicio': periodo_inicio,
             'periodo_fim': periodo_fim
         }
+    
+    def obter_calculo_valido(self, incentivo, periodo_inicio, periodo_fim):
+        """
+        Último CalculoImpacto gravado que ainda vale para o período: mesmo início,
+        fim no mesmo mês (mesmos meses de ISS e anos de IPTU) e calculado depois
+        da última alteração de incentivos ou arrecadação do CNPJ (inclusive
+        exclusões, pela marca de AlteracaoDados)
+        """
+        inicio_mes = periodo_fim.replace(day=1)
+        fim_mes = (inicio_mes + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+        
+        return CalculoImpacto.objects.filter(
+            empresa_id=incentivo.empresa_id,
+            periodo_inicio=periodo_inicio,
+            periodo_fim__gte=inicio_mes,
+            periodo_fim__lte=fim_mes
+        ).exclude(
+            Exists(Incentivo.objects.filter(
+                empresa=OuterRef('empresa'),
+                updated_at__gt=OuterRef('calculado_em')
+            ))
+        ).exclude(
+            Exists(ArrecadacaoAcumulada.objects.filter(
+                empresa=OuterRef('empresa'),
+                atualizado_em__gt=OuterRef('calculado_em')
+            ))
+        ).exclude(
+            # Apagar toda a arrecadação do CNPJ remove os acumulados: só a marca registra
+            Exists(AlteracaoDados.objects.filter(
+                cnpj=OuterRef('empresa_id'),
+                alterado_em__gt=OuterRef('calculado_em')
+            ))
+        ).order_by('-periodo_fim', '-calculado_em').first()
+    
+    def obter_impacto(self, periodo_inicio=None, periodo_fim=None):
+        """
+        Leitura sem efeitos colaterais: devolve o último cálculo gravado se
+        ainda for válido, senão calcula em memória sem gravar
+        """
+        incentivo = self.obter_incentivo_ativo()
+        
+        if not incentivo:
+            return None
+        
+        if not periodo_inicio:
+            periodo_inicio = incentivo.data_inicio
+        if not periodo_fim:
+            periodo_fim = datetime.now().date()
+        
+        calculo = self.obter_calculo_valido(incentivo, periodo_inicio, periodo_fim)
+        if calculo is None:
+            return self.calcular_impacto_completo(periodo_inicio, periodo_fim, persistir=False, incentivo=incentivo)
+        
+        return {
+            'cnpj': self.cnpj,
+            'custo_fiscal': float(calculo.custo_fiscal),
+            'arrecadacao_incremental': float(calculo.arrecadacao_incremental),
+            'impacto_liquido': float(calculo.impacto_liquido),
+            'bc_ratio': float(calculo.bc_ratio),
+            'payback_meses': calculo.payback_meses,
+            'periodo_inicio': calculo.periodo_inicio,
+            'periodo_fim': calculo.periodo_fim
+        }
@@ -0,0 +1,370 @@
+"""
+Cálculo de impacto fiscal em lote (vetorizado)
+"""
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from decimal import Decimal
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+
+from .models import Incentivo, CalculoImpacto
+from .acumulados import carregar_acumulados, totais_periodos, indice_mes
+from .workers import inicializar as inicializar_worker, calcular_bloco
+
+logger = logging.getLogger(__name__)
+
+ZERO = Decimal('0.00')
+
+
+def _decimais(serie):
+    """
+    Converte uma série em array de Decimal, trocando nulos por zero
+    """
+    return np.array([ZERO if v is None or pd.isna(v) else v for v in serie], dtype=object)
+
+
+class CalculadoraImpactoLote:
+    """
+    Calcula CF, AI, B/C e payback de todas as empresas com incentivo ativo
+    de uma só vez, com as mesmas fórmulas da CalculadoraImpactoFiscal
+    """
+
+    def __init__(self, cnpjs=None, periodo_fim=None):
+        self.cnpjs = list(cnpjs) if cnpjs is not None else None
+        self.periodo_fim = periodo_fim or datetime.now().date()
+        self.erros = []
+
+    def carregar_incentivos(self):
+        """Um incentivo ativo por CNPJ, o mesmo escolhido pela calculadora individual"""
+        incentivos = Incentivo.objects.filter(status='ATIVO')
+        if self.cnpjs is not None:
+            incentivos = incentivos.filter(empresa_id__in=self.cnpjs)
+
+        df = pd.DataFrame.from_records(
+            incentivos.order_by('empresa_id', '-data_inicio', 'pk').values(
+                'empresa_id', 'tipo_incentivo', 'percentual_desconto',
+                'valor_fixo_desconto', 'baseline_iss_12m', 'baseline_iptu_12m',
+                'data_inicio'
+            ),
+            columns=[
+                'empresa_id', 'tipo_incentivo', 'percentual_desconto',
+                'valor_fixo_desconto', 'baseline_iss_12m', 'baseline_iptu_12m',
+                'data_inicio'
+            ]
+        )
+        df = df.drop_duplicates('empresa_id', keep='first')
+        df = df.rename(columns={'empresa_id': 'cnpj', 'data_inicio': 'periodo_inicio'})
+        df['periodo_fim'] = self.periodo_fim
+        return df.reset_index(drop=True)
+
+    def carregar_arrecadacao(self, df):
+        """Totais de ISS e IPTU+taxas do período de cada incentivo, lidos dos acumulados mensais"""
+        if self.cnpjs is not None:
+            empresas = self.cnpjs
+        else:
+            empresas = Incentivo.objects.filter(status='ATIVO').values('empresa_id')
+
+        acumulados = carregar_acumulados(empresas)
+        iss, iptu = totais_periodos(acumulados, df['cnpj'], df['periodo_inicio'], df['periodo_fim'])
+
+        df = df.copy()
+        df['iss_periodo'] = iss
+        df['iptu_periodo'] = iptu
+        return df
+
+    @staticmethod
+    def calcular_indicadores(df):
+        """
+        Aplica as fórmulas de CF, AI, IL, B/C e payback linha a linha sobre
+        arrays de Decimal, reproduzindo exatamente a calculadora individual
+        """
+        n = len(df)
+        resultado = df.copy()
+        if n == 0:
+            for coluna in ['custo_fiscal', 'arrecadacao_incremental', 'impacto_liquido', 'bc_ratio', 'payback_meses']:
+                resultado[coluna] = pd.Series(dtype=object)
+            return resultado
+
+        tipo = df['tipo_incentivo'].astype(str)
+        incide_iss = (tipo.str.contains('ISS') | (tipo == 'MISTO')).to_numpy()
+        incide_iptu = (tipo.str.contains('IPTU') | tipo.isin(['MISTO', 'TERRENO_GRATUITO'])).to_numpy()
+
+        inicio = pd.to_datetime(df['periodo_inicio'])
+        fim = pd.to_datetime(df['periodo_fim'])
+        meses = ((fim.dt.year - inicio.dt.year) * 12 + (fim.dt.month - inicio.dt.month) + 1).to_numpy().astype(object)
+        anos = (fim.dt.year - inicio.dt.year + 1).to_numpy().astype(object)
+
+        percentual = _decimais(df['percentual_desconto'])
+        valor_fixo = _decimais(df['valor_fixo_desconto'])
+        baseline_iss = _decimais(df['baseline_iss_12m'])
+        baseline_iptu = _decimais(df['baseline_iptu_12m'])
+        iss = _decimais(df['iss_periodo'])
+        iptu = _decimais(df['iptu_periodo'])
+
+        tem_percentual = percentual != ZERO
+        tem_valor_fixo = valor_fixo != ZERO
+
+        # Custo Fiscal (CF)
+        custo_fiscal = np.full(n, ZERO, dtype=object)
+        desconto_iss = np.where(tem_percentual, iss * (percentual / 100), valor_fixo * meses)
+        custo_fiscal = np.where(incide_iss & (tem_percentual | tem_valor_fixo), custo_fiscal + desconto_iss, custo_fiscal)
+        desconto_iptu = np.where(tem_percentual, iptu * (percentual / 100), valor_fixo * anos)
+        custo_fiscal = np.where(incide_iptu & (tem_percentual | tem_valor_fixo), custo_fiscal + desconto_iptu, custo_fiscal)
+
+        # Arrecadação Incremental (AI)
+        arrecadacao_atual = np.full(n, ZERO, dtype=object)
+        baseline_total = np.full(n, ZERO, dtype=object)
+        arrecadacao_atual = np.where(incide_iss, arrecadacao_atual + iss, arrecadacao_atual)
+        baseline_total = np.where(
+            incide_iss & (baseline_iss != ZERO),
+            baseline_total + (baseline_iss / 12) * meses,
+            baseline_total
+        )
+        arrecadacao_atual = np.where(incide_iptu, arrecadacao_atual + iptu, arrecadacao_atual)
+        baseline_total = np.where(
+            incide_iptu & (baseline_iptu != ZERO),
+            baseline_total + baseline_iptu * anos,
+            baseline_total
+        )
+        arrecadacao_incremental = arrecadacao_atual - baseline_total
+
+        impacto_liquido = arrecadacao_incremental - custo_fiscal
+
+        bc_ratio = np.full(n, ZERO, dtype=object)
+        com_custo = custo_fiscal > 0
+        bc_ratio[com_custo] = arrecadacao_incremental[com_custo] / custo_fiscal[com_custo]
+
+        payback = np.full(n, None, dtype=object)
+        # Incentivo que começa depois do fim do período não tem meses para o payback
+        positiva = (arrecadacao_incremental > 0) & (meses > 0)
+        arrecadacao_mensal = arrecadacao_incremental[positiva] / meses[positiva]
+        payback_positivo = np.full(len(arrecadacao_mensal), None, dtype=object)
+        com_mensal = arrecadacao_mensal > 0
+        payback_positivo[com_mensal] = [
+            int(cf / mensal)
+            for cf, mensal in zip(custo_fiscal[positiva][com_mensal], arrecadacao_mensal[com_mensal])
+        ]
+        payback[positiva] = payback_positivo
+
+        resultado['custo_fiscal'] = custo_fiscal
+        resultado['arrecadacao_incremental'] = arrecadacao_incremental
+        resultado['impacto_liquido'] = impacto_liquido
+        resultado['bc_ratio'] = bc_ratio
+        resultado['payback_meses'] = payback
+        return resultado
+
+    @staticmethod
+    def calcular_vpl(df, taxa_desconto):
+        """
+        Valor presente líquido do impacto: o impacto líquido é distribuído
+        igualmente pelos meses do período e descontado à taxa anual informada
+        """
+        inicio = pd.to_datetime(df['periodo_inicio'])
+        fim = pd.to_datetime(df['periodo_fim'])
+        meses = ((fim.dt.year - inicio.dt.year) * 12 + (fim.dt.month - inicio.dt.month) + 1).to_numpy(dtype=float)
+        meses = np.maximum(meses, 1)
+        fluxo_mensal = df['impacto_liquido'].to_numpy(dtype=float) / meses
+
+        taxa_mensal = (1 + float(taxa_desconto)) ** (1 / 12) - 1
+        if taxa_mensal == 0:
+            return fluxo_mensal * meses
+        return fluxo_mensal * (1 - (1 + taxa_mensal) ** -meses) / taxa_mensal
+
+    @staticmethod
+    def resumo(df):
+        """Totais do resultado, com B/C agregado da carteira"""
+        custo_fiscal = sum(df['custo_fiscal'], ZERO)
+        arrecadacao_incremental = sum(df['arrecadacao_incremental'], ZERO)
+        resumo = {
+            'empresas': len(df),
+            'custo_fiscal': float(custo_fiscal),
+            'arrecadacao_incremental': float(arrecadacao_incremental),
+            'impacto_liquido': float(sum(df['impacto_liquido'], ZERO)),
+            'bc_ratio': float(arrecadacao_incremental / custo_fiscal) if custo_fiscal > 0 else 0.0
+        }
+        if 'vpl' in df:
+            resumo['vpl'] = float(df['vpl'].sum())
+        return resumo
+
+    @staticmethod
+    def persistir(df):
+        """Grava todos os resultados em CalculoImpacto com um único upsert em lote"""
+        calculos = [
+            CalculoImpacto(
+                empresa_id=row.cnpj,
+                periodo_inicio=row.periodo_inicio,
+                periodo_fim=row.periodo_fim,
+                custo_fiscal=row.custo_fiscal,
+                arrecadacao_incremental=row.arrecadacao_incremental,
+                impacto_liquido=row.impacto_liquido,
+                bc_ratio=row.bc_ratio,
+                payback_meses=row.payback_meses
+            )
+            for row in df.itertuples(index=False)
+        ]
+        CalculoImpacto.objects.bulk_create(
+            calculos,
+            update_conflicts=True,
+            unique_fields=['empresa', 'periodo_inicio', 'periodo_fim'],
+            update_fields=[
+                'custo_fiscal', 'arrecadacao_incremental', 'impacto_liquido',
+                'bc_ratio', 'payback_meses', 'calculado_em'
+            ]
+        )
+        return len(calculos)
+
+    def calcular(self):
+        """Carrega os dados e calcula os indicadores sem gravar"""
+        df = self.carregar_incentivos()
+        df = self.carregar_arrecadacao(df)
+        return self.calcular_indicadores(df)
+
+    def simular(self, ajustes=None, tipos_incentivo=None, taxa_desconto=0):
+        """
+        Calcula os indicadores atuais e os de um cenário com parâmetros de
+        incentivo alterados (`ajustes`: percentual_desconto,
+        valor_fixo_desconto, baseline_iss_12m, baseline_iptu_12m), sem gravar
+        nada. Retorna (atual, simulado).
+        """
+        df = self.carregar_incentivos()
+        if tipos_incentivo:
+            df = df[df['tipo_incentivo'].isin(tipos_incentivo)].reset_index(drop=True)
+        df = self.carregar_arrecadacao(df)
+
+        simulado = df.copy()
+        for coluna, valor in (ajustes or {}).items():
+            simulado[coluna] = valor
+
+        atual = self.calcular_indicadores(df)
+        simulado = self.calcular_indicadores(simulado)
+        atual['vpl'] = self.calcular_vpl(atual, taxa_desconto)
+        simulado['vpl'] = self.calcular_vpl(simulado, taxa_desconto)
+        return atual, simulado
+
+    def calcular_serie_mensal(self, meses=None):
+        """
+        Indicadores acumulados do início do incentivo até o fim de cada mês,
+        até periodo_fim: uma linha por (cnpj, mês), calculadas de uma vez.
+        Com `meses`, só os últimos meses de cada série.
+        """
+        df = self.carregar_incentivos()
+        inicio = pd.to_datetime(df['periodo_inicio'])
+        mes_inicio = (inicio.dt.year * 12 + inicio.dt.month - 1).to_numpy(dtype=np.int64)
+        quantidade = np.clip(indice_mes(self.periodo_fim) - mes_inicio + 1, 0, None)
+        if meses:
+            mes_inicio = mes_inicio + np.clip(quantidade - meses, 0, None)
+            quantidade = np.minimum(quantidade, meses)
+
+        posicoes = np.repeat(np.arange(len(df)), quantidade)
+        deslocamento = np.arange(len(posicoes)) - np.repeat(np.cumsum(quantidade) - quantidade, quantidade)
+        indices = mes_inicio[posicoes] + deslocamento
+
+        df = df.iloc[posicoes].reset_index(drop=True)
+        fim_mes = pd.to_datetime(pd.DataFrame({
+            'year': indices // 12, 'month': indices % 12 + 1, 'day': 1
+        })) + pd.offsets.MonthEnd(0)
+        df['periodo_fim'] = [min(data, self.periodo_fim) for data in fim_mes.dt.date]
+        df['mes'] = fim_mes.dt.strftime('%Y-%m').to_numpy()
+
+        df = self.carregar_arrecadacao(df)
+        return self.calcular_indicadores(df)
+
+    def calcular_em_paralelo(self, workers, tamanho_bloco=None, progresso=None):
+        """
+        Divide os CNPJs em blocos e calcula cada bloco em um processo
+        separado, com uma conexão de banco por processo. Os workers só
+        leem; a gravação continua única, no processo principal.
+        `progresso(processados, total)` é chamado a cada bloco concluído.
+        """
+        if self.cnpjs is not None:
+            cnpjs = sorted(set(self.cnpjs))
+        else:
+            cnpjs = list(
+                Incentivo.objects.filter(status='ATIVO').order_by('empresa_id')
+                .values_list('empresa_id', flat=True).distinct()
+            )
+
+        if not cnpjs:
+            return self.calcular()
+
+        tamanho_bloco = tamanho_bloco or getattr(settings, 'CALCULO_TAMANHO_BLOCO', 500)
+        blocos = [cnpjs[inicio:inicio + tamanho_bloco] for inicio in range(0, len(cnpjs), tamanho_bloco)]
+
+        partes = []
+        processados = 0
+        with ProcessPoolExecutor(
+            max_workers=min(workers, len(blocos)),
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=inicializar_worker
+        ) as executor:
+            futuros = {
+                executor.submit(calcular_bloco, bloco, self.periodo_fim): bloco
+                for bloco in blocos
+            }
+            for futuro in as_completed(futuros):
+                bloco = futuros[futuro]
+                try:
+                    partes.append(futuro.result())
+                except Exception as e:
+                    self.erros.append(f"Erro no bloco {bloco[0]}..{bloco[-1]}: {str(e)}")
+                    logger.error(f"Erro ao calcular bloco {bloco[0]}..{bloco[-1]}: {str(e)}")
+                processados += len(bloco)
+                if progresso:
+                    progresso(processados, len(cnpjs))
+
+        if not partes:
+            return CalculadoraImpactoLote(cnpjs=[], periodo_fim=self.periodo_fim).calcular()
+        return pd.concat(partes, ignore_index=True)
+
+    def executar(self, workers=1, tamanho_bloco=None, progresso=None):
+        """Calcula e grava o impacto de todas as empresas selecionadas"""
+        if workers > 1:
+            df = self.calcular_em_paralelo(workers, tamanho_bloco, progresso)
+        else:
+            df = self.calcular()
+            if progresso:
+                progresso(len(df), len(df))
+        total = self.persistir(df)
+        logger.info(f"Cálculo em lote concluído para {total} empresas")
+        return df
+
+    @staticmethod
+    def series_para_dicts(df):
+        """Agrupa o resultado de calcular_serie_mensal em uma série por CNPJ"""
+        series = {}
+        for row in df.itertuples(index=False):
+            serie = series.setdefault(row.cnpj, {
+                'cnpj': row.cnpj,
+                'tipo_incentivo': row.tipo_incentivo,
+                'periodo_inicio': row.periodo_inicio,
+                'serie': []
+            })
+            serie['serie'].append({
+                'mes': row.mes,
+                'custo_fiscal': float(row.custo_fiscal),
+                'arrecadacao_incremental': float(row.arrecadacao_incremental),
+                'impacto_liquido': float(row.impacto_liquido),
+                'bc_ratio': float(row.bc_ratio)
+            })
+        return list(series.values())
+
+    @staticmethod
+    def para_dicts(df):
+        """Converte o resultado no mesmo formato de calcular_impacto_completo"""
+        return [
+            {
+                'cnpj': row.cnpj,
+                'custo_fiscal': float(row.custo_fiscal),
+                'arrecadacao_incremental': float(row.arrecadacao_incremental),
+                'impacto_liquido': float(row.impacto_liquido),
+                'bc_ratio': float(row.bc_ratio),
+                'payback_meses': row.payback_meses,
+                'periodo_inicio': row.periodo_inicio,
+                'periodo_fim': row.periodo_fim
+            }
+            for row in df.itertuples(index=False)
+        ]
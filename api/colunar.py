@@ -0,0 +1,115 @@
+"""
+Leitura e exportação de arquivos colunares (Parquet e Arrow IPC)
+
+Usa o pacote opcional pyarrow. Na leitura dos uploads só as colunas
+usadas são carregadas, e decimais e datas chegam com o tipo gravado no
+arquivo (Decimal e date), sem a inferência do read_csv. Na exportação
+cada campo do modelo vira uma coluna tipada com o nome da coluna no banco.
+"""
+from itertools import islice
+
+import pandas as pd
+from django.db import models
+
+EXTENSOES = {'.parquet': 'parquet', '.arrow': 'arrow', '.feather': 'arrow'}
+
+CONTENT_TYPES = {
+    'parquet': 'application/vnd.apache.parquet',
+    'arrow': 'application/vnd.apache.arrow.file',
+}
+
+# Linhas lidas do banco e gravadas por lote na exportação
+LINHAS_POR_LOTE = 50000
+
+
+def importar_pyarrow():
+    """Módulo pyarrow (com parquet e ipc) ou ImportError com a instrução de instalação"""
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError('Arquivos Parquet/Arrow requerem o pacote pyarrow (pip install pyarrow)')
+    return pyarrow
+
+
+def formato_do_arquivo(nome):
+    """'parquet' ou 'arrow' pela extensão do nome do arquivo; None para os demais"""
+    nome = (nome or '').lower()
+    for extensao, formato in EXTENSOES.items():
+        if nome.endswith(extensao):
+            return formato
+    return None
+
+
+def _projecao(nomes, colunas):
+    return [nome for nome in nomes if colunas is None or nome in colunas]
+
+
+def ler_em_blocos(file, tamanho_bloco, colunas=None):
+    """
+    DataFrames de até `tamanho_bloco` linhas do arquivo Parquet/Arrow, só
+    com as `colunas` pedidas que existirem nele. O índice dos blocos
+    continua a numeração das linhas do arquivo.
+    """
+    pa = importar_pyarrow()
+    origem = file.temporary_file_path() if hasattr(file, 'temporary_file_path') else file
+
+    if formato_do_arquivo(file.name) == 'parquet':
+        arquivo = pa.parquet.ParquetFile(origem)
+        lotes = arquivo.iter_batches(
+            batch_size=tamanho_bloco, columns=_projecao(arquivo.schema_arrow.names, colunas)
+        )
+    else:
+        tabela = pa.ipc.open_file(pa.memory_map(origem) if isinstance(origem, str) else origem).read_all()
+        lotes = tabela.select(_projecao(tabela.column_names, colunas)).to_batches(max_chunksize=tamanho_bloco)
+
+    inicio = 0
+    for lote in lotes:
+        df = lote.to_pandas()
+        df.index = pd.RangeIndex(inicio, inicio + len(df))
+        inicio += len(df)
+        yield df
+
+
+def tipo_arrow(campo):
+    """Tipo Arrow equivalente ao campo do modelo"""
+    pa = importar_pyarrow()
+    if campo.is_relation:
+        return tipo_arrow(campo.target_field)
+    if isinstance(campo, models.DecimalField):
+        return pa.decimal128(campo.max_digits, campo.decimal_places)
+    if isinstance(campo, models.DateTimeField):
+        return pa.timestamp('us', tz='UTC')
+    if isinstance(campo, models.DateField):
+        return pa.date32()
+    if isinstance(campo, models.BooleanField):
+        return pa.bool_()
+    if isinstance(campo, models.IntegerField):
+        return pa.int64()
+    if isinstance(campo, models.FloatField):
+        return pa.float64()
+    return pa.string()
+
+
+def exportar(queryset, formato='parquet'):
+    """Bytes do arquivo Parquet ou Arrow com todos os campos das linhas do queryset"""
+    pa = importar_pyarrow()
+    campos = queryset.model._meta.concrete_fields
+    esquema = pa.schema([(campo.column, tipo_arrow(campo)) for campo in campos])
+    textos = [tipo == pa.string() for tipo in esquema.types]
+
+    saida = pa.BufferOutputStream()
+    escritor = pa.parquet.ParquetWriter(saida, esquema) if formato == 'parquet' else pa.ipc.new_file(saida, esquema)
+    with escritor:
+        linhas = queryset.values_list(*[campo.attname for campo in campos]).iterator(chunk_size=LINHAS_POR_LOTE)
+        while lote := list(islice(linhas, LINHAS_POR_LOTE)):
+            colunas = [
+                [None if v is None else str(v) for v in valores] if texto else valores
+                for valores, texto in zip(zip(*lote), textos)
+            ]
+            escritor.write_batch(pa.record_batch(
+                [pa.array(valores, type=tipo) for valores, tipo in zip(colunas, esquema.types)],
+                schema=esquema
+            ))
+    return saida.getvalue().to_pybytes()
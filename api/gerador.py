@@ -0,0 +1,236 @@
+"""
+Gerador de dados sintéticos de um município
+
+Produz DataFrames no mesmo formato dos CSVs de upload (empresas,
+incentivos, arrecadação de ISS e IPTU) e uma tabela de contrapartidas,
+com quantidades configuráveis e resultado reprodutível pela semente.
+"""
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+from .validators import PESOS_DV1, PESOS_DV2, digito_verificador
+
+# Peso relativo de cada CNAE de CNAES_DESCRICAO (comércio e serviços predominam)
+PESOS_CNAE = {
+    '4722': 10, '4731': 6, '4724': 8, '4530': 7, '4520': 9, '4635': 4,
+    '6201': 6, '9313': 5, '5510': 4, '8610': 3, '8541': 3, '4930': 7,
+    '4120': 6, '1091': 6, '1610': 3, '1011': 2, '2512': 4,
+}
+
+# Peso relativo de cada bairro (concentração no centro)
+PESOS_BAIRRO = {
+    'Centro': 25, 'Santa Cruz': 10, 'Floresta': 9, 'Cascavel Velho': 8,
+    'Perímetro Urbano': 6, 'Coqueiral': 9, 'Brasmadeira': 7, 'Lagoa': 5,
+    'Pacaembu': 8, 'Neva': 7, 'Country': 6,
+}
+
+PESOS_TIPO_INCENTIVO = {
+    'REDUCAO_ISS': 30, 'ISENCAO_ISS': 15, 'REDUCAO_IPTU': 15, 'ISENCAO_IPTU': 10,
+    'ISENCAO_TAXAS': 8, 'TERRENO_GRATUITO': 7, 'MISTO': 15,
+}
+
+ATIVIDADES = ['Comércio', 'Indústria', 'Serviços', 'Transportes', 'Construtora', 'Distribuidora']
+NOMES = ['Cascavel', 'Oeste', 'Paraná', 'Iguaçu', 'São Jorge', 'Horizonte', 'Aurora', 'Pioneira', 'Vale Verde']
+SUFIXOS = ['Ltda', 'Ltda', 'Ltda', 'SA', 'ME']
+
+CONTRAPARTIDAS = {
+    'EMPREGOS': 'Geração de {n} empregos em 24 meses',
+    'INVESTIMENTO': 'Investimento de R$ {n} mil em infraestrutura',
+    'QUALIFICACAO': 'Qualificação de {n} trabalhadores locais',
+    'PERMANENCIA': 'Permanência no município por {n} anos',
+}
+
+def _escolher(rng, pesos, tamanho):
+    opcoes = list(pesos)
+    probabilidades = np.array(list(pesos.values()), dtype=float)
+    return rng.choice(opcoes, size=tamanho, p=probabilidades / probabilidades.sum())
+
+
+def _datas(referencia, dias):
+    """Datas `dias` dias depois da referência (negativo para antes)"""
+    return [referencia + timedelta(days=int(d)) for d in dias]
+
+
+def gerar_cnpjs(rng, quantidade):
+    """CNPJs distintos (matriz 0001) com dígitos verificadores válidos"""
+    raizes = rng.choice(100_000_000, size=quantidade, replace=False)
+    digitos = np.array([list(f'{raiz:08d}0001') for raiz in raizes], dtype=np.int64).reshape(quantidade, 12)
+    digitos = np.column_stack([digitos, digito_verificador(digitos, PESOS_DV1)])
+    digitos = np.column_stack([digitos, digito_verificador(digitos, PESOS_DV2)])
+    return [''.join(map(str, linha)) for linha in digitos]
+
+
+class GeradorMunicipio:
+    """
+    Gera empresas, incentivos, ISS mensal, IPTU anual e contrapartidas
+    consistentes entre si
+    """
+
+    def __init__(self, empresas=100, incentivos=60, meses_iss=24, anos_iptu=3,
+                 contrapartidas=60, semente=42, data_referencia=None):
+        self.quantidade_empresas = empresas
+        self.quantidade_incentivos = incentivos
+        self.meses_iss = meses_iss
+        self.anos_iptu = anos_iptu
+        self.quantidade_contrapartidas = contrapartidas
+        self.semente = semente
+        self.data_referencia = data_referencia or date.today()
+        self._gerado = None
+
+    def gerar(self):
+        """Gera todas as tabelas; retorna dict de DataFrames"""
+        if self._gerado is None:
+            rng = np.random.default_rng(self.semente)
+            empresas = self._gerar_empresas(rng)
+            iss = self._gerar_iss(rng, empresas)
+            iptu = self._gerar_iptu(rng, empresas)
+            incentivos = self._gerar_incentivos(rng, empresas, iss, iptu)
+            contrapartidas = self._gerar_contrapartidas(rng, incentivos)
+            self._gerado = {
+                'empresas': empresas.drop(columns=['iss_medio']),
+                'incentivos': incentivos,
+                'arrecadacao_iss': iss,
+                'arrecadacao_iptu_taxas': iptu,
+                'contrapartidas': contrapartidas,
+            }
+        return self._gerado
+
+    def _gerar_empresas(self, rng):
+        n = self.quantidade_empresas
+        sufixos = rng.choice(SUFIXOS, size=n)
+        razoes = [
+            f'{atividade} {nome} {i + 1} {sufixo}'
+            for i, (atividade, nome, sufixo) in enumerate(zip(
+                rng.choice(ATIVIDADES, size=n), rng.choice(NOMES, size=n), sufixos
+            ))
+        ]
+        abertura = _datas(self.data_referencia, -rng.integers(365, 365 * 30, size=n))
+
+        # Arrecadação mensal típica: maior para sociedades anônimas
+        escala = np.where(sufixos == 'SA', 9.5, np.where(sufixos == 'ME', 7.0, 8.0))
+        return pd.DataFrame({
+            'cnpj': gerar_cnpjs(rng, n),
+            'razao_social': razoes,
+            'cnae': _escolher(rng, PESOS_CNAE, n),
+            'bairro': _escolher(rng, PESOS_BAIRRO, n),
+            'data_abertura': [d.isoformat() for d in abertura],
+            'iss_medio': np.exp(rng.normal(escala, 0.6)),
+        })
+
+    def _gerar_iss(self, rng, empresas):
+        n, meses = len(empresas), self.meses_iss
+        referencia = self.data_referencia.replace(day=1)
+        competencias = pd.date_range(end=referencia, periods=meses, freq='MS')
+
+        cnpjs = np.repeat(empresas['cnpj'].to_numpy(), meses)
+        tendencia = np.tile(np.linspace(0.9, 1.1, meses), n)
+        valor = np.repeat(empresas['iss_medio'].to_numpy(), meses) * tendencia * rng.lognormal(0, 0.25, n * meses)
+        valor[rng.random(n * meses) < 0.05] = 0
+        aliquota = rng.choice([2.0, 3.0, 5.0], size=n * meses)
+
+        return pd.DataFrame({
+            'cnpj': cnpjs,
+            'mes_ref': np.tile(competencias.strftime('%Y-%m-%d'), n),
+            'valor_iss': valor.round(2),
+            'valor_base_calculo': (valor * 100 / aliquota).round(2),
+            'aliquota': aliquota,
+        })
+
+    def _gerar_iptu(self, rng, empresas):
+        n, anos = len(empresas), self.anos_iptu
+        ano_final = self.data_referencia.year
+        valor = np.repeat(np.exp(rng.normal(8.5, 0.7, n)), anos) * rng.lognormal(0, 0.1, n * anos)
+        return pd.DataFrame({
+            'cnpj': np.repeat(empresas['cnpj'].to_numpy(), anos),
+            'ano_ref': np.tile(np.arange(ano_final - anos + 1, ano_final + 1), n),
+            'valor_iptu': valor.round(2),
+            'valor_taxas': (valor * rng.uniform(0.08, 0.2, n * anos)).round(2),
+        })
+
+    def _gerar_incentivos(self, rng, empresas, iss, iptu):
+        n = self.quantidade_incentivos
+        posicoes = rng.integers(0, len(empresas), size=n)
+        cnpjs = empresas['cnpj'].to_numpy()[posicoes]
+        tipos = _escolher(rng, PESOS_TIPO_INCENTIVO, n)
+
+        percentual = np.where(np.char.startswith(tipos.astype(str), 'ISENCAO'), 100.0, rng.choice(np.arange(10, 85, 5), size=n))
+        percentual = np.where(tipos == 'TERRENO_GRATUITO', np.nan, percentual)
+        valor_fixo = np.where(tipos == 'TERRENO_GRATUITO', rng.uniform(500, 5000, n).round(2), np.nan)
+
+        inicio = _datas(self.data_referencia, -rng.integers(60, 365 * 4, size=n))
+        fim = [d + timedelta(days=int(dias)) for d, dias in zip(inicio, rng.integers(365 * 3, 365 * 10, size=n))]
+
+        iss_anual = iss.groupby('cnpj')['valor_iss'].mean() * 12
+        iptu_anual = iptu.groupby('cnpj')[['valor_iptu', 'valor_taxas']].mean().sum(axis=1)
+
+        return pd.DataFrame({
+            'cnpj': cnpjs,
+            'instrumento_legal': [f'Decreto {numero}/{d.year}' for numero, d in zip(rng.integers(1000, 9999, n), inicio)],
+            'tipo_incentivo': tipos,
+            'percentual_desconto': percentual,
+            'valor_fixo_desconto': valor_fixo,
+            'data_inicio': [d.isoformat() for d in inicio],
+            'data_fim': [d.isoformat() for d in fim],
+            'contrapartidas': [
+                CONTRAPARTIDAS['EMPREGOS'].format(n=quantidade)
+                for quantidade in rng.integers(5, 200, n)
+            ],
+            'status': rng.choice(['ATIVO', 'ATIVO', 'ATIVO', 'ATIVO', 'SUSPENSO'], size=n),
+            'baseline_iss_12m': (iss_anual.reindex(cnpjs).to_numpy() * rng.uniform(0.7, 1.1, n)).round(2),
+            'baseline_iptu_12m': (iptu_anual.reindex(cnpjs).to_numpy() * rng.uniform(0.9, 1.05, n)).round(2),
+        })
+
+    def _gerar_contrapartidas(self, rng, incentivos):
+        n = self.quantidade_contrapartidas if len(incentivos) else 0
+        posicoes = rng.integers(0, max(len(incentivos), 1), size=n)
+        tipos = rng.choice(list(CONTRAPARTIDAS), size=n)
+        vencimento = _datas(self.data_referencia, rng.integers(-180, 365, n))
+        return pd.DataFrame({
+            'cnpj': incentivos['cnpj'].to_numpy()[posicoes],
+            'data_inicio': incentivos['data_inicio'].to_numpy()[posicoes],
+            'descricao': [CONTRAPARTIDAS[tipo].format(n=q) for tipo, q in zip(tipos, rng.integers(2, 100, n))],
+            'tipo': tipos,
+            'data_vencimento': [d.isoformat() for d in vencimento],
+            'status': rng.choice(['PENDENTE', 'PENDENTE', 'EM_ANALISE', 'CUMPRIDA', 'DESCUMPRIDA'], size=n),
+        })
+
+    def salvar_csvs(self, diretorio):
+        """
+        Grava os CSVs de upload no diretório; retorna {tabela: caminho}
+        (as contrapartidas não têm upload e ficam fora)
+        """
+        caminhos = {}
+        for nome, df in self.gerar().items():
+            if nome == 'contrapartidas':
+                continue
+            caminho = f'{diretorio}/{nome}.csv'
+            df.to_csv(caminho, index=False)
+            caminhos[nome] = caminho
+        return caminhos
+
+    def gravar_contrapartidas(self):
+        """Grava as contrapartidas ligadas aos incentivos já carregados no banco"""
+        from .models import Contrapartida, Incentivo
+
+        df = self.gerar()['contrapartidas']
+        ids = {
+            (cnpj, data_inicio.isoformat()): pk
+            for pk, cnpj, data_inicio in Incentivo.objects.filter(
+                empresa_id__in=df['cnpj'].unique().tolist()
+            ).values_list('pk', 'empresa_id', 'data_inicio')
+        }
+        contrapartidas = [
+            Contrapartida(
+                incentivo_id=ids[(row.cnpj, row.data_inicio)],
+                descricao=row.descricao,
+                tipo=row.tipo,
+                data_vencimento=row.data_vencimento,
+                status=row.status
+            )
+            for row in df.itertuples(index=False)
+            if (row.cnpj, row.data_inicio) in ids
+        ]
+        Contrapartida.objects.bulk_create(contrapartidas, batch_size=1000)
+        return len(contrapartidas)
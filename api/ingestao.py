@@ -0,0 +1,572 @@
+"""
+Funções de apoio à ingestão em lote dos CSVs
+
+As validações trabalham sobre colunas inteiras e anotam os erros por
+índice da linha no DataFrame; listar_erros os converte no formato
+"Linha N: ..." dos uploads (N conta o cabeçalho como linha 1).
+
+Cada upload é registrado em ImportacaoArquivo pelo hash do conteúdo:
+um arquivo idêntico a uma importação concluída não é reprocessado, e uma
+importação interrompida é retomada a partir do último bloco gravado.
+"""
+import csv
+import hashlib
+import io
+import queue
+import threading
+from datetime import timedelta
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.db import connection, models, transaction
+from django.utils import timezone
+
+from .colunar import EXTENSOES, formato_do_arquivo, ler_em_blocos as ler_colunar_em_blocos
+from .models import Empresa, ImportacaoArquivo
+from .validators import normalizar_cnpjs, cnpjs_invalidos
+
+# Tamanho dos lotes de consulta e de gravação
+TAMANHO_LOTE = 900
+
+# Representação de nulo nos valores canônicos comparados na carga
+NULO = '\x00'
+
+# Colunas lidas de cada tipo de arquivo (as demais são ignoradas)
+COLUNAS = {
+    'EMPRESAS': ['cnpj', 'razao_social', 'cnae', 'bairro', 'data_abertura'],
+    'INCENTIVOS': [
+        'cnpj', 'instrumento_legal', 'tipo_incentivo', 'percentual_desconto', 'valor_fixo_desconto',
+        'data_inicio', 'data_fim', 'contrapartidas', 'status', 'baseline_iss_12m', 'baseline_iptu_12m'
+    ],
+    'ISS': ['cnpj', 'mes_ref', 'valor_iss', 'valor_base_calculo', 'aliquota', 'numero_nfse'],
+    'IPTU': ['cnpj', 'ano_ref', 'valor_iptu', 'valor_taxas', 'valor_alvara'],
+}
+
+
+def ler_em_blocos(file, tamanho_bloco=None, colunas=None, **kwargs):
+    """
+    Lê o arquivo enviado (CSV, Parquet ou Arrow) em blocos de linhas
+    (settings.UPLOAD_TAMANHO_BLOCO), só com as `colunas` pedidas, direto
+    do arquivo temporário do upload quando ele existir. O índice dos
+    blocos continua a numeração das linhas do arquivo.
+    """
+    tamanho_bloco = tamanho_bloco or settings.UPLOAD_TAMANHO_BLOCO
+    if formato_do_arquivo(getattr(file, 'name', '')):
+        return ler_colunar_em_blocos(file, tamanho_bloco, colunas)
+    
+    origem = file.temporary_file_path() if hasattr(file, 'temporary_file_path') else file
+    usecols = (lambda coluna: coluna in colunas) if colunas else None
+    return pd.read_csv(origem, chunksize=tamanho_bloco, usecols=usecols, **kwargs)
+
+
+# Nomes (sem extensão) aceitos para cada arquivo do pacote ZIP
+ARQUIVOS_PACOTE = {
+    'EMPRESAS': ['empresas'],
+    'INCENTIVOS': ['incentivos'],
+    'ISS': ['arrecadacao_iss', 'iss'],
+    'IPTU': ['arrecadacao_iptu_taxas', 'arrecadacao_iptu', 'iptu'],
+}
+
+
+def membros_do_pacote(pacote):
+    """
+    {tipo: membro} dos arquivos reconhecidos no ZIP, pelo nome sem
+    diretório e extensão. Recusa tipos repetidos e pacotes que
+    descompactados passam do limite de upload.
+    """
+    limite_mb = settings.UPLOAD_TAMANHO_MAXIMO_MB
+    if sum(info.file_size for info in pacote.infolist()) > limite_mb * 1024 * 1024:
+        raise ValueError(f'Conteúdo do pacote muito grande. Máximo {limite_mb}MB')
+    
+    tipos = {nome: tipo for tipo, nomes in ARQUIVOS_PACOTE.items() for nome in nomes}
+    membros = {}
+    for info in pacote.infolist():
+        nome, _, extensao = info.filename.rsplit('/', 1)[-1].lower().rpartition('.')
+        if info.is_dir() or nome not in tipos or f'.{extensao}' not in ('.csv', *EXTENSOES):
+            continue
+        if tipos[nome] in membros:
+            raise ValueError(f'Mais de um arquivo de {tipos[nome]} no pacote')
+        membros[tipos[nome]] = info.filename
+    return membros
+
+
+def ler_membro(pacote, membro, tipo):
+    """
+    Blocos do arquivo `membro` do ZIP, lidos com as colunas do tipo e
+    descompactados aos poucos, sem carregar o arquivo inteiro
+    """
+    with pacote.open(membro) as arquivo:
+        yield from ler_em_blocos(arquivo, colunas=COLUNAS[tipo], dtype={'cnpj': str})
+
+
+# Blocos que a leitura de cada arquivo do pacote pode adiantar em relação à gravação
+BLOCOS_EM_ESPERA = 2
+
+# Marca de fim da leitura de um arquivo do pacote
+_FIM = object()
+
+
+class LeituraPacote:
+    """
+    Lê os arquivos do pacote ao mesmo tempo, cada um em uma thread, que
+    fica até BLOCOS_EM_ESPERA blocos à frente da gravação: a leitura dos
+    próximos arquivos corre enquanto os anteriores são gravados, sem
+    carregar nenhum inteiro. Usar como gerenciador de contexto.
+    """
+
+    def __init__(self, pacote, membros):
+        self._filas = {tipo: queue.Queue(maxsize=BLOCOS_EM_ESPERA) for tipo in membros}
+        self._cancelada = threading.Event()
+        self._threads = [
+            threading.Thread(target=self._ler, args=(pacote, membro, tipo), daemon=True)
+            for tipo, membro in membros.items()
+        ]
+
+    def _entregar(self, fila, item):
+        # Espera vaga na fila até a leitura ser cancelada
+        while not self._cancelada.is_set():
+            try:
+                fila.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _ler(self, pacote, membro, tipo):
+        fila = self._filas[tipo]
+        try:
+            for df in ler_membro(pacote, membro, tipo):
+                if not self._entregar(fila, df):
+                    return
+            self._entregar(fila, _FIM)
+        except Exception as e:
+            self._entregar(fila, e)
+
+    def blocos(self, tipo):
+        """Blocos do arquivo do tipo, na ordem; repassa o erro de leitura"""
+        fila = self._filas[tipo]
+        while True:
+            item = fila.get()
+            if item is _FIM:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+
+    def __enter__(self):
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def __exit__(self, *excecao):
+        self._cancelada.set()
+        for thread in self._threads:
+            thread.join()
+
+
+def hash_arquivo(file):
+    """SHA-256 do conteúdo do arquivo, lido em pedaços; volta ao início ao terminar"""
+    sha = hashlib.sha256()
+    pedacos = file.chunks() if hasattr(file, 'chunks') else iter(lambda: file.read(1024 * 1024), b'')
+    for pedaco in pedacos:
+        sha.update(pedaco.encode() if isinstance(pedaco, str) else pedaco)
+    file.seek(0)
+    return sha.hexdigest()
+
+
+def iniciar_importacao(tipo, file, forcar=False):
+    """
+    Manifesto da importação do arquivo: o já existente para o mesmo tipo e
+    conteúdo (concluído ou a retomar) ou um novo. Com `forcar`, uma
+    importação concluída é reiniciada do zero. Recusa o arquivo enquanto
+    outro upload o estiver importando (manifesto PROCESSANDO atualizado há
+    menos de TAREFA_TIMEOUT_MINUTOS).
+    """
+    hash_conteudo = hash_arquivo(file)
+    with transaction.atomic():
+        importacao, criada = ImportacaoArquivo.objects.select_for_update().get_or_create(
+            tipo=tipo,
+            hash_conteudo=hash_conteudo,
+            defaults={
+                'nome_arquivo': getattr(file, 'name', '') or '',
+                'tamanho_bytes': getattr(file, 'size', 0) or 0,
+                'tamanho_bloco': settings.UPLOAD_TAMANHO_BLOCO,
+            }
+        )
+        if criada:
+            return importacao
+        
+        limite = timezone.now() - timedelta(minutes=settings.TAREFA_TIMEOUT_MINUTOS)
+        if importacao.status == 'PROCESSANDO' and importacao.atualizada_em > limite:
+            raise ValueError(f'Arquivo já em importação (importação {importacao.pk}); aguarde a conclusão')
+        
+        if forcar and importacao.status == 'CONCLUIDA':
+            importacao.blocos_concluidos = 0
+            importacao.total_linhas = 0
+            importacao.linhas_processadas = 0
+            importacao.linhas_inseridas = 0
+            importacao.linhas_atualizadas = 0
+            importacao.linhas_inalteradas = 0
+            importacao.erros = {}
+            importacao.alteracoes = {}
+            importacao.resultado = None
+            importacao.duracao_segundos = 0
+            importacao.tamanho_bloco = settings.UPLOAD_TAMANHO_BLOCO
+        
+        if importacao.status != 'CONCLUIDA' or forcar:
+            importacao.status = 'PROCESSANDO'
+            importacao.mensagem_erro = ''
+            importacao.save()
+    return importacao
+
+
+def registrar_bloco(importacao, linhas, contagem, erros, alteracoes):
+    """Soma um bloco gravado ao manifesto (chamar na mesma transação do bloco)"""
+    importacao.blocos_concluidos += 1
+    importacao.total_linhas += linhas
+    importacao.linhas_processadas += contagem['processados']
+    importacao.linhas_inseridas += contagem['inseridos']
+    importacao.linhas_atualizadas += contagem['atualizados']
+    importacao.linhas_inalteradas += contagem['inalterados']
+    importacao.erros.update({str(idx): mensagem for idx, mensagem in erros.items()})
+    for cnpj, periodos in alteracoes.items():
+        importacao.alteracoes[cnpj] = sorted(set(importacao.alteracoes.get(cnpj, [])) | periodos)
+    importacao.save(update_fields=[
+        'blocos_concluidos', 'total_linhas', 'linhas_processadas', 'linhas_inseridas',
+        'linhas_atualizadas', 'linhas_inalteradas', 'erros', 'alteracoes', 'atualizada_em'
+    ])
+
+
+def registrar_pacote(importacao, contagem, erros, alteracoes):
+    """Grava no manifesto de um pacote as contagens somadas e os erros de cada arquivo"""
+    importacao.total_linhas = contagem['linhas']
+    importacao.linhas_processadas = contagem['processados']
+    importacao.linhas_inseridas = contagem['inseridos']
+    importacao.linhas_atualizadas = contagem['atualizados']
+    importacao.linhas_inalteradas = contagem['inalterados']
+    importacao.erros = erros
+    importacao.alteracoes = {cnpj: sorted(periodos) for cnpj, periodos in alteracoes.items()}
+    importacao.save(update_fields=[
+        'total_linhas', 'linhas_processadas', 'linhas_inseridas', 'linhas_atualizadas',
+        'linhas_inalteradas', 'erros', 'alteracoes', 'atualizada_em'
+    ])
+
+
+def finalizar_importacao(importacao, segundos, resultado=None, erro=None):
+    """Marca a importação como concluída (com o resultado) ou com erro"""
+    importacao.duracao_segundos += segundos
+    if erro is None:
+        importacao.status = 'CONCLUIDA'
+        importacao.resultado = resultado
+        importacao.concluida_em = timezone.now()
+    else:
+        importacao.status = 'ERRO'
+        importacao.mensagem_erro = str(erro)
+    importacao.save(update_fields=[
+        'duracao_segundos', 'status', 'resultado', 'concluida_em', 'mensagem_erro', 'atualizada_em'
+    ])
+
+
+def registrar_erros(erros, mascara, mensagem):
+    """
+    Anota `mensagem` nas linhas da máscara que ainda não têm erro.
+    `mensagem` pode ser um texto ou uma Series com um texto por linha.
+    """
+    for idx in mascara[mascara].index:
+        erros.setdefault(idx, mensagem if isinstance(mensagem, str) else mensagem[idx])
+
+
+def linhas_com_erro(erros):
+    """Pares (linha no arquivo, mensagem) em ordem de linha; aceita índices em texto (manifesto)"""
+    return [(int(idx) + 2, erros[idx]) for idx in sorted(erros, key=int)]
+
+
+def linhas_com_erro_pacote(erros):
+    """Trincas (arquivo, linha no arquivo, mensagem) dos erros de um pacote ({arquivo: erros})"""
+    return [
+        (arquivo, linha, mensagem)
+        for arquivo, erros_arquivo in erros.items()
+        for linha, mensagem in linhas_com_erro(erros_arquivo)
+    ]
+
+
+def listar_erros(erros):
+    """Erros anotados, em ordem de linha, no formato 'Linha N: ...'"""
+    return [f"Linha {linha}: {mensagem}" for linha, mensagem in linhas_com_erro(erros)]
+
+
+def cnpjs_cadastrados(cnpjs):
+    """Subconjunto dos CNPJs que existem em Empresa"""
+    cnpjs = list(set(cnpjs))
+    encontrados = set()
+    for inicio in range(0, len(cnpjs), TAMANHO_LOTE):
+        encontrados.update(
+            Empresa.objects.filter(cnpj__in=cnpjs[inicio:inicio + TAMANHO_LOTE]).values_list('cnpj', flat=True)
+        )
+    return encontrados
+
+
+def linhas_com_cnpj_valido(df, erros):
+    """
+    Normaliza a coluna cnpj e retorna a máscara das linhas com dígitos
+    verificadores corretos, anotando erro nas demais. CNPJs já cadastrados
+    em Empresa são aceitos mesmo com dígitos errados (dados anteriores à
+    conferência).
+    """
+    original = df['cnpj'].astype(str)
+    df['cnpj'] = normalizar_cnpjs(df['cnpj'])
+    invalidos = cnpjs_invalidos(df['cnpj'])
+    if invalidos.any():
+        candidatos = df.loc[invalidos & df['cnpj'].str.len().eq(14), 'cnpj']
+        invalidos &= ~df['cnpj'].isin(cnpjs_cadastrados(candidatos))
+    registrar_erros(erros, invalidos, 'CNPJ inválido: ' + original)
+    return ~invalidos
+
+
+def consultar_cnpjs_novos(df, cadastrados, consultados):
+    """
+    Completa o conjunto de CNPJs `cadastrados` (compartilhado entre as
+    etapas de um pacote, já com os gravados pela etapa de empresas) com os
+    do bloco ainda desconhecidos, numa única consulta; cada CNPJ vai ao
+    banco no máximo uma vez por pacote
+    """
+    novos = set(normalizar_cnpjs(df['cnpj'])) - cadastrados - consultados
+    if novos:
+        cadastrados.update(cnpjs_cadastrados(novos))
+        consultados.update(novos)
+
+
+def linhas_com_empresa(df, erros, cnpjs=None):
+    """
+    Normaliza e valida a coluna cnpj e retorna a máscara das linhas cuja
+    empresa está cadastrada, anotando erro nas demais. `cnpjs` é o
+    conjunto de CNPJs cadastrados já conhecido (senão é consultado).
+    """
+    validas = linhas_com_cnpj_valido(df, erros)
+    if cnpjs is None:
+        cnpjs = cnpjs_cadastrados(df.loc[validas, 'cnpj'])
+    cadastradas = df['cnpj'].isin(cnpjs)
+    registrar_erros(erros, ~cadastradas, 'Empresa CNPJ ' + df['cnpj'] + ' não encontrada')
+    return validas & cadastradas
+
+
+def coluna_decimal(serie):
+    """Se todos os valores não nulos da coluna são Decimal (decimais lidos de Parquet/Arrow)"""
+    if serie.dtype != object:
+        return False
+    preenchidos = serie.dropna()
+    return len(preenchidos) > 0 and preenchidos.map(lambda valor: isinstance(valor, Decimal)).all()
+
+
+def coluna_numerica(df, coluna, erros, obrigatoria=False):
+    """
+    Converte a coluna em número, anotando erro nos valores não numéricos
+    (e nos vazios, se obrigatória). Coluna opcional ausente vira nula.
+    Colunas decimais (Parquet/Arrow) mantêm os valores Decimal.
+    """
+    if coluna not in df:
+        if obrigatoria:
+            raise KeyError(coluna)
+        return pd.Series(float('nan'), index=df.index)
+
+    valores = df[coluna] if coluna_decimal(df[coluna]) else pd.to_numeric(df[coluna], errors='coerce')
+    invalidos = valores.isna() & df[coluna].notna()
+    registrar_erros(erros, invalidos, f'{coluna} inválido: ' + df[coluna].astype(str))
+    if obrigatoria:
+        registrar_erros(erros, df[coluna].isna(), f'{coluna} ausente')
+    return valores
+
+
+def coluna_data(df, coluna, erros, obrigatoria=False):
+    """
+    Converte a coluna em datas, anotando erro nas inválidas (e nas vazias,
+    se obrigatória). Coluna opcional ausente vira nula.
+    """
+    if coluna not in df:
+        if obrigatoria:
+            raise KeyError(coluna)
+        return pd.Series(None, index=df.index, dtype=object)
+    
+    datas = pd.to_datetime(df[coluna], errors='coerce')
+    registrar_erros(erros, datas.isna() & df[coluna].notna(), f'{coluna} inválida: ' + df[coluna].astype(str))
+    if obrigatoria:
+        registrar_erros(erros, df[coluna].isna(), f'{coluna} ausente')
+    return datas.dt.date
+
+
+def decimal_ou_nulo(valor):
+    """Decimal com a representação decimal mais curta do número lido"""
+    if valor is None or pd.isna(valor):
+        return None
+    return Decimal(str(valor))
+
+
+def carregar_em_lote(modelo, df, unique_fields, manter_se_nulo=()):
+    """
+    Insere ou atualiza as linhas do DataFrame (colunas com os nomes dos
+    campos do modelo), chave `unique_fields`, gravando só as novas e as que
+    diferem do que está no banco. A última linha de cada chave prevalece.
+    Campos fora do DataFrame recebem o valor padrão na inserção e não são
+    alterados na atualização; os de `manter_se_nulo` só são atualizados
+    quando o novo valor não é nulo. Retorna as contagens de inseridos,
+    atualizados e inalterados e, em 'gravados', as linhas gravadas.
+    """
+    carga = {'inseridos': 0, 'atualizados': 0, 'inalterados': 0, 'gravados': df}
+    if df.empty:
+        return carga
+    df = df.drop_duplicates(unique_fields, keep='last')
+    
+    novas, alteradas = linhas_alteradas(modelo, df, unique_fields, manter_se_nulo)
+    gravados = df[novas | alteradas]
+    carga.update(
+        inseridos=int(novas.sum()),
+        atualizados=int(alteradas.sum()),
+        inalterados=len(df) - len(gravados),
+        gravados=gravados
+    )
+    if not gravados.empty:
+        inserir_ou_atualizar(modelo, gravados, unique_fields, manter_se_nulo)
+    return carga
+
+
+def contagem_carga(carga, processados):
+    """Contagens de um bloco gravado: linhas válidas processadas e o resultado da carga"""
+    return {
+        'processados': processados,
+        'inseridos': carga['inseridos'],
+        'atualizados': carga['atualizados'],
+        'inalterados': carga['inalterados']
+    }
+
+
+def linhas_alteradas(modelo, df, unique_fields, manter_se_nulo=()):
+    """
+    Máscaras (novas, alteradas) das linhas do DataFrame: sem linha gravada
+    com a mesma chave, ou com impressão digital (hash dos demais campos)
+    diferente da linha gravada. Nulos em `manter_se_nulo` não contam como
+    alteração.
+    """
+    campos = {nome: modelo._meta.get_field(nome) for nome in df.columns}
+    comparados = [nome for nome in df.columns if nome not in unique_fields]
+    entrada = pd.DataFrame({nome: _canonicos(campo, df[nome]) for nome, campo in campos.items()}, dtype=object)
+    
+    # Linhas gravadas, buscadas pelos valores do primeiro campo da chave
+    filtro = f'{campos[unique_fields[0]].attname}__in'
+    valores_chave = df[unique_fields[0]].unique().tolist()
+    gravadas = []
+    for inicio in range(0, len(valores_chave), TAMANHO_LOTE):
+        gravadas.extend(modelo.objects.filter(
+            **{filtro: valores_chave[inicio:inicio + TAMANHO_LOTE]}
+        ).values_list(*[campo.attname for campo in campos.values()]))
+    gravado = pd.DataFrame(gravadas, columns=list(campos))
+    gravado = pd.DataFrame({nome: _canonicos(campo, gravado[nome]) for nome, campo in campos.items()}, dtype=object)
+    
+    juntos = entrada.merge(gravado, on=unique_fields, how='left', suffixes=('', '_gravado'), indicator=True)
+    novas = (juntos['_merge'] == 'left_only').to_numpy()
+    if not comparados:
+        return novas, np.zeros(len(df), dtype=bool)
+    
+    for nome in manter_se_nulo:
+        if nome in comparados:
+            juntos[nome] = juntos[nome].where(juntos[nome] != NULO, juntos[f'{nome}_gravado'])
+    impressao_entrada = pd.util.hash_pandas_object(juntos[comparados], index=False).to_numpy()
+    impressao_gravada = pd.util.hash_pandas_object(
+        juntos[[f'{nome}_gravado' for nome in comparados]], index=False
+    ).to_numpy()
+    return novas, ~novas & (impressao_entrada != impressao_gravada)
+
+
+def _canonicos(campo, valores):
+    """Valores do campo em texto canônico, iguais para o lido do arquivo e o gravado"""
+    if campo.is_relation:
+        campo = campo.target_field
+    if isinstance(campo, models.DecimalField):
+        quantum = Decimal(1).scaleb(-campo.decimal_places)
+        decimais = (decimal_ou_nulo(v) for v in valores)
+        return [NULO if v is None else str(v.quantize(quantum)) for v in decimais]
+    if isinstance(campo, models.IntegerField):
+        return [NULO if _valor_ou_nulo(v) is None else str(int(v)) for v in valores]
+    return [NULO if _valor_ou_nulo(v) is None else str(v) for v in valores]
+
+
+def inserir_ou_atualizar(modelo, df, unique_fields, manter_se_nulo=()):
+    """
+    Grava as linhas do DataFrame num único INSERT ... ON CONFLICT sobre
+    `unique_fields` (sem chaves repetidas). No PostgreSQL os dados chegam
+    por COPY numa tabela temporária (sem WAL); nos demais bancos, por
+    executemany em lotes.
+    """
+    agora = timezone.now()
+    campos = [f for f in modelo._meta.concrete_fields if not f.primary_key]
+    colunas, valores, atualizar = [], [], []
+    for campo in campos:
+        if campo.name in df:
+            converter = decimal_ou_nulo if isinstance(campo, models.DecimalField) else _valor_ou_nulo
+            serie = [converter(v) for v in df[campo.name]]
+            if campo.name not in unique_fields:
+                atualizar.append(campo)
+        elif getattr(campo, 'auto_now', False) or getattr(campo, 'auto_now_add', False):
+            serie = [agora] * len(df)
+            if campo.auto_now:
+                atualizar.append(campo)
+        else:
+            serie = [campo.get_default()] * len(df)
+        colunas.append(campo.column)
+        valores.append([campo.get_db_prep_save(v, connection) for v in serie])
+    linhas = list(zip(*valores))
+    
+    qn = connection.ops.quote_name
+    tabela = qn(modelo._meta.db_table)
+    chaves = ', '.join(qn(modelo._meta.get_field(nome).column) for nome in unique_fields)
+    atribuicoes = ', '.join(
+        f'{qn(c.column)} = COALESCE(EXCLUDED.{qn(c.column)}, {tabela}.{qn(c.column)})'
+        if c.name in manter_se_nulo else f'{qn(c.column)} = EXCLUDED.{qn(c.column)}'
+        for c in atualizar
+    )
+    conflito = f'ON CONFLICT ({chaves}) DO UPDATE SET {atribuicoes}' if atribuicoes else f'ON CONFLICT ({chaves}) DO NOTHING'
+    lista_colunas = ', '.join(qn(c) for c in colunas)
+    
+    with transaction.atomic(), connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            _copiar_para_temporaria(cursor, modelo._meta.db_table, lista_colunas, linhas)
+            cursor.execute(
+                f'INSERT INTO {tabela} ({lista_colunas}) '
+                f'SELECT {lista_colunas} FROM {qn("carga_" + modelo._meta.db_table)} {conflito}'
+            )
+        else:
+            marcadores = ', '.join(['%s'] * len(colunas))
+            sql = f'INSERT INTO {tabela} ({lista_colunas}) VALUES ({marcadores}) {conflito}'
+            for inicio in range(0, len(linhas), TAMANHO_LOTE):
+                cursor.executemany(sql, linhas[inicio:inicio + TAMANHO_LOTE])
+    return len(linhas)
+
+
+def _valor_ou_nulo(valor):
+    return None if valor is None or (not isinstance(valor, str) and pd.isna(valor)) else valor
+
+
+def _copiar_para_temporaria(cursor, db_table, lista_colunas, linhas):
+    """COPY FROM STDIN das linhas para a tabela temporária carga_<tabela>"""
+    qn = connection.ops.quote_name
+    temporaria = qn('carga_' + db_table)
+    cursor.execute(
+        f'CREATE TEMPORARY TABLE IF NOT EXISTS {temporaria} ON COMMIT DROP AS '
+        f'SELECT {lista_colunas} FROM {qn(db_table)} WITH NO DATA'
+    )
+    cursor.execute(f'TRUNCATE {temporaria}')
+    
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    for linha in linhas:
+        escritor.writerow(['\\N' if v is None else v for v in linha])
+    buffer.seek(0)
+    
+    copy = f"COPY {temporaria} ({lista_colunas}) FROM STDIN WITH (FORMAT csv, NULL '\\N')"
+    bruto = cursor.cursor
+    if hasattr(bruto, 'copy_expert'):
+        bruto.copy_expert(copy, buffer)
+    else:
+        with bruto.copy(copy) as destino:
+            destino.write(buffer.getvalue())
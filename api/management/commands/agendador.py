@@ -0,0 +1,35 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from api import agendador
+
+
+class Command(BaseCommand):
+    help = (
+        'Executa periodicamente o cálculo de impacto, a geração de alertas, o aquecimento do cache '
+        'e a compactação do histórico, com trava no banco para rodar em vários servidores'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--uma-vez', action='store_true',
+            help='Executa as tarefas vencidas e encerra'
+        )
+        parser.add_argument(
+            '--intervalo', type=float, default=30,
+            help='Segundos entre verificações dos agendamentos (padrão: 30)'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            for tarefa in agendador.executar_vencidas():
+                estilo = self.style.SUCCESS if tarefa.status == 'CONCLUIDA' else self.style.ERROR
+                self.stdout.write(estilo(
+                    f'{tarefa.get_tipo_display()}: {tarefa.get_status_display()} em {tarefa.duracao_segundos}s'
+                ))
+            if options['uma_vez']:
+                return
+            # Desencontra as verificações de servidores iniciados juntos
+            time.sleep(options['intervalo'] * random.uniform(0.9, 1.1))
@@ -0,0 +1,18 @@
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+
+from api import cache
+
+
+class Command(BaseCommand):
+    help = 'Preenche o cache de impacto fiscal de todas as empresas com incentivo ativo'
+
+    def add_arguments(self, parser):
+        parser.add_argument('cnpjs', nargs='*', help='Aquece apenas os CNPJs informados')
+
+    def handle(self, *args, **options):
+        try:
+            total = cache.aquecer(options['cnpjs'] or None)
+        except ImproperlyConfigured as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(f'Cache aquecido para {total} empresas'))
@@ -0,0 +1,193 @@
+import json
+import platform
+import statistics
+import tempfile
+import time
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.runner import DiscoverRunner
+from django.test.utils import setup_test_environment, teardown_test_environment
+from rest_framework.test import APIClient
+
+from api import cache
+from api.gerador import GeradorMunicipio
+from api.models import (
+    Empresa, Incentivo, ArrecadacaoISS, ArrecadacaoIPTU, ArrecadacaoAcumulada,
+    Contrapartida, Alerta, CalculoImpacto, Tarefa, ImportacaoArquivo
+)
+
+UPLOADS = [
+    ('upload_empresas', '/api/empresas/upload-csv/', 'empresas'),
+    ('upload_incentivos', '/api/incentivos/upload-csv/', 'incentivos'),
+    ('upload_iss', '/api/arrecadacao-iss/upload-csv/', 'arrecadacao_iss'),
+    ('upload_iptu', '/api/arrecadacao-iptu/upload-csv/', 'arrecadacao_iptu_taxas'),
+]
+
+PROCESSAMENTOS = [
+    ('calcular_todos', '/api/calculos-impacto/calcular-todos/'),
+    ('gerar_alertas', '/api/alertas/gerar-alertas/'),
+]
+
+CONSULTAS = [
+    ('dashboard_resumo', '/api/dashboard/resumo/'),
+    ('ranking', '/api/calculos-impacto/ranking/'),
+    ('listar_empresas', '/api/empresas/'),
+    ('listar_incentivos', '/api/incentivos/'),
+    ('listar_arrecadacao_iss', '/api/arrecadacao-iss/'),
+    ('listar_alertas', '/api/alertas/'),
+    ('listar_calculos', '/api/calculos-impacto/'),
+]
+
+
+class ContadorConsultas:
+    """execute_wrapper que conta as consultas SQL executadas"""
+
+    def __init__(self):
+        self.total = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.total += 1
+        return execute(sql, params, many, context)
+
+
+def medir(funcao):
+    contador = ContadorConsultas()
+    with connection.execute_wrapper(contador):
+        inicio = time.perf_counter()
+        resposta = funcao()
+        segundos = time.perf_counter() - inicio
+    return {'segundos': round(segundos, 4), 'consultas': contador.total, 'status': resposta.status_code}
+
+
+class Command(BaseCommand):
+    help = (
+        'Mede uploads, cálculos e endpoints de consulta sobre dados sintéticos, '
+        'em um banco de teste temporário, e gera resultados em JSON'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--escalas', default='100,1000',
+            help='Quantidades de empresas separadas por vírgula (padrão: 100,1000)'
+        )
+        parser.add_argument('--meses-iss', type=int, default=24)
+        parser.add_argument('--anos-iptu', type=int, default=3)
+        parser.add_argument('--semente', type=int, default=42)
+        parser.add_argument(
+            '--repeticoes', type=int, default=3,
+            help='Execuções de cada endpoint de consulta; vale a mediana (padrão: 3)'
+        )
+        parser.add_argument('--saida', help='Arquivo JSON de resultados (padrão: saída padrão)')
+        parser.add_argument('--comparar', help='JSON de uma execução anterior para detectar regressões')
+        parser.add_argument(
+            '--tolerancia', type=float, default=0.25,
+            help='Aumento relativo de tempo aceito na comparação (padrão: 0.25)'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            escalas = [int(escala) for escala in options['escalas'].split(',')]
+        except ValueError:
+            raise CommandError('--escalas deve ser uma lista de inteiros separados por vírgula')
+
+        setup_test_environment()
+        runner = DiscoverRunner(verbosity=0, interactive=False)
+        bancos = runner.setup_databases()
+        try:
+            resultados = {
+                'gerado_em': datetime.now().isoformat(timespec='seconds'),
+                'banco': connection.vendor,
+                'python': platform.python_version(),
+                'semente': options['semente'],
+                'meses_iss': options['meses_iss'],
+                'anos_iptu': options['anos_iptu'],
+                'escalas': [self.executar_escala(escala, options) for escala in escalas]
+            }
+        finally:
+            runner.teardown_databases(bancos)
+            teardown_test_environment()
+
+        saida = json.dumps(resultados, indent=2, ensure_ascii=False)
+        if options['saida']:
+            with open(options['saida'], 'w') as arquivo:
+                arquivo.write(saida)
+            self.stderr.write(f"Resultados gravados em {options['saida']}")
+        else:
+            self.stdout.write(saida)
+
+        if options['comparar']:
+            self.comparar(resultados, options['comparar'], options['tolerancia'])
+
+    def limpar(self):
+        for modelo in [Tarefa, ImportacaoArquivo, Alerta, CalculoImpacto, Contrapartida, ArrecadacaoAcumulada,
+                       ArrecadacaoISS, ArrecadacaoIPTU, Incentivo, Empresa]:
+            modelo.objects.all().delete()
+        cache._backend().clear()
+        cache._lru.clear()
+
+    def executar_escala(self, escala, options):
+        self.limpar()
+        self.stderr.write(f'Escala: {escala} empresas')
+
+        gerador = GeradorMunicipio(
+            empresas=escala,
+            incentivos=int(escala * 0.6),
+            meses_iss=options['meses_iss'],
+            anos_iptu=options['anos_iptu'],
+            contrapartidas=int(escala * 0.6),
+            semente=options['semente']
+        )
+        client = APIClient()
+        operacoes = {}
+
+        with tempfile.TemporaryDirectory() as diretorio:
+            caminhos = gerador.salvar_csvs(diretorio)
+            for nome, url, tabela in UPLOADS:
+                with open(caminhos[tabela], 'rb') as arquivo:
+                    operacoes[nome] = medir(lambda: client.post(url, {'file': arquivo}, format='multipart'))
+        gerador.gravar_contrapartidas()
+
+        for nome, url in PROCESSAMENTOS:
+            operacoes[nome] = medir(lambda: client.post(url))
+
+        for nome, url in CONSULTAS:
+            medicoes = [medir(lambda: client.get(url)) for _ in range(max(options['repeticoes'], 1))]
+            operacoes[nome] = {
+                'segundos': round(statistics.median(m['segundos'] for m in medicoes), 4),
+                'consultas': medicoes[-1]['consultas'],
+                'status': medicoes[-1]['status']
+            }
+
+        return {
+            'empresas': escala,
+            'registros': {
+                'empresas': Empresa.objects.count(),
+                'incentivos': Incentivo.objects.count(),
+                'arrecadacao_iss': ArrecadacaoISS.objects.count(),
+                'arrecadacao_iptu': ArrecadacaoIPTU.objects.count(),
+                'contrapartidas': Contrapartida.objects.count(),
+                'calculos': CalculoImpacto.objects.count(),
+                'alertas': Alerta.objects.count(),
+            },
+            'operacoes': operacoes
+        }
+
+    def comparar(self, resultados, caminho, tolerancia):
+        with open(caminho) as arquivo:
+            anterior = {escala['empresas']: escala['operacoes'] for escala in json.load(arquivo)['escalas']}
+
+        regressoes = []
+        for escala in resultados['escalas']:
+            for nome, medicao in escala['operacoes'].items():
+                base = anterior.get(escala['empresas'], {}).get(nome)
+                if base and base['segundos'] > 0 and medicao['segundos'] > base['segundos'] * (1 + tolerancia):
+                    regressoes.append(
+                        f"{escala['empresas']} empresas / {nome}: "
+                        f"{base['segundos']}s -> {medicao['segundos']}s"
+                    )
+
+        if regressoes:
+            raise CommandError('Regressões de desempenho:\n' + '\n'.join(regressoes))
+        self.stderr.write(self.style.SUCCESS('Nenhuma regressão acima da tolerância'))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from api.services import CalculoImpactoService
+
+
+class Command(BaseCommand):
+    help = 'Compacta o histórico de CalculoImpacto, mantendo o último cálculo de cada mês'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dias-retencao', type=int, default=30,
+            help='Cálculos com fim mais recente que isso não são compactados (padrão: 30)'
+        )
+
+    def handle(self, *args, **options):
+        result = CalculoImpactoService.compactar_historico(options['dias_retencao'])
+        self.stdout.write(self.style.SUCCESS(result['message']))
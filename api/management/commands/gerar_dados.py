@@ -0,0 +1,46 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from api.gerador import GeradorMunicipio
+
+
+class Command(BaseCommand):
+    help = (
+        'Gera CSVs sintéticos de empresas, incentivos, ISS e IPTU no formato de upload e grava as '
+        'contrapartidas dos incentivos que já estiverem no banco'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('diretorio', help='Diretório onde os CSVs serão gravados')
+        parser.add_argument('--empresas', type=int, default=100)
+        parser.add_argument('--incentivos', type=int, help='Padrão: 60%% das empresas')
+        parser.add_argument('--meses-iss', type=int, default=24)
+        parser.add_argument('--anos-iptu', type=int, default=3)
+        parser.add_argument(
+            '--contrapartidas', type=int,
+            help='Padrão: 60%% das empresas; gravadas apenas para incentivos já carregados no banco'
+        )
+        parser.add_argument('--semente', type=int, default=42)
+
+    def handle(self, *args, **options):
+        os.makedirs(options['diretorio'], exist_ok=True)
+        padrao = int(options['empresas'] * 0.6)
+        gerador = GeradorMunicipio(
+            empresas=options['empresas'],
+            incentivos=options['incentivos'] if options['incentivos'] is not None else padrao,
+            meses_iss=options['meses_iss'],
+            anos_iptu=options['anos_iptu'],
+            contrapartidas=options['contrapartidas'] if options['contrapartidas'] is not None else padrao,
+            semente=options['semente']
+        )
+        for nome, caminho in gerador.salvar_csvs(options['diretorio']).items():
+            self.stdout.write(self.style.SUCCESS(f'{caminho}: {len(gerador.gerar()[nome])} linhas'))
+
+        # Os incentivos entram pelo upload dos CSVs: rodar de novo com a mesma semente
+        # depois da carga grava as contrapartidas ligadas a eles
+        geradas = len(gerador.gerar()['contrapartidas'])
+        gravadas = gerador.gravar_contrapartidas()
+        self.stdout.write(self.style.SUCCESS(
+            f'Contrapartidas: {gravadas} de {geradas} gravadas (incentivos já carregados no banco)'
+        ))
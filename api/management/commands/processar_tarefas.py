@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api import tarefas
+
+
+class Command(BaseCommand):
+    help = 'Executa as tarefas em segundo plano enfileiradas (cálculo de impacto, alertas)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--uma-vez', action='store_true',
+            help='Esvazia a fila e encerra, sem aguardar novas tarefas'
+        )
+        parser.add_argument(
+            '--intervalo', type=float, default=5,
+            help='Segundos entre verificações da fila (padrão: 5)'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            executadas = tarefas.processar_pendentes()
+            if executadas:
+                self.stdout.write(self.style.SUCCESS(f'{executadas} tarefas executadas'))
+            if options['uma_vez']:
+                return
+            time.sleep(options['intervalo'])
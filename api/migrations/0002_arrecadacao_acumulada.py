@@ -0,0 +1,78 @@
+# Generated by Django 5.2.7 on 2026-10-18 17:28
+
+from collections import defaultdict
+from decimal import Decimal
+from itertools import accumulate
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def montar_acumulados(linhas_iss, linhas_iptu):
+    """
+    Cópia de api.acumulados.montar_acumulados na data desta migração:
+    {cnpj: [(mes_indice, iss_acumulado, iptu_acumulado), ...]}
+    """
+    zero = Decimal('0.00')
+    mensal = defaultdict(lambda: defaultdict(lambda: [zero, zero]))
+    for cnpj, mes_indice, valor in linhas_iss:
+        mensal[cnpj][mes_indice][0] += valor or zero
+    for cnpj, mes_indice, valor in linhas_iptu:
+        mensal[cnpj][mes_indice][1] += valor or zero
+
+    acumulados = {}
+    for cnpj, meses in mensal.items():
+        indices = sorted(meses)
+        iss = accumulate(meses[i][0] for i in indices)
+        iptu = accumulate(meses[i][1] for i in indices)
+        acumulados[cnpj] = list(zip(indices, iss, iptu))
+    return acumulados
+
+
+def popular_acumulados(apps, schema_editor):
+    ArrecadacaoISS = apps.get_model('api', 'ArrecadacaoISS')
+    ArrecadacaoIPTU = apps.get_model('api', 'ArrecadacaoIPTU')
+    ArrecadacaoAcumulada = apps.get_model('api', 'ArrecadacaoAcumulada')
+
+    linhas_iss = (
+        (cnpj, mes_ref.year * 12 + mes_ref.month - 1, valor)
+        for cnpj, mes_ref, valor in ArrecadacaoISS.objects.values_list('empresa_id', 'mes_ref', 'valor_iss')
+    )
+    linhas_iptu = (
+        (cnpj, ano_ref * 12, valor_iptu + valor_taxas)
+        for cnpj, ano_ref, valor_iptu, valor_taxas in ArrecadacaoIPTU.objects.values_list(
+            'empresa_id', 'ano_ref', 'valor_iptu', 'valor_taxas'
+        )
+    )
+    ArrecadacaoAcumulada.objects.bulk_create([
+        ArrecadacaoAcumulada(empresa_id=cnpj, mes_indice=mes_indice, iss_acumulado=iss, iptu_acumulado=iptu)
+        for cnpj, linhas in montar_acumulados(linhas_iss, linhas_iptu).items()
+        for mes_indice, iss, iptu in linhas
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArrecadacaoAcumulada',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mes_indice', models.IntegerField()),
+                ('iss_acumulado', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('iptu_acumulado', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('atualizado_em', models.DateTimeField(auto_now=True)),
+                ('empresa', models.ForeignKey(db_column='cnpj', on_delete=django.db.models.deletion.CASCADE, related_name='arrecadacao_acumulada', to='api.empresa', to_field='cnpj')),
+            ],
+            options={
+                'db_table': 'arrecadacao_acumulada',
+                'ordering': ['empresa', 'mes_indice'],
+                'unique_together': {('empresa', 'mes_indice')},
+            },
+        ),
+        migrations.RunPython(popular_acumulados, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.7 on 2026-10-18 17:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_arrecadacao_acumulada'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tarefa',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('CALCULAR_TODOS', 'Cálculo de Impacto de Todas as Empresas'), ('GERAR_ALERTAS', 'Geração de Alertas')], max_length=30)),
+                ('status', models.CharField(choices=[('PENDENTE', 'Pendente'), ('EXECUTANDO', 'Executando'), ('CONCLUIDA', 'Concluída'), ('ERRO', 'Erro')], default='PENDENTE', max_length=15)),
+                ('parametros', models.JSONField(blank=True, default=dict)),
+                ('total', models.IntegerField(default=0)),
+                ('processados', models.IntegerField(default=0)),
+                ('erros', models.JSONField(blank=True, default=list)),
+                ('resultado', models.JSONField(blank=True, null=True)),
+                ('worker', models.CharField(blank=True, max_length=100)),
+                ('criada_em', models.DateTimeField(auto_now_add=True)),
+                ('iniciada_em', models.DateTimeField(blank=True, null=True)),
+                ('concluida_em', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'db_table': 'tarefas',
+                'ordering': ['-criada_em'],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('status__in', ['PENDENTE', 'EXECUTANDO'])), fields=('tipo',), name='tarefa_ativa_unica_por_tipo')],
+            },
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.7 on 2026-10-18 18:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_tarefa'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportacaoArquivo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('EMPRESAS', 'Empresas'), ('INCENTIVOS', 'Incentivos'), ('ISS', 'Arrecadação ISS'), ('IPTU', 'Arrecadação IPTU')], max_length=20)),
+                ('hash_conteudo', models.CharField(max_length=64)),
+                ('nome_arquivo', models.CharField(max_length=255)),
+                ('tamanho_bytes', models.BigIntegerField(default=0)),
+                ('tamanho_bloco', models.IntegerField()),
+                ('blocos_concluidos', models.IntegerField(default=0)),
+                ('total_linhas', models.IntegerField(default=0)),
+                ('linhas_gravadas', models.IntegerField(default=0)),
+                ('erros', models.JSONField(blank=True, default=dict)),
+                ('alteracoes', models.JSONField(blank=True, default=dict)),
+                ('resultado', models.JSONField(blank=True, null=True)),
+                ('mensagem_erro', models.TextField(blank=True)),
+                ('status', models.CharField(choices=[('PROCESSANDO', 'Processando'), ('CONCLUIDA', 'Concluída'), ('ERRO', 'Erro')], default='PROCESSANDO', max_length=15)),
+                ('iniciada_em', models.DateTimeField(auto_now_add=True)),
+                ('concluida_em', models.DateTimeField(blank=True, null=True)),
+                ('duracao_segundos', models.FloatField(default=0)),
+            ],
+            options={
+                'db_table': 'importacoes_arquivo',
+                'ordering': ['-iniciada_em'],
+                'unique_together': {('tipo', 'hash_conteudo')},
+            },
+        ),
+    ]
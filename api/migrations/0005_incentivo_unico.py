@@ -0,0 +1,33 @@
+# Generated by Django 5.2.7 on 2026-10-18 18:04
+
+from django.db import migrations, models
+
+
+def remover_duplicados(apps, schema_editor):
+    """Mantém o incentivo mais recente de cada chave, levando as contrapartidas dos demais"""
+    Incentivo = apps.get_model('api', 'Incentivo')
+    Contrapartida = apps.get_model('api', 'Contrapartida')
+
+    mantidos = {}
+    for pk, *chave in Incentivo.objects.order_by('-pk').values_list(
+        'pk', 'empresa_id', 'instrumento_legal', 'tipo_incentivo', 'data_inicio'
+    ):
+        mantido = mantidos.setdefault(tuple(chave), pk)
+        if mantido != pk:
+            Contrapartida.objects.filter(incentivo_id=pk).update(incentivo_id=mantido)
+            Incentivo.objects.filter(pk=pk).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_importacao_arquivo'),
+    ]
+
+    operations = [
+        migrations.RunPython(remover_duplicados, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='incentivo',
+            constraint=models.UniqueConstraint(fields=('empresa', 'instrumento_legal', 'tipo_incentivo', 'data_inicio'), name='incentivo_unico'),
+        ),
+    ]
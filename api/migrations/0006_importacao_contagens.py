@@ -0,0 +1,33 @@
+# Generated by Django 5.2.7 on 2026-10-18 19:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_incentivo_unico'),
+    ]
+
+    operations = [
+        migrations.RenameField(
+            model_name='importacaoarquivo',
+            old_name='linhas_gravadas',
+            new_name='linhas_processadas',
+        ),
+        migrations.AddField(
+            model_name='importacaoarquivo',
+            name='linhas_inseridas',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='importacaoarquivo',
+            name='linhas_atualizadas',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='importacaoarquivo',
+            name='linhas_inalteradas',
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.7 on 2026-10-18 18:23
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def ignorar_duplicados(apps, schema_editor):
+    """Mantém ativo o alerta mais recente de cada empresa e tipo; os demais passam a IGNORADO"""
+    Alerta = apps.get_model('api', 'Alerta')
+
+    mantidos = {}
+    duplicados = []
+    for pk, *chave in Alerta.objects.filter(status='ATIVO').order_by('-data_alerta', '-pk').values_list(
+        'pk', 'empresa_id', 'tipo_alerta'
+    ):
+        if mantidos.setdefault(tuple(chave), pk) != pk:
+            duplicados.append(pk)
+    for inicio in range(0, len(duplicados), 500):
+        Alerta.objects.filter(pk__in=duplicados[inicio:inicio + 500]).update(
+            status='IGNORADO', observacoes='Duplicado de outro alerta ativo'
+        )
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_importacao_contagens'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(ignorar_duplicados, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='alerta',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'ATIVO')), fields=('empresa', 'tipo_alerta'), name='alerta_ativo_unico'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.7 on 2026-10-18 18:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_alerta_ativo_unico'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='tarefa',
+            name='tipo',
+            field=models.CharField(choices=[('CALCULAR_TODOS', 'Cálculo de Impacto de Todas as Empresas'), ('GERAR_ALERTAS', 'Geração de Alertas'), ('AQUECER_CACHE', 'Aquecimento do Cache de Impacto'), ('COMPACTAR_CALCULOS', 'Compactação do Histórico de Cálculos')], max_length=30),
+        ),
+        migrations.CreateModel(
+            name='Agendamento',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('CALCULAR_TODOS', 'Cálculo de Impacto de Todas as Empresas'), ('GERAR_ALERTAS', 'Geração de Alertas'), ('AQUECER_CACHE', 'Aquecimento do Cache de Impacto'), ('COMPACTAR_CALCULOS', 'Compactação do Histórico de Cálculos')], max_length=30, unique=True)),
+                ('proxima_execucao', models.DateTimeField()),
+                ('dono', models.CharField(blank=True, max_length=100)),
+                ('trava_expira_em', models.DateTimeField(blank=True, null=True)),
+                ('ultima_tarefa', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='api.tarefa')),
+            ],
+            options={
+                'db_table': 'agendamentos',
+                'ordering': ['tipo'],
+            },
+        ),
+    ]
@@ -0,0 +1,70 @@
+from collections import defaultdict
+from decimal import Decimal
+from itertools import accumulate
+
+from django.db import migrations
+
+
+def reconstruir_acumulados(apps, cnpjs):
+    """Refaz as somas de prefixo dos CNPJs com o mesmo algoritmo da 0002"""
+    ArrecadacaoISS = apps.get_model('api', 'ArrecadacaoISS')
+    ArrecadacaoIPTU = apps.get_model('api', 'ArrecadacaoIPTU')
+    ArrecadacaoAcumulada = apps.get_model('api', 'ArrecadacaoAcumulada')
+
+    zero = Decimal('0.00')
+    mensal = defaultdict(lambda: defaultdict(lambda: [zero, zero]))
+    for cnpj, mes_ref, valor in ArrecadacaoISS.objects.filter(empresa_id__in=cnpjs).values_list(
+        'empresa_id', 'mes_ref', 'valor_iss'
+    ):
+        mensal[cnpj][mes_ref.year * 12 + mes_ref.month - 1][0] += valor or zero
+    for cnpj, ano_ref, valor_iptu, valor_taxas in ArrecadacaoIPTU.objects.filter(empresa_id__in=cnpjs).values_list(
+        'empresa_id', 'ano_ref', 'valor_iptu', 'valor_taxas'
+    ):
+        mensal[cnpj][ano_ref * 12][1] += (valor_iptu or zero) + (valor_taxas or zero)
+
+    ArrecadacaoAcumulada.objects.filter(empresa_id__in=cnpjs).delete()
+    linhas = []
+    for cnpj, meses in mensal.items():
+        indices = sorted(meses)
+        iss = accumulate(meses[i][0] for i in indices)
+        iptu = accumulate(meses[i][1] for i in indices)
+        linhas.extend(
+            ArrecadacaoAcumulada(empresa_id=cnpj, mes_indice=indice, iss_acumulado=i, iptu_acumulado=p)
+            for indice, i, p in zip(indices, iss, iptu)
+        )
+    ArrecadacaoAcumulada.objects.bulk_create(linhas, batch_size=1000)
+
+
+def normalizar_mes_ref(apps, schema_editor):
+    """
+    Move as competências de ISS gravadas fora do dia 1 para o dia 1 do mês.
+    Se o mês já tiver outra linha do CNPJ, fica a gravada por último.
+    """
+    ArrecadacaoISS = apps.get_model('api', 'ArrecadacaoISS')
+
+    fora_do_dia_1 = list(ArrecadacaoISS.objects.exclude(mes_ref__day=1).order_by('pk'))
+    mesclados = set()
+    for linha in fora_do_dia_1:
+        mes_ref = linha.mes_ref.replace(day=1)
+        outras = ArrecadacaoISS.objects.filter(empresa_id=linha.empresa_id, mes_ref=mes_ref)
+        if outras.exists():
+            mesclados.add(linha.empresa_id)
+            if outras.filter(pk__gt=linha.pk).exists():
+                linha.delete()
+                continue
+            outras.delete()
+        ArrecadacaoISS.objects.filter(pk=linha.pk).update(mes_ref=mes_ref)
+
+    if mesclados:
+        reconstruir_acumulados(apps, sorted(mesclados))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_agendamento'),
+    ]
+
+    operations = [
+        migrations.RunPython(normalizar_mes_ref, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.7 on 2026-10-18 18:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_iss_mes_ref_dia_1'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AlteracaoDados',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cnpj', models.CharField(max_length=14, unique=True)),
+                ('alterado_em', models.DateTimeField()),
+            ],
+            options={
+                'db_table': 'alteracoes_dados',
+                'ordering': ['cnpj'],
+            },
+        ),
+    ]
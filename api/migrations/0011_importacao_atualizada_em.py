@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 19:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_alteracao_dados'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importacaoarquivo',
+            name='atualizada_em',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 18:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_importacao_atualizada_em'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='importacaoarquivo',
+            name='tipo',
+            field=models.CharField(choices=[('EMPRESAS', 'Empresas'), ('INCENTIVOS', 'Incentivos'), ('ISS', 'Arrecadação ISS'), ('IPTU', 'Arrecadação IPTU'), ('PACOTE', 'Pacote ZIP')], max_length=20),
+        ),
+    ]
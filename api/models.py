@@ -70,6 +70,13 @@ class Incentivo(models.Model):
     class Meta:
         db_table = 'incentivos'
         ordering = ['-data_inicio']
+        constraints = [
+            # Chave natural usada pela carga dos CSVs (reenvio atualiza em vez de duplicar)
+            models.UniqueConstraint(
+                fields=['empresa', 'instrumento_legal', 'tipo_incentivo', 'data_inicio'],
+                name='incentivo_unico'
+            ),
+        ]
     
     def __str__(self):
         return f"{self.empresa.cnpj} - {self.get_tipo_incentivo_display()}"
@@ -110,6 +117,40 @@ class ArrecadacaoIPTU(models.Model):
         return f"{self.empresa.cnpj} - {self.ano_ref}"
 
 
+class ArrecadacaoAcumulada(models.Model):
+    """Somas de prefixo mensais de ISS e IPTU+taxas por CNPJ"""
+    empresa = models.ForeignKey(Empresa, on_delete=models.CASCADE, related_name='arrecadacao_acumulada', to_field='cnpj', db_column='cnpj')
+    mes_indice = models.IntegerField()
+    iss_acumulado = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+    iptu_acumulado = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+    atualizado_em = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'arrecadacao_acumulada'
+        unique_together = [['empresa', 'mes_indice']]
+        ordering = ['empresa', 'mes_indice']
+    
+    def __str__(self):
+        return f"{self.empresa_id} - {self.mes_indice // 12}/{self.mes_indice % 12 + 1:02d}"
+
+
+class AlteracaoDados(models.Model):
+    """
+    Última alteração de incentivos ou arrecadação de um CNPJ. Sem chave
+    estrangeira, para continuar registrada mesmo quando as linhas do CNPJ
+    (ou a própria empresa) são apagadas.
+    """
+    cnpj = models.CharField(max_length=14, unique=True)
+    alterado_em = models.DateTimeField()
+    
+    class Meta:
+        db_table = 'alteracoes_dados'
+        ordering = ['cnpj']
+    
+    def __str__(self):
+        return f"{self.cnpj} - {self.alterado_em}"
+
+
 class Contrapartida(models.Model):
     STATUS_CHOICES = [
         ('PENDENTE', 'Pendente'),
@@ -179,6 +220,14 @@ class Alerta(models.Model):
     class Meta:
         db_table = 'alertas'
         ordering = ['-data_alerta', '-severidade']
+        constraints = [
+            # Um único alerta ativo por empresa e tipo, também entre gerações simultâneas
+            models.UniqueConstraint(
+                fields=['empresa', 'tipo_alerta'],
+                condition=models.Q(status='ATIVO'),
+                name='alerta_ativo_unico'
+            ),
+        ]
     
     def __str__(self):
         return f"{self.get_tipo_alerta_display()} - {self.empresa.cnpj}"
@@ -230,3 +279,125 @@ class Auditoria(models.Model):
     
     def __str__(self):
         return f"{self.usuario} - {self.get_acao_display()}"
+
+
+class Tarefa(models.Model):
+    TIPO_CHOICES = [
+        ('CALCULAR_TODOS', 'Cálculo de Impacto de Todas as Empresas'),
+        ('GERAR_ALERTAS', 'Geração de Alertas'),
+        ('AQUECER_CACHE', 'Aquecimento do Cache de Impacto'),
+        ('COMPACTAR_CALCULOS', 'Compactação do Histórico de Cálculos'),
+    ]
+    
+    STATUS_CHOICES = [
+        ('PENDENTE', 'Pendente'),
+        ('EXECUTANDO', 'Executando'),
+        ('CONCLUIDA', 'Concluída'),
+        ('ERRO', 'Erro'),
+    ]
+    
+    tipo = models.CharField(max_length=30, choices=TIPO_CHOICES)
+    status = models.CharField(max_length=15, choices=STATUS_CHOICES, default='PENDENTE')
+    parametros = models.JSONField(default=dict, blank=True)
+    total = models.IntegerField(default=0)
+    processados = models.IntegerField(default=0)
+    erros = models.JSONField(default=list, blank=True)
+    resultado = models.JSONField(blank=True, null=True)
+    worker = models.CharField(max_length=100, blank=True)
+    criada_em = models.DateTimeField(auto_now_add=True)
+    iniciada_em = models.DateTimeField(blank=True, null=True)
+    concluida_em = models.DateTimeField(blank=True, null=True)
+    
+    class Meta:
+        db_table = 'tarefas'
+        ordering = ['-criada_em']
+        constraints = [
+            # Uma única tarefa ativa por tipo: novas solicitações são agrupadas nela
+            models.UniqueConstraint(
+                fields=['tipo'],
+                condition=models.Q(status__in=['PENDENTE', 'EXECUTANDO']),
+                name='tarefa_ativa_unica_por_tipo'
+            ),
+        ]
+    
+    @property
+    def progresso(self):
+        if self.status == 'CONCLUIDA':
+            return 100
+        if not self.total:
+            return 0
+        return round(100 * self.processados / self.total)
+    
+    @property
+    def duracao_segundos(self):
+        if not (self.iniciada_em and self.concluida_em):
+            return None
+        return round((self.concluida_em - self.iniciada_em).total_seconds(), 3)
+    
+    def __str__(self):
+        return f"{self.get_tipo_display()} - {self.get_status_display()}"
+
+
+class Agendamento(models.Model):
+    """
+    Próxima execução de um tipo de tarefa periódica e a trava (lease) de
+    quem a está executando, compartilhada entre os servidores
+    """
+    tipo = models.CharField(max_length=30, choices=Tarefa.TIPO_CHOICES, unique=True)
+    proxima_execucao = models.DateTimeField()
+    dono = models.CharField(max_length=100, blank=True)
+    trava_expira_em = models.DateTimeField(blank=True, null=True)
+    ultima_tarefa = models.ForeignKey(Tarefa, on_delete=models.SET_NULL, blank=True, null=True, related_name='+')
+    
+    class Meta:
+        db_table = 'agendamentos'
+        ordering = ['tipo']
+    
+    def __str__(self):
+        return f"{self.get_tipo_display()} - próxima em {self.proxima_execucao}"
+
+
+class ImportacaoArquivo(models.Model):
+    """Manifesto de um arquivo enviado por upload, identificado pelo hash do conteúdo"""
+    TIPO_CHOICES = [
+        ('EMPRESAS', 'Empresas'),
+        ('INCENTIVOS', 'Incentivos'),
+        ('ISS', 'Arrecadação ISS'),
+        ('IPTU', 'Arrecadação IPTU'),
+        ('PACOTE', 'Pacote ZIP'),
+    ]
+    
+    STATUS_CHOICES = [
+        ('PROCESSANDO', 'Processando'),
+        ('CONCLUIDA', 'Concluída'),
+        ('ERRO', 'Erro'),
+    ]
+    
+    tipo = models.CharField(max_length=20, choices=TIPO_CHOICES)
+    hash_conteudo = models.CharField(max_length=64)
+    nome_arquivo = models.CharField(max_length=255)
+    tamanho_bytes = models.BigIntegerField(default=0)
+    tamanho_bloco = models.IntegerField()
+    blocos_concluidos = models.IntegerField(default=0)
+    total_linhas = models.IntegerField(default=0)
+    linhas_processadas = models.IntegerField(default=0)
+    linhas_inseridas = models.IntegerField(default=0)
+    linhas_atualizadas = models.IntegerField(default=0)
+    linhas_inalteradas = models.IntegerField(default=0)
+    erros = models.JSONField(default=dict, blank=True)
+    alteracoes = models.JSONField(default=dict, blank=True)
+    resultado = models.JSONField(blank=True, null=True)
+    mensagem_erro = models.TextField(blank=True)
+    status = models.CharField(max_length=15, choices=STATUS_CHOICES, default='PROCESSANDO')
+    iniciada_em = models.DateTimeField(auto_now_add=True)
+    atualizada_em = models.DateTimeField(auto_now=True)
+    concluida_em = models.DateTimeField(blank=True, null=True)
+    duracao_segundos = models.FloatField(default=0)
+    
+    class Meta:
+        db_table = 'importacoes_arquivo'
+        unique_together = [['tipo', 'hash_conteudo']]
+        ordering = ['-iniciada_em']
+    
+    def __str__(self):
+        return f"{self.get_tipo_display()} - {self.nome_arquivo} ({self.get_status_display()})"
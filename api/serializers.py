@@ -1,7 +1,7 @@
 from rest_framework import serializers
 from .models import (
     Empresa, Incentivo, ArrecadacaoISS, ArrecadacaoIPTU,
-    Contrapartida, Alerta, CalculoImpacto, Auditoria
+    Contrapartida, Alerta, CalculoImpacto, Auditoria, Tarefa, ImportacaoArquivo
 )
 
 
@@ -13,6 +13,9 @@ class EmpresaSerializer(serializers.ModelSerializer):
         fields = '__all__'
         
     def get_total_incentivos(self, obj):
+        # Anotado pelo queryset do EmpresaViewSet; sem a anotação, conta no banco
+        if hasattr(obj, 'total_incentivos_ativos'):
+            return obj.total_incentivos_ativos
         return obj.incentivos.filter(status='ATIVO').count()
 
 
@@ -30,6 +33,10 @@ class ArrecadacaoISSSerializer(serializers.ModelSerializer):
     class Meta:
         model = ArrecadacaoISS
         fields = '__all__'
+    
+    def validate_mes_ref(self, value):
+        # A competência é o mês: qualquer dia vira o dia 1, como nos acumulados
+        return value.replace(day=1)
 
 
 class ArrecadacaoIPTUSerializer(serializers.ModelSerializer):
@@ -73,6 +80,36 @@ class AuditoriaSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
+class TarefaSerializer(serializers.ModelSerializer):
+    progresso = serializers.IntegerField(read_only=True)
+    duracao_segundos = serializers.FloatField(read_only=True)
+    
+    class Meta:
+        model = Tarefa
+        fields = '__all__'
+
+
+class ImportacaoArquivoSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ImportacaoArquivo
+        exclude = ['alteracoes']
+
+
+class SimulacaoSerializer(serializers.Serializer):
+    tipos_incentivo = serializers.ListField(
+        child=serializers.ChoiceField(choices=Incentivo.TIPO_CHOICES), required=False
+    )
+    cnpjs = serializers.ListField(child=serializers.CharField(max_length=14), required=False)
+    percentual_desconto = serializers.DecimalField(
+        max_digits=5, decimal_places=2, min_value=0, max_value=100, required=False
+    )
+    valor_fixo_desconto = serializers.DecimalField(max_digits=15, decimal_places=2, min_value=0, required=False)
+    baseline_iss_12m = serializers.DecimalField(max_digits=15, decimal_places=2, min_value=0, required=False)
+    baseline_iptu_12m = serializers.DecimalField(max_digits=15, decimal_places=2, min_value=0, required=False)
+    taxa_desconto = serializers.DecimalField(max_digits=6, decimal_places=4, min_value=0, default=0)
+    periodo_fim = serializers.DateField(required=False)
+
+
 class UploadCSVSerializer(serializers.Serializer):
     file = serializers.FileField()
     
@@ -3,9 +3,20 @@ Serviços para processamento de arquivos CSV
 """
 import pandas as pd
 import logging
+import time
+import zipfile
 from datetime import datetime
+from django.db import transaction
 from .models import Empresa, Incentivo, ArrecadacaoISS, ArrecadacaoIPTU
-from .utils import processar_linha_empresa, formatar_response_upload
+from .utils import processar_linha_empresa, formatar_response_upload, resumir_alteracoes
+from .ingestao import (
+    linhas_com_cnpj_valido, linhas_com_empresa, coluna_numerica, coluna_data, registrar_erros,
+    listar_erros, carregar_em_lote, ler_em_blocos, COLUNAS,
+    iniciar_importacao, registrar_bloco, registrar_pacote, finalizar_importacao,
+    membros_do_pacote, LeituraPacote, consultar_cnpjs_novos, contagem_carga
+)
+from .alteracoes import registrar_alteracao
+from .alertas import gerar_alertas
 
 logger = logging.getLogger(__name__)
 
@@ -14,193 +25,457 @@ class CSVUploadService:
     Serviço para processamento de uploads CSV
     """
     
+    # Por tipo de upload, na ordem de dependência: (método que grava um bloco,
+    # descrição, atualiza acumulados). Os métodos recebem (df, erros,
+    # alteracoes, cnpjs), onde cnpjs é o conjunto de CNPJs cadastrados já
+    # conhecido, compartilhado entre as etapas de um pacote.
+    UPLOADS = {
+        'EMPRESAS': ('gravar_bloco_empresas', 'empresas', True),
+        'INCENTIVOS': ('gravar_bloco_incentivos', 'incentivos', False),
+        'ISS': ('gravar_bloco_iss', 'registros de ISS', True),
+        'IPTU': ('gravar_bloco_iptu', 'registros de IPTU', True),
+    }
+    
     @staticmethod
-    def processar_empresas_csv(file):
+    def eventos_em_blocos(file, tipo, forcar=False):
         """
-        Processa arquivo CSV de empresas
+        Processa o upload bloco a bloco, gerando um evento de progresso por
+        bloco gravado; o último evento ('concluido') traz o resultado.
+        Cada bloco é registrado no manifesto de importação na mesma
+        transação. Arquivo idêntico a uma importação concluída não é
+        reprocessado (a não ser com `forcar`); importação interrompida
+        continua do último bloco.
         """
+        nome_metodo, descricao, acumulados = CSVUploadService.UPLOADS[tipo]
+        gravar_bloco = getattr(CSVUploadService, nome_metodo)
+        
+        importacao = iniciar_importacao(tipo, file, forcar)
+        if importacao.status == 'CONCLUIDA':
+            yield {
+                'evento': 'concluido',
+                'resultado': {**importacao.resultado, 'duplicado': True, 'importacao_id': importacao.pk}
+            }
+            return
+        
+        yield {'evento': 'inicio', 'importacao_id': importacao.pk, 'blocos_concluidos': importacao.blocos_concluidos}
+        inicio = time.perf_counter()
+        linhas_lidas = 0
         try:
-            df = pd.read_csv(file)
-            count = 0
-            errors = []
-            
-            for idx, row in df.iterrows():
-                try:
-                    dados_empresa = processar_linha_empresa(row)
-                    
-                    # Adicionar data_abertura se existir
-                    if 'data_abertura' in row and pd.notna(row['data_abertura']):
-                        dados_empresa['data_abertura'] = row['data_abertura']
-                    
-                    Empresa.objects.update_or_create(
-                        cnpj=dados_empresa['cnpj'],
-                        defaults=dados_empresa
-                    )
-                    count += 1
-                except Exception as e:
-                    errors.append(f"Linha {idx + 2}: {str(e)}")
-                    logger.error(f"Erro na linha {idx + 2}: {str(e)}")
-            
-            return formatar_response_upload(count, errors, 'empresas')
+            blocos = ler_em_blocos(file, importacao.tamanho_bloco, COLUNAS[tipo], dtype={'cnpj': str})
+            for numero, df in enumerate(blocos):
+                if numero < importacao.blocos_concluidos:
+                    continue
+                erros_bloco = {}
+                alteracoes_bloco = {}
+                with transaction.atomic():
+                    contagem = gravar_bloco(df, erros_bloco, alteracoes_bloco)
+                    registrar_bloco(importacao, len(df), contagem, erros_bloco, alteracoes_bloco)
+                
+                linhas_lidas += len(df)
+                segundos = time.perf_counter() - inicio
+                yield {
+                    'evento': 'progresso',
+                    'bloco': numero + 1,
+                    'linhas_lidas': importacao.total_linhas,
+                    'linhas_gravadas': importacao.linhas_inseridas + importacao.linhas_atualizadas,
+                    'linhas_inalteradas': importacao.linhas_inalteradas,
+                    'erros': len(importacao.erros),
+                    'linhas_por_segundo': round(linhas_lidas / segundos, 1) if segundos else None,
+                }
             
+            yield {'evento': 'consolidando'}
+            alteracoes = {cnpj: set(periodos) for cnpj, periodos in importacao.alteracoes.items()}
+            erros = {int(idx): mensagem for idx, mensagem in importacao.erros.items()}
+            registrar_alteracao(alteracoes, acumulados=acumulados)
+        except Exception as e:
+            finalizar_importacao(importacao, time.perf_counter() - inicio, erro=e)
+            raise
+        
+        resultado = formatar_response_upload(
+            importacao.linhas_processadas, listar_erros(erros), descricao,
+            alteracoes if tipo != 'EMPRESAS' else None,
+            contagem={
+                'inseridos': importacao.linhas_inseridas,
+                'atualizados': importacao.linhas_atualizadas,
+                'inalterados': importacao.linhas_inalteradas
+            }
+        )
+        finalizar_importacao(importacao, time.perf_counter() - inicio, resultado)
+        yield {'evento': 'concluido', 'resultado': {**resultado, 'importacao_id': importacao.pk}}
+    
+    @staticmethod
+    def processar_em_blocos(file, tipo, forcar=False):
+        """Processa o upload inteiro (ver eventos_em_blocos) e retorna o resultado"""
+        for evento in CSVUploadService.eventos_em_blocos(file, tipo, forcar):
+            pass
+        return evento['resultado']
+    
+    @staticmethod
+    def eventos_upload(file, tipo, forcar=False):
+        """
+        Eventos do upload para respostas em streaming: os de
+        eventos_em_blocos, terminando em 'concluido' ou em 'erro'
+        """
+        try:
+            yield from CSVUploadService.eventos_em_blocos(file, tipo, forcar)
+        except Exception as e:
+            logger.error(f"Erro no upload de {tipo}: {str(e)}")
+            yield {'evento': 'erro', 'error': f'Erro ao processar arquivo: {str(e)}'}
+    
+    @staticmethod
+    def gravar_bloco_empresas(df, erros, alteracoes, cnpjs=None):
+        """
+        Valida e grava um bloco do CSV de empresas; os CNPJs gravados
+        entram em `cnpjs`, quando informado (pacote)
+        """
+        validas = linhas_com_cnpj_valido(df, erros)
+        data_abertura = coluna_data(df, 'data_abertura', erros)
+        
+        registros = []
+        for idx, row in zip(df.index[validas], df[validas].to_dict('records')):
+            if idx in erros:
+                continue
+            try:
+                dados_empresa = processar_linha_empresa(row)
+                dados_empresa['data_abertura'] = data_abertura[idx]
+                registros.append(dados_empresa)
+            except Exception as e:
+                erros[idx] = str(e)
+                logger.error(f"Erro na linha {idx + 2}: {str(e)}")
+        
+        # Data de abertura ausente no arquivo não apaga a já cadastrada
+        carga = carregar_em_lote(Empresa, pd.DataFrame(registros), ['cnpj'], manter_se_nulo=['data_abertura'])
+        if cnpjs is not None:
+            cnpjs.update(registro['cnpj'] for registro in registros)
+        return contagem_carga(carga, len(registros))
+    
+    @staticmethod
+    def processar_empresas_csv(file, forcar=False):
+        """
+        Processa arquivo CSV de empresas
+        """
+        try:
+            return CSVUploadService.processar_em_blocos(file, 'EMPRESAS', forcar)
         except Exception as e:
             logger.error(f"Erro no upload de empresas: {str(e)}")
             raise Exception(f'Erro ao processar arquivo: {str(e)}')
     
     @staticmethod
-    def processar_incentivos_csv(file):
+    def gravar_bloco_incentivos(df, erros, alteracoes, cnpjs=None):
+        """
+        Valida e grava um bloco do CSV de incentivos; o reenvio de um
+        incentivo (mesma empresa, instrumento, tipo e início) o atualiza
+        """
+        validas = linhas_com_empresa(df, erros, cnpjs)
+        data_inicio = coluna_data(df, 'data_inicio', erros, obrigatoria=True)
+        data_fim = coluna_data(df, 'data_fim', erros)
+        percentual_desconto = coluna_numerica(df, 'percentual_desconto', erros)
+        registrar_erros(
+            erros, (percentual_desconto < 0) | (percentual_desconto > 100),
+            'percentual_desconto deve estar entre 0 e 100'
+        )
+        valor_fixo_desconto = coluna_numerica(df, 'valor_fixo_desconto', erros)
+        baseline_iss_12m = coluna_numerica(df, 'baseline_iss_12m', erros)
+        baseline_iptu_12m = coluna_numerica(df, 'baseline_iptu_12m', erros)
+        
+        validas &= ~df.index.isin(list(erros))
+        registros = pd.DataFrame({
+            'empresa': df['cnpj'],
+            'instrumento_legal': df['instrumento_legal'].astype(str),
+            'tipo_incentivo': df['tipo_incentivo'].astype(str),
+            'percentual_desconto': percentual_desconto,
+            'valor_fixo_desconto': valor_fixo_desconto,
+            'data_inicio': data_inicio,
+            'data_fim': data_fim,
+            'contrapartidas': df['contrapartidas'].fillna('').astype(str) if 'contrapartidas' in df else '',
+            'status': df['status'].fillna('ATIVO').astype(str) if 'status' in df else 'ATIVO',
+            'baseline_iss_12m': baseline_iss_12m,
+            'baseline_iptu_12m': baseline_iptu_12m
+        })[validas]
+        
+        carga = carregar_em_lote(
+            Incentivo, registros, ['empresa', 'instrumento_legal', 'tipo_incentivo', 'data_inicio']
+        )
+        
+        gravados = carga['gravados']
+        for cnpj, inicio in zip(gravados['empresa'], gravados['data_inicio']):
+            alteracoes.setdefault(cnpj, set()).add(inicio.strftime('%Y-%m'))
+        return contagem_carga(carga, len(registros))
+    
+    @staticmethod
+    def processar_incentivos_csv(file, forcar=False):
         """
         Processa arquivo CSV de incentivos
         """
         try:
-            df = pd.read_csv(file)
-            count = 0
-            errors = []
-            
-            for idx, row in df.iterrows():
-                try:
-                    empresa = Empresa.objects.get(cnpj=str(row['cnpj']).strip())
-                    
-                    Incentivo.objects.create(
-                        empresa=empresa,
-                        instrumento_legal=str(row['instrumento_legal']),
-                        tipo_incentivo=str(row['tipo_incentivo']),
-                        percentual_desconto=row.get('percentual_desconto') if pd.notna(row.get('percentual_desconto')) else None,
-                        valor_fixo_desconto=row.get('valor_fixo_desconto') if pd.notna(row.get('valor_fixo_desconto')) else None,
-                        data_inicio=row['data_inicio'],
-                        data_fim=row.get('data_fim') if pd.notna(row.get('data_fim')) else None,
-                        contrapartidas=str(row.get('contrapartidas', '')),
-                        status=str(row.get('status', 'ATIVO')),
-                        baseline_iss_12m=row.get('baseline_iss_12m') if pd.notna(row.get('baseline_iss_12m')) else None,
-                        baseline_iptu_12m=row.get('baseline_iptu_12m') if pd.notna(row.get('baseline_iptu_12m')) else None
-                    )
-                    count += 1
-                except Empresa.DoesNotExist:
-                    errors.append(f"Linha {idx + 2}: Empresa CNPJ {row['cnpj']} não encontrada")
-                except Exception as e:
-                    errors.append(f"Linha {idx + 2}: {str(e)}")
-            
-            return formatar_response_upload(count, errors, 'incentivos')
-            
+            return CSVUploadService.processar_em_blocos(file, 'INCENTIVOS', forcar)
         except Exception as e:
             logger.error(f"Erro no upload de incentivos: {str(e)}")
             raise Exception(f'Erro ao processar arquivo: {str(e)}')
     
     @staticmethod
-    def processar_iss_csv(file):
+    def gravar_bloco_iss(df, erros, alteracoes, cnpjs=None):
+        """
+        Valida e grava um bloco do CSV de ISS, anotando erros e períodos
+        alterados. Retorna as contagens de linhas processadas, inseridas,
+        atualizadas e inalteradas.
+        """
+        validas = linhas_com_empresa(df, erros, cnpjs)
+        # A competência é o mês: qualquer dia vira o dia 1, como nos acumulados
+        mes_ref = pd.to_datetime(df['mes_ref'], errors='coerce').dt.to_period('M').dt.start_time
+        registrar_erros(erros, mes_ref.isna(), 'mes_ref ausente ou inválido')
+        valor_iss = coluna_numerica(df, 'valor_iss', erros, obrigatoria=True)
+        valor_base_calculo = coluna_numerica(df, 'valor_base_calculo', erros)
+        aliquota = coluna_numerica(df, 'aliquota', erros)
+        numero_nfse = coluna_numerica(df, 'numero_nfse', erros).fillna(0)
+        
+        validas &= ~df.index.isin(list(erros))
+        registros = pd.DataFrame({
+            'empresa': df['cnpj'],
+            'mes_ref': mes_ref.dt.date,
+            'valor_iss': valor_iss,
+            'valor_base_calculo': valor_base_calculo,
+            'aliquota': aliquota,
+            'numero_nfse': numero_nfse
+        })[validas]
+        
+        # A última linha de cada (CNPJ, mês) prevalece, como nas atualizações linha a linha
+        carga = carregar_em_lote(ArrecadacaoISS, registros, ['empresa', 'mes_ref'])
+        
+        gravados = carga['gravados']
+        for cnpj, mes in zip(gravados['empresa'], gravados['mes_ref']):
+            alteracoes.setdefault(cnpj, set()).add(mes.strftime('%Y-%m'))
+        return contagem_carga(carga, len(registros))
+    
+    @staticmethod
+    def processar_iss_csv(file, forcar=False):
         """
         Processa arquivo CSV de arrecadação ISS
         """
         try:
-            df = pd.read_csv(file)
-            count = 0
-            errors = []
-            
-            for idx, row in df.iterrows():
-                try:
-                    empresa = Empresa.objects.get(cnpj=str(row['cnpj']).strip())
-                    
-                    ArrecadacaoISS.objects.update_or_create(
-                        empresa=empresa,
-                        mes_ref=row['mes_ref'],
-                        defaults={
-                            'valor_iss': row['valor_iss'],
-                            'valor_base_calculo': row.get('valor_base_calculo') if pd.notna(row.get('valor_base_calculo')) else None,
-                            'aliquota': row.get('aliquota') if pd.notna(row.get('aliquota')) else None,
-                            'numero_nfse': row.get('numero_nfse', 0)
-                        }
-                    )
-                    count += 1
-                except Empresa.DoesNotExist:
-                    errors.append(f"Linha {idx + 2}: Empresa CNPJ {row['cnpj']} não encontrada")
-                except Exception as e:
-                    errors.append(f"Linha {idx + 2}: {str(e)}")
-            
-            return formatar_response_upload(count, errors, 'registros de ISS')
+            return CSVUploadService.processar_em_blocos(file, 'ISS', forcar)
             
         except Exception as e:
             logger.error(f"Erro no upload de ISS: {str(e)}")
             raise Exception(f'Erro ao processar arquivo: {str(e)}')
     
     @staticmethod
-    def processar_iptu_csv(file):
+    def gravar_bloco_iptu(df, erros, alteracoes, cnpjs=None):
+        """
+        Valida e grava um bloco do CSV de IPTU, anotando erros e anos
+        alterados. Retorna as contagens de linhas processadas, inseridas,
+        atualizadas e inalteradas.
+        """
+        validas = linhas_com_empresa(df, erros, cnpjs)
+        ano_ref = coluna_numerica(df, 'ano_ref', erros, obrigatoria=True)
+        registrar_erros(erros, ano_ref.notna() & (ano_ref % 1 != 0), 'ano_ref deve ser um ano inteiro')
+        valor_iptu = coluna_numerica(df, 'valor_iptu', erros, obrigatoria=True)
+        valor_taxas = coluna_numerica(df, 'valor_taxas', erros, obrigatoria=True)
+        valor_alvara = coluna_numerica(df, 'valor_alvara', erros).fillna(0)
+        
+        validas &= ~df.index.isin(list(erros))
+        registros = pd.DataFrame({
+            'empresa': df['cnpj'],
+            'ano_ref': ano_ref,
+            'valor_iptu': valor_iptu,
+            'valor_taxas': valor_taxas,
+            'valor_alvara': valor_alvara
+        })[validas]
+        
+        carga = carregar_em_lote(ArrecadacaoIPTU, registros, ['empresa', 'ano_ref'])
+        
+        gravados = carga['gravados']
+        for cnpj, ano in zip(gravados['empresa'], gravados['ano_ref']):
+            alteracoes.setdefault(cnpj, set()).add(str(int(ano)))
+        return contagem_carga(carga, len(registros))
+    
+    @staticmethod
+    def processar_iptu_csv(file, forcar=False):
         """
         Processa arquivo CSV de arrecadação IPTU
         """
         try:
-            df = pd.read_csv(file)
-            count = 0
-            errors = []
-            
-            for idx, row in df.iterrows():
-                try:
-                    empresa = Empresa.objects.get(cnpj=str(row['cnpj']).strip())
-                    
-                    ArrecadacaoIPTU.objects.update_or_create(
-                        empresa=empresa,
-                        ano_ref=row['ano_ref'],
-                        defaults={
-                            'valor_iptu': row['valor_iptu'],
-                            'valor_taxas': row['valor_taxas'],
-                            'valor_alvara': row.get('valor_alvara', 0)
-                        }
-                    )
-                    count += 1
-                except Empresa.DoesNotExist:
-                    errors.append(f"Linha {idx + 2}: Empresa CNPJ {row['cnpj']} não encontrada")
-                except Exception as e:
-                    errors.append(f"Linha {idx + 2}: {str(e)}")
-            
-            return formatar_response_upload(count, errors, 'registros de IPTU')
+            return CSVUploadService.processar_em_blocos(file, 'IPTU', forcar)
             
         except Exception as e:
             logger.error(f"Erro no upload de IPTU: {str(e)}")
             raise Exception(f'Erro ao processar arquivo: {str(e)}')
+    
+    @staticmethod
+    def processar_pacote(file, forcar=False):
+        """
+        Processa um ZIP com os arquivos de empresas, incentivos, ISS e IPTU
+        (CSV, Parquet ou Arrow): lê todos em paralelo, em blocos, e grava na
+        ordem de dependência numa única transação. As empresas cadastradas
+        ficam num único conjunto de CNPJs, preenchido pela etapa de empresas
+        e compartilhado com as seguintes. Qualquer falha desfaz o pacote
+        inteiro. O pacote é registrado em ImportacaoArquivo (tipo
+        PACOTE), com os erros de cada arquivo; um pacote idêntico a um já
+        concluído não é reprocessado (a não ser com `forcar`).
+        """
+        importacao = None
+        inicio = time.perf_counter()
+        try:
+            importacao = iniciar_importacao('PACOTE', file, forcar)
+            if importacao.status == 'CONCLUIDA':
+                return {**importacao.resultado, 'duplicado': True, 'importacao_id': importacao.pk}
+            
+            arquivos = {}
+            erros_pacote = {}
+            alteracoes_pacote = {}
+            contagem_pacote = dict.fromkeys(['linhas', 'processados', 'inseridos', 'atualizados', 'inalterados'], 0)
+            with zipfile.ZipFile(file) as pacote:
+                membros = membros_do_pacote(pacote)
+                if not membros:
+                    raise ValueError('Nenhum arquivo de empresas, incentivos, ISS ou IPTU no pacote')
+                with LeituraPacote(pacote, membros) as leitura, transaction.atomic():
+                    cnpjs, consultados = set(), set()
+                    for tipo, (nome_metodo, descricao, acumulados) in CSVUploadService.UPLOADS.items():
+                        if tipo not in membros:
+                            continue
+                        gravar_bloco = getattr(CSVUploadService, nome_metodo)
+                        erros, alteracoes = {}, {}
+                        contagem = dict.fromkeys(['processados', 'inseridos', 'atualizados', 'inalterados'], 0)
+                        for df in leitura.blocos(tipo):
+                            contagem_pacote['linhas'] += len(df)
+                            if tipo != 'EMPRESAS':
+                                consultar_cnpjs_novos(df, cnpjs, consultados)
+                            for chave, valor in gravar_bloco(df, erros, alteracoes, cnpjs).items():
+                                contagem[chave] += valor
+                    
+                        for chave, valor in contagem.items():
+                            contagem_pacote[chave] += valor
+                        arquivos[tipo.lower()] = formatar_response_upload(
+                            contagem.pop('processados'), listar_erros(erros), descricao,
+                            alteracoes if tipo != 'EMPRESAS' else None, contagem
+                        )
+                        if erros:
+                            erros_pacote[tipo.lower()] = {str(idx): mensagem for idx, mensagem in erros.items()}
+                        for cnpj, periodos in alteracoes.items():
+                            alteracoes_pacote.setdefault(cnpj, set()).update(periodos)
+                
+                    registrar_alteracao(alteracoes_pacote, acumulados='ISS' in membros or 'IPTU' in membros)
+        except Exception as e:
+            logger.error(f"Erro no upload do pacote: {str(e)}")
+            if importacao is not None:
+                finalizar_importacao(importacao, time.perf_counter() - inicio, erro=e)
+            raise Exception(f'Erro ao processar pacote: {str(e)}')
+        
+        resultado = {
+            'message': f'Pacote com {len(arquivos)} arquivos processado com sucesso',
+            'total': contagem_pacote['processados'],
+            'arquivos': arquivos,
+            'alteracoes': resumir_alteracoes(alteracoes_pacote)
+        }
+        registrar_pacote(importacao, contagem_pacote, erros_pacote, alteracoes_pacote)
+        finalizar_importacao(importacao, time.perf_counter() - inicio, resultado)
+        return {**resultado, 'importacao_id': importacao.pk}
 
-class AlertaService:
+
+class CalculoImpactoService:
     """
-    Serviço para geração de alertas
+    Serviço para manutenção dos cálculos de impacto gravados
     """
     
     @staticmethod
-    def gerar_todos_alertas():
+    def compactar_historico(dias_retencao=30):
         """
-        Gera todos os tipos de alertas automáticos
+        Mantém apenas o último cálculo de cada mês para períodos que
+        terminaram há mais de `dias_retencao` dias
         """
-        from .utils import gerar_alerta_bc_baixo, gerar_alerta_sem_recolhimento, gerar_alerta_contrapartida_vencendo
-        from .models import Contrapartida
-        from datetime import datetime, timedelta
+        from datetime import timedelta
+        from .models import CalculoImpacto
         
-        alertas_gerados = []
+        limite = datetime.now().date() - timedelta(days=dias_retencao)
+        df = pd.DataFrame.from_records(
+            CalculoImpacto.objects.filter(periodo_fim__lt=limite).values(
+                'id', 'empresa_id', 'periodo_inicio', 'periodo_fim'
+            ),
+            columns=['id', 'empresa_id', 'periodo_inicio', 'periodo_fim']
+        )
         
-        # Alerta 1: B/C < 1
-        empresas = Empresa.objects.filter(incentivos__status='ATIVO').distinct()
-        for empresa in empresas:
-            if gerar_alerta_bc_baixo(empresa):
-                alertas_gerados.append({'cnpj': empresa.cnpj, 'tipo': 'BC_BAIXO'})
+        if df.empty:
+            return {'message': '0 cálculos removidos', 'total': 0}
         
-        # Alerta 2: Sem recolhimento por 3 meses
-        empresas_ativas = Empresa.objects.filter(incentivos__status='ATIVO').distinct()
-        for empresa in empresas_ativas:
-            if gerar_alerta_sem_recolhimento(empresa):
-                alertas_gerados.append({'cnpj': empresa.cnpj, 'tipo': 'SEM_RECOLHIMENTO'})
+        df['mes_fim'] = pd.to_datetime(df['periodo_fim']).dt.to_period('M')
+        df = df.sort_values(['periodo_fim', 'id'])
+        mantidos = df.drop_duplicates(['empresa_id', 'periodo_inicio', 'mes_fim'], keep='last')
+        remover = df.loc[~df['id'].isin(mantidos['id']), 'id'].tolist()
         
-        # Alerta 3: Contrapartidas vencendo em 30 dias
-        prazo_30_dias = datetime.now().date() + timedelta(days=30)
-        contrapartidas_vencendo = Contrapartida.objects.filter(
-            status='PENDENTE',
-            data_vencimento__lte=prazo_30_dias,
-            data_vencimento__gte=datetime.now().date()
-        )
+        for inicio in range(0, len(remover), 500):
+            CalculoImpacto.objects.filter(id__in=remover[inicio:inicio + 500]).delete()
         
-        for contrapartida in contrapartidas_vencendo:
-            if gerar_alerta_contrapartida_vencendo(contrapartida):
-                alertas_gerados.append({
-                    'cnpj': contrapartida.incentivo.empresa.cnpj, 
-                    'tipo': 'CONTRAPARTIDA_VENCENDO'
-                })
+        logger.info(f"Compactação de cálculos: {len(remover)} removidos, {len(mantidos)} mantidos")
+        return {'message': f'{len(remover)} cálculos removidos', 'total': len(remover)}
+    
+    @staticmethod
+    def recalcular_incremental(cnpjs):
+        """
+        Recalcula o impacto e os alertas apenas dos CNPJs alterados
+        """
+        from .calculo_lote import CalculadoraImpactoLote
+        
+        cnpjs = sorted(set(cnpjs))
+        if not cnpjs:
+            return {'status': 'SEM_ALTERACOES', 'empresas': 0, 'alertas_gerados': 0}
+        
+        try:
+            resultado = CalculadoraImpactoLote(cnpjs=cnpjs).executar()
+            alertas = AlertaService.gerar_todos_alertas(cnpjs=cnpjs)
+        except Exception as e:
+            logger.error(f"Erro no recálculo incremental: {str(e)}")
+            return {'status': 'ERRO', 'empresas': 0, 'alertas_gerados': 0, 'error': str(e)}
+        
+        return {
+            'status': 'CONCLUIDO',
+            'empresas': len(resultado),
+            'alertas_gerados': len(alertas['alertas'])
+        }
+    
+    @staticmethod
+    def calcular_todos(workers=1, progresso=None):
+        """
+        Calcula e grava o impacto de todas as empresas com incentivo ativo
+        """
+        from .calculo_lote import CalculadoraImpactoLote
+        
+        count = 0
+        errors = []
+        
+        lote = CalculadoraImpactoLote()
+        try:
+            resultado = lote.executar(workers=workers, progresso=progresso)
+            count = len(resultado)
+            errors.extend(lote.erros)
+        except Exception as e:
+            errors.append(f"Erro no cálculo em lote: {str(e)}")
+            logger.error(f"Erro no cálculo em lote: {str(e)}")
+        
+        response_data = {
+            'message': f'Calculado para {count} empresas',
+            'total': count
+        }
+        if errors and len(errors) <= 10:
+            response_data['errors'] = errors
+        
+        return response_data
+
+class AlertaService:
+    """
+    Serviço para geração de alertas
+    """
+    
+    @staticmethod
+    def gerar_todos_alertas(cnpjs=None, progresso=None, tipos=None):
+        """
+        Gera os alertas automáticos de todas as regras registradas em api/alertas.py
+        (ou só dos `tipos` informados), apenas dos CNPJs informados, se houver, e
+        resolve os alertas ativos cuja condição deixou de ocorrer.
+        `progresso(etapas_concluidas, total_etapas)` é chamado ao fim de cada regra.
+        """
+        resultado = gerar_alertas(cnpjs=cnpjs, tipos=tipos, progresso=progresso)
         
         return {
-            'message': f'{len(alertas_gerados)} alertas gerados',
-            'alertas': alertas_gerados
+            'message': f'{len(resultado["alertas"])} alertas gerados, {resultado["resolvidos"]} resolvidos',
+            **resultado
         }
@@ -0,0 +1,145 @@
+"""
+Fila de tarefas em segundo plano gravada no banco
+
+As tarefas longas (cálculo de todas as empresas, geração de alertas,
+aquecimento do cache, compactação do histórico de cálculos) são
+enfileiradas como linhas de Tarefa e executadas pelo comando
+`processar_tarefas`. Só pode existir uma tarefa ativa (pendente ou em
+execução) por tipo; novas solicitações do mesmo tipo recebem a tarefa
+já existente.
+"""
+import logging
+import os
+import socket
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import Tarefa
+
+logger = logging.getLogger(__name__)
+
+STATUS_ATIVOS = ['PENDENTE', 'EXECUTANDO']
+
+
+def _calcular_todos(tarefa, progresso):
+    from .services import CalculoImpactoService
+
+    workers = tarefa.parametros.get('workers', settings.CALCULO_WORKERS)
+    return CalculoImpactoService.calcular_todos(workers=workers, progresso=progresso)
+
+
+def _gerar_alertas(tarefa, progresso):
+    from .services import AlertaService
+
+    return AlertaService.gerar_todos_alertas(progresso=progresso, tipos=tarefa.parametros.get('tipos'))
+
+
+def _aquecer_cache(tarefa, progresso):
+    from .cache import aquecer
+
+    total = aquecer()
+    return {'message': f'Cache aquecido para {total} empresas', 'total': total}
+
+
+def _compactar_calculos(tarefa, progresso):
+    from .services import CalculoImpactoService
+
+    return CalculoImpactoService.compactar_historico(tarefa.parametros.get('dias_retencao', 30))
+
+
+EXECUTORES = {
+    'CALCULAR_TODOS': _calcular_todos,
+    'GERAR_ALERTAS': _gerar_alertas,
+    'AQUECER_CACHE': _aquecer_cache,
+    'COMPACTAR_CALCULOS': _compactar_calculos,
+}
+
+
+def enfileirar(tipo, parametros=None):
+    """
+    Enfileira uma tarefa do tipo informado, ou retorna a tarefa ativa do
+    mesmo tipo. Retorna (tarefa, criada).
+    """
+    ativa = Tarefa.objects.filter(tipo=tipo, status__in=STATUS_ATIVOS).first()
+    if ativa:
+        return ativa, False
+
+    try:
+        with transaction.atomic():
+            return Tarefa.objects.create(tipo=tipo, parametros=parametros or {}), True
+    except IntegrityError:
+        # Outra solicitação criou a tarefa ativa ao mesmo tempo
+        return Tarefa.objects.get(tipo=tipo, status__in=STATUS_ATIVOS), False
+
+
+def identificacao_worker():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def reservar(tarefa):
+    """Marca a tarefa como em execução se ainda estiver pendente; retorna se conseguiu"""
+    reservada = Tarefa.objects.filter(pk=tarefa.pk, status='PENDENTE').update(
+        status='EXECUTANDO',
+        iniciada_em=timezone.now(),
+        worker=identificacao_worker()
+    )
+    if reservada:
+        tarefa.refresh_from_db()
+    return bool(reservada)
+
+
+def reservar_proxima():
+    """Marca a tarefa pendente mais antiga como em execução e a retorna"""
+    for tarefa in Tarefa.objects.filter(status='PENDENTE').order_by('criada_em', 'pk'):
+        if reservar(tarefa):
+            return tarefa
+    return None
+
+
+def executar(tarefa):
+    """Executa uma tarefa já reservada, gravando progresso, resultado e erros"""
+    def progresso(processados, total):
+        Tarefa.objects.filter(pk=tarefa.pk).update(processados=processados, total=total)
+
+    try:
+        resultado = EXECUTORES[tarefa.tipo](tarefa, progresso)
+        tarefa.resultado = resultado
+        tarefa.erros = resultado.get('errors', [])
+        tarefa.status = 'CONCLUIDA'
+    except Exception as e:
+        logger.error(f"Erro na tarefa {tarefa.pk} ({tarefa.tipo}): {str(e)}")
+        tarefa.erros = [str(e)]
+        tarefa.status = 'ERRO'
+
+    tarefa.concluida_em = timezone.now()
+    tarefa.save(update_fields=['resultado', 'erros', 'status', 'concluida_em'])
+    return tarefa
+
+
+def liberar_travadas(minutos=None):
+    """
+    Marca como erro as tarefas em execução há mais de `minutos` (worker
+    interrompido), liberando o tipo para novas solicitações
+    """
+    minutos = minutos or settings.TAREFA_TIMEOUT_MINUTOS
+    limite = timezone.now() - timedelta(minutes=minutos)
+    return Tarefa.objects.filter(status='EXECUTANDO', iniciada_em__lt=limite).update(
+        status='ERRO',
+        erros=[f'Tarefa interrompida: em execução há mais de {minutos} minutos'],
+        concluida_em=timezone.now()
+    )
+
+
+def processar_pendentes():
+    """Executa as tarefas pendentes até esvaziar a fila. Retorna quantas executou."""
+    liberar_travadas()
+    executadas = 0
+    while True:
+        tarefa = reservar_proxima()
+        if tarefa is None:
+            return executadas
+        executar(tarefa)
+        executadas += 1
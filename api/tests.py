@@ -1,3 +1,411 @@
-from django.test import TestCase
+import hashlib
+import io
+from datetime import date, timedelta
+from decimal import Decimal
+from itertools import product
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db.models.query import QuerySet
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient, APIRequestFactory
+
+from .models import (
+    Empresa, Incentivo, ArrecadacaoISS, ArrecadacaoIPTU, Contrapartida,
+    Alerta, CalculoImpacto, Auditoria, Tarefa, ImportacaoArquivo, Agendamento
+)
+from . import agendador
+from .acumulados import atualizar_acumulados
+from .alertas import gerar_alertas
+from .gerador import gerar_cnpjs
+from .ingestao import hash_arquivo, iniciar_importacao
+from .services import CSVUploadService
+from .calculadora import CalculadoraImpactoFiscal
+from .calculo_lote import CalculadoraImpactoLote
+from .views import AuditoriaViewSet, ContrapartidaViewSet, EmpresaViewSet
+
+
+def criar_empresas(quantidade, inicio=0):
+    """Empresas com incentivos, arrecadação, contrapartida, alerta, cálculo e auditoria"""
+    usuario, _ = User.objects.get_or_create(username='auditor')
+    for i in range(inicio, inicio + quantidade):
+        empresa = Empresa.objects.create(
+            cnpj=f'{i:014d}', razao_social=f'Empresa {i} Ltda', cnae='6201',
+            cnae_descricao='Desenvolvimento de programas de computador',
+            endereco='Rua Comercial, Centro', bairro='Centro', porte='ME'
+        )
+        for k, status in enumerate(['ATIVO', 'SUSPENSO']):
+            incentivo = Incentivo.objects.create(
+                empresa=empresa, instrumento_legal=f'Decreto {i}/{k}', tipo_incentivo='REDUCAO_ISS',
+                percentual_desconto=Decimal('30'), data_inicio=date(2024, 1, 1), status=status
+            )
+        Contrapartida.objects.create(
+            incentivo=incentivo, descricao='Geração de empregos', tipo='EMPREGOS',
+            data_vencimento=date(2025, 1, 1)
+        )
+        ArrecadacaoISS.objects.create(empresa=empresa, mes_ref=date(2024, 1, 1), valor_iss=Decimal('100'))
+        ArrecadacaoIPTU.objects.create(empresa=empresa, ano_ref=2024, valor_iptu=Decimal('100'))
+        Alerta.objects.create(empresa=empresa, tipo_alerta='BC_BAIXO', descricao='Relação B/C abaixo de 1')
+        CalculoImpacto.objects.create(
+            empresa=empresa, periodo_inicio=date(2024, 1, 1), periodo_fim=date(2024, 12, 31),
+            bc_ratio=Decimal(i) / 10
+        )
+        Auditoria.objects.create(usuario=usuario, acao='CONSULTA', cnpj=empresa.cnpj)
+        Tarefa.objects.create(tipo='GERAR_ALERTAS', status='CONCLUIDA')
+        ImportacaoArquivo.objects.create(
+            tipo='EMPRESAS', hash_conteudo=f'{i:064d}', nome_arquivo='empresas.csv', tamanho_bloco=50000
+        )
+
+
+class CalculoLoteParidadeTest(TestCase):
+    """O cálculo em lote reproduz exatamente a calculadora individual"""
+
+    PERIODO_FIM = date(2025, 6, 20)
+
+    # Variações de desconto: percentual, valor fixo, ambos (vale o percentual) e nenhum
+    DESCONTOS = [
+        {'percentual_desconto': Decimal('25.50')},
+        {'valor_fixo_desconto': Decimal('150.00')},
+        {'percentual_desconto': Decimal('100.00'), 'valor_fixo_desconto': Decimal('80.00')},
+        {},
+    ]
+
+    # Baselines: nenhum, só ISS, só IPTU, ambos (alto o bastante para AI negativa)
+    BASELINES = [
+        {},
+        {'baseline_iss_12m': Decimal('9000.00')},
+        {'baseline_iptu_12m': Decimal('700.00')},
+        {'baseline_iss_12m': Decimal('50000.00'), 'baseline_iptu_12m': Decimal('5000.00')},
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        tipos = [tipo for tipo, _ in Incentivo.TIPO_CHOICES]
+        for i, (tipo, desconto, baseline) in enumerate(product(tipos, cls.DESCONTOS, cls.BASELINES)):
+            empresa = Empresa.objects.create(
+                cnpj=f'{i:014d}', razao_social=f'Empresa {i} Ltda', cnae='6201',
+                cnae_descricao='Desenvolvimento de programas de computador',
+                endereco='Rua Comercial, Centro', bairro='Centro', porte='ME'
+            )
+            # Início no dia 1 ou no meio do mês (o mês de início sai do ISS)
+            Incentivo.objects.create(
+                empresa=empresa, instrumento_legal=f'Decreto {i}', tipo_incentivo=tipo,
+                data_inicio=date(2023, 1 + i % 12, 1 if i % 2 else 15), **desconto, **baseline
+            )
+            # Empresas sem arrecadação nenhuma ficam com AI zero e sem payback
+            if i % 9 == 0:
+                continue
+            ArrecadacaoISS.objects.bulk_create([
+                ArrecadacaoISS(
+                    empresa=empresa, mes_ref=date(ano, mes, 1),
+                    valor_iss=Decimal((i * 37 + mes * 11 + ano) % 900 + 100) / 4
+                )
+                for ano, mes in product(range(2022, 2026), range(1, 13))
+            ])
+            ArrecadacaoIPTU.objects.bulk_create([
+                ArrecadacaoIPTU(
+                    empresa=empresa, ano_ref=ano,
+                    valor_iptu=Decimal(i * 13 % 500 + 300), valor_taxas=Decimal('45.30')
+                )
+                for ano in range(2022, 2026)
+            ])
+
+        # Incentivo que começa no mês seguinte ao fim do período, com IPTU do ano:
+        # AI positiva sem nenhum mês para o payback
+        empresa = Empresa.objects.create(
+            cnpj='99000000000000', razao_social='Empresa Futura Ltda', cnae='6201',
+            cnae_descricao='Desenvolvimento de programas de computador',
+            endereco='Rua Comercial, Centro', bairro='Centro', porte='ME'
+        )
+        Incentivo.objects.create(
+            empresa=empresa, instrumento_legal='Decreto futuro', tipo_incentivo='REDUCAO_IPTU',
+            percentual_desconto=Decimal('20.00'), data_inicio=date(2025, 7, 1)
+        )
+        ArrecadacaoIPTU.objects.create(
+            empresa=empresa, ano_ref=2025, valor_iptu=Decimal('800.00'), valor_taxas=Decimal('45.30')
+        )
+
+        # Empresa com dois incentivos ativos: vale o de início mais recente
+        Incentivo.objects.create(
+            empresa_id=f'{1:014d}', instrumento_legal='Decreto recente', tipo_incentivo='MISTO',
+            percentual_desconto=Decimal('40.00'), data_inicio=date(2024, 3, 1)
+        )
+        atualizar_acumulados()
+
+    def test_calcular_igual_a_calculadora_individual(self):
+        lote = CalculadoraImpactoLote.para_dicts(
+            CalculadoraImpactoLote(periodo_fim=self.PERIODO_FIM).calcular()
+        )
+        self.assertEqual(len(lote), Empresa.objects.count())
+
+        for resultado in lote:
+            with self.subTest(cnpj=resultado['cnpj']):
+                individual = CalculadoraImpactoFiscal(resultado['cnpj']).calcular_impacto_completo(
+                    periodo_fim=self.PERIODO_FIM, persistir=False
+                )
+                self.assertEqual(resultado, individual)
+
+
+class OrcamentoConsultasTest(TestCase):
+    """
+    Cada endpoint de listagem e detalhe faz um número fixo de consultas,
+    qualquer que seja a quantidade de linhas da página
+    """
+
+    # URL: consultas esperadas
+    ORCAMENTOS = {
+        '/api/empresas/': 2,
+        '/api/empresas/00000000000001/': 1,
+        '/api/incentivos/': 2,
+        '/api/arrecadacao-iss/': 2,
+        '/api/arrecadacao-iptu/': 2,
+        '/api/alertas/': 2,
+        '/api/calculos-impacto/': 2,
+        '/api/calculos-impacto/ranking/': 1,
+        '/api/tarefas/': 2,
+        '/api/importacoes/': 2,
+    }
+
+    # ViewSets fora do roteador: consultas esperadas na listagem
+    ORCAMENTOS_VIEWSETS = {
+        AuditoriaViewSet: 2,
+        ContrapartidaViewSet: 2,
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        criar_empresas(3)
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def verificar_orcamentos(self):
+        for url, consultas in self.ORCAMENTOS.items():
+            with self.subTest(url=url), self.assertNumQueries(consultas):
+                resposta = self.client.get(url)
+                self.assertEqual(resposta.status_code, 200)
+
+        factory = APIRequestFactory()
+        for viewset, consultas in self.ORCAMENTOS_VIEWSETS.items():
+            with self.subTest(viewset=viewset.__name__), self.assertNumQueries(consultas):
+                resposta = viewset.as_view({'get': 'list'})(factory.get('/'))
+                resposta.render()
+                self.assertEqual(resposta.status_code, 200)
+
+    def test_orcamento_nao_cresce_com_as_linhas(self):
+        self.verificar_orcamentos()
+        criar_empresas(20, inicio=3)
+        self.verificar_orcamentos()
+
+    def test_total_incentivos_anotado(self):
+        resposta = self.client.get('/api/empresas/00000000000001/')
+        self.assertEqual(resposta.json()['total_incentivos'], 1)
+        resultados = self.client.get('/api/empresas/').json()['results']
+        self.assertEqual({empresa['total_incentivos'] for empresa in resultados}, {1})
+        self.assertTrue(EmpresaViewSet.queryset.ordered)
+        self.assertEqual(
+            [empresa['razao_social'] for empresa in resultados],
+            sorted(empresa['razao_social'] for empresa in resultados)
+        )
+
+    def test_razao_social_sem_consulta_extra(self):
+        resultados = self.client.get('/api/alertas/').json()['results']
+        self.assertEqual(
+            sorted(alerta['empresa_razao_social'] for alerta in resultados),
+            ['Empresa 0 Ltda', 'Empresa 1 Ltda', 'Empresa 2 Ltda']
+        )
+
+
+@override_settings(UPLOAD_TAMANHO_BLOCO=2)
+class ImportacaoArquivoTest(TestCase):
+    """Manifesto de importação: retomada, arquivo repetido, reprocessamento e upload simultâneo"""
+
+    CNPJS = gerar_cnpjs(np.random.default_rng(7), 5)
+
+    def arquivo(self):
+        """CSV de empresas com 5 linhas (3 blocos de 2 linhas)"""
+        linhas = ''.join(f'{cnpj},Empresa {i} Ltda,6201,Centro\n' for i, cnpj in enumerate(self.CNPJS))
+        return SimpleUploadedFile('empresas.csv', ('cnpj,razao_social,cnae,bairro\n' + linhas).encode())
+
+    def importar(self, forcar=False):
+        return CSVUploadService.processar_em_blocos(self.arquivo(), 'EMPRESAS', forcar)
+
+    def test_hash_do_conteudo(self):
+        conteudo = self.arquivo().read()
+        esperado = hashlib.sha256(conteudo).hexdigest()
+        self.assertEqual(hash_arquivo(self.arquivo()), esperado)
+        # Arquivo sem chunks() é lido até o fim (sentinela binária) e volta ao início
+        binario = io.BytesIO(conteudo)
+        self.assertEqual(hash_arquivo(binario), esperado)
+        self.assertEqual(binario.tell(), 0)
+
+    def test_retoma_do_bloco_seguinte_ao_ultimo_gravado(self):
+        original = CSVUploadService.gravar_bloco_empresas
+        chamadas = []
+
+        def falha_no_segundo_bloco(df, *args):
+            chamadas.append(list(df.index))
+            if len(chamadas) == 2:
+                raise RuntimeError('queda no meio da importação')
+            return original(df, *args)
+
+        with mock.patch.object(CSVUploadService, 'gravar_bloco_empresas', side_effect=falha_no_segundo_bloco):
+            with self.assertRaises(RuntimeError):
+                self.importar()
+            importacao = ImportacaoArquivo.objects.get()
+            self.assertEqual((importacao.status, importacao.blocos_concluidos), ('ERRO', 1))
+            self.assertEqual(Empresa.objects.count(), 2)
+
+            resultado = self.importar()
+
+        # O primeiro bloco não é relido na retomada
+        self.assertEqual(chamadas, [[0, 1], [2, 3], [2, 3], [4]])
+        self.assertEqual(resultado['importacao_id'], importacao.pk)
+        self.assertEqual(resultado['inseridos'], 5)
+        importacao.refresh_from_db()
+        self.assertEqual((importacao.status, importacao.blocos_concluidos), ('CONCLUIDA', 3))
+        self.assertEqual(Empresa.objects.count(), 5)
+
+    def test_arquivo_ja_importado_nao_e_reprocessado(self):
+        primeiro = self.importar()
+        with mock.patch.object(CSVUploadService, 'gravar_bloco_empresas') as gravar:
+            repetido = self.importar()
+        gravar.assert_not_called()
+        self.assertTrue(repetido['duplicado'])
+        self.assertEqual(repetido['importacao_id'], primeiro['importacao_id'])
+        self.assertEqual(repetido['inseridos'], 5)
+        self.assertEqual(ImportacaoArquivo.objects.count(), 1)
+
+    def test_forcar_reprocessa_do_zero(self):
+        self.importar()
+        resultado = self.importar(forcar=True)
+        self.assertNotIn('duplicado', resultado)
+        self.assertEqual((resultado['inseridos'], resultado['inalterados']), (0, 5))
+        importacao = ImportacaoArquivo.objects.get()
+        self.assertEqual((importacao.status, importacao.blocos_concluidos), ('CONCLUIDA', 3))
+
+    def test_recusa_arquivo_em_importacao_por_outro_upload(self):
+        em_andamento = iniciar_importacao('EMPRESAS', self.arquivo())
+        with self.assertRaisesMessage(ValueError, 'já em importação'):
+            self.importar()
+        self.assertEqual(Empresa.objects.count(), 0)
+
+        # Sem progresso há mais que o tempo limite, o upload interrompido é retomado
+        ImportacaoArquivo.objects.filter(pk=em_andamento.pk).update(
+            atualizada_em=timezone.now() - timedelta(hours=2)
+        )
+        self.assertEqual(self.importar()['importacao_id'], em_andamento.pk)
+        self.assertEqual(Empresa.objects.count(), 5)
+
+
+class GeracaoAlertasTest(TestCase):
+    """Geração em conjunto: sem duplicatas, contagem dos gravados e resolução automática"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.empresa = Empresa.objects.create(
+            cnpj='00000000000001', razao_social='Empresa 1 Ltda', cnae='6201', bairro='Centro', porte='ME'
+        )
+        cls.incentivo = Incentivo.objects.create(
+            empresa=cls.empresa, instrumento_legal='Decreto 1', tipo_incentivo='REDUCAO_ISS',
+            percentual_desconto=Decimal('30'), data_inicio=date(2024, 1, 1)
+        )
+
+    def setUp(self):
+        self.hoje = timezone.localdate()
+
+    def ativos(self, tipo):
+        return list(Alerta.objects.filter(tipo_alerta=tipo, status='ATIVO').values_list('empresa_id', flat=True))
+
+    def test_segunda_geracao_nao_duplica_alerta_ativo(self):
+        primeira = gerar_alertas(tipos=['SEM_RECOLHIMENTO'])
+        segunda = gerar_alertas(tipos=['SEM_RECOLHIMENTO'])
+        self.assertEqual(primeira['alertas'], [{'cnpj': self.empresa.cnpj, 'tipo': 'SEM_RECOLHIMENTO'}])
+        self.assertEqual(segunda['alertas'], [])
+        self.assertEqual(self.ativos('SEM_RECOLHIMENTO'), [self.empresa.cnpj])
+
+    def test_conta_apenas_alertas_gravados(self):
+        original = QuerySet.bulk_create
+
+        def geracao_simultanea(queryset, objs, *args, **kwargs):
+            # Outro processo grava o mesmo alerta entre a leitura dos ativos e o bulk_create
+            if queryset.model is Alerta:
+                Alerta.objects.create(empresa=self.empresa, tipo_alerta='SEM_RECOLHIMENTO', descricao='Outro processo')
+            return original(queryset, objs, *args, **kwargs)
+
+        with mock.patch.object(QuerySet, 'bulk_create', autospec=True, side_effect=geracao_simultanea):
+            resultado = gerar_alertas(tipos=['SEM_RECOLHIMENTO'])
+
+        self.assertEqual(resultado['alertas'], [])
+        self.assertEqual(self.ativos('SEM_RECOLHIMENTO'), [self.empresa.cnpj])
+        self.assertEqual(Alerta.objects.get(tipo_alerta='SEM_RECOLHIMENTO').descricao, 'Outro processo')
+
+    def test_resolve_alerta_cuja_condicao_deixou_de_ocorrer(self):
+        gerar_alertas(tipos=['SEM_RECOLHIMENTO'])
+        ArrecadacaoISS.objects.create(empresa=self.empresa, mes_ref=self.hoje.replace(day=1), valor_iss=Decimal('100'))
+
+        resultado = gerar_alertas(tipos=['SEM_RECOLHIMENTO'])
+
+        self.assertEqual((resultado['alertas'], resultado['resolvidos']), ([], 1))
+        alerta = Alerta.objects.get(tipo_alerta='SEM_RECOLHIMENTO')
+        self.assertEqual(alerta.status, 'RESOLVIDO')
+        self.assertIsNotNone(alerta.resolvido_em)
+
+    def test_contrapartida_vencida_pendente_mantem_alerta(self):
+        contrapartida = Contrapartida.objects.create(
+            incentivo=self.incentivo, descricao='Geração de empregos', tipo='EMPREGOS',
+            data_vencimento=self.hoje + timedelta(days=10)
+        )
+        self.assertEqual(len(gerar_alertas(tipos=['CONTRAPARTIDA_VENCENDO'])['alertas']), 1)
+
+        # Vencida e ainda PENDENTE: não dispara de novo, mas o alerta continua ativo
+        Contrapartida.objects.filter(pk=contrapartida.pk).update(data_vencimento=self.hoje - timedelta(days=5))
+        resultado = gerar_alertas(tipos=['CONTRAPARTIDA_VENCENDO'])
+        self.assertEqual((resultado['alertas'], resultado['resolvidos']), ([], 0))
+        self.assertEqual(self.ativos('CONTRAPARTIDA_VENCENDO'), [self.empresa.cnpj])
+
+        # Só deixa de estar ativo quando a contrapartida sai de PENDENTE
+        Contrapartida.objects.filter(pk=contrapartida.pk).update(status='CUMPRIDA')
+        self.assertEqual(gerar_alertas(tipos=['CONTRAPARTIDA_VENCENDO'])['resolvidos'], 1)
+        self.assertEqual(self.ativos('CONTRAPARTIDA_VENCENDO'), [])
+
+
+class TravaAgendamentoTest(TestCase):
+    """Só um servidor por vez executa cada tipo agendado; a trava vencida pode ser tomada"""
+
+    TIPO = 'GERAR_ALERTAS'
+
+    def setUp(self):
+        agendador.garantir_agendamentos([self.TIPO])
+
+    def test_segundo_servidor_nao_toma_trava_valida(self):
+        self.assertTrue(agendador.adquirir(self.TIPO, 'servidor-a'))
+        self.assertFalse(agendador.adquirir(self.TIPO, 'servidor-b'))
+        self.assertEqual(Agendamento.objects.get(tipo=self.TIPO).dono, 'servidor-a')
+
+    def test_trava_expirada_pode_ser_tomada(self):
+        self.assertTrue(agendador.adquirir(self.TIPO, 'servidor-a'))
+        Agendamento.objects.filter(tipo=self.TIPO).update(trava_expira_em=timezone.now() - timedelta(seconds=1))
+
+        self.assertTrue(agendador.adquirir(self.TIPO, 'servidor-b'))
+        self.assertEqual(Agendamento.objects.get(tipo=self.TIPO).dono, 'servidor-b')
+
+        # O dono anterior não solta a trava que já perdeu
+        agendador.liberar(self.TIPO, 'servidor-a', 60)
+        self.assertEqual(Agendamento.objects.get(tipo=self.TIPO).dono, 'servidor-b')
+
+    def test_trava_expira_com_o_tempo(self):
+        self.assertTrue(agendador.adquirir(self.TIPO, 'servidor-a'))
+        depois = timezone.now() + timedelta(minutes=settings.TAREFA_TIMEOUT_MINUTOS + 1)
+        with mock.patch('api.agendador.timezone.now', return_value=depois):
+            self.assertTrue(agendador.adquirir(self.TIPO, 'servidor-b'))
+
+    def test_liberada_so_volta_a_executar_no_proximo_horario(self):
+        self.assertTrue(agendador.adquirir(self.TIPO, 'servidor-a'))
+        agendador.liberar(self.TIPO, 'servidor-a', 60)
+        self.assertFalse(agendador.adquirir(self.TIPO, 'servidor-b'))
+        self.assertIsNone(Agendamento.objects.get(tipo=self.TIPO).trava_expira_em)
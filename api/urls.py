@@ -3,7 +3,7 @@ from rest_framework.routers import DefaultRouter
 from .views import (
     EmpresaViewSet, IncentivoViewSet, ArrecadacaoISSViewSet,
     ArrecadacaoIPTUViewSet, AlertaViewSet, CalculoImpactoViewSet,
-    DashboardViewSet
+    DashboardViewSet, TarefaViewSet, ImportacaoArquivoViewSet
 )
 
 router = DefaultRouter()
@@ -13,6 +13,8 @@ router.register(r'arrecadacao-iss', ArrecadacaoISSViewSet)
 router.register(r'arrecadacao-iptu', ArrecadacaoIPTUViewSet)
 router.register(r'alertas', AlertaViewSet)
 router.register(r'calculos-impacto', CalculoImpactoViewSet)
+router.register(r'tarefas', TarefaViewSet)
+router.register(r'importacoes', ImportacaoArquivoViewSet)
 router.register(r'dashboard', DashboardViewSet, basename='dashboard')
 
 urlpatterns = [
@@ -1,12 +1,8 @@
 """
 Funções auxiliares para o projeto
 """
-import random
+import zlib
 import logging
-from datetime import datetime, timedelta
-from decimal import Decimal
-from django.db.models import Sum
-from .models import Empresa, ArrecadacaoISS, Contrapartida, Alerta
 
 logger = logging.getLogger(__name__)
 
@@ -38,7 +34,8 @@ def determinar_porte_empresa(razao_social):
     if 'SA' in razao_social or 'S.A.' in razao_social:
         return 'GRANDE'
     elif 'Ltda' in razao_social:
-        return random.choice(['ME', 'EPP'])
+        # ME ou EPP conforme a razão social, sempre igual para a mesma empresa
+        return ('ME', 'EPP')[zlib.crc32(razao_social.encode()) % 2]
     else:
         return 'ME'
 
@@ -72,79 +69,26 @@ def criar_auditoria(usuario, acao, cnpj=None, detalhes=None, ip_address=None):
     Auditoria.objects.create(
         usuario=usuario if usuario and usuario.is_authenticated else None,
         acao=acao,
-        cnpj=cnpj,
-        detalhes=detalhes,
+        cnpj=cnpj or '',
+        detalhes=detalhes or '',
         ip_address=ip_address
     )
 
-def gerar_alerta_bc_baixo(empresa):
+def resumir_alteracoes(alteracoes):
     """
-    Gera alerta para B/C baixo
+    Resume {cnpj: {períodos}} alterados por um upload
     """
-    from .calculadora import CalculadoraImpactoFiscal
+    periodos = set()
+    for periodos_cnpj in alteracoes.values():
+        periodos.update(periodos_cnpj)
     
-    try:
-        calculadora = CalculadoraImpactoFiscal(empresa.cnpj)
-        calculo = calculadora.calcular_impacto_completo()
-        
-        if calculo and calculo['bc_ratio'] < 1:
-            alerta, created = Alerta.objects.get_or_create(
-                empresa=empresa,
-                tipo_alerta='BC_BAIXO',
-                status='ATIVO',
-                defaults={
-                    'descricao': f'Relação B/C abaixo de 1: {calculo["bc_ratio"]:.4f}',
-                    'severidade': 'ALTA'
-                }
-            )
-            return created
-    except Exception as e:
-        logger.error(f"Erro ao gerar alerta B/C para {empresa.cnpj}: {str(e)}")
-    
-    return False
-
-def gerar_alerta_sem_recolhimento(empresa):
-    """
-    Gera alerta para empresa sem recolhimento
-    """
-    tres_meses_atras = datetime.now().date() - timedelta(days=90)
-    
-    tem_recolhimento = ArrecadacaoISS.objects.filter(
-        empresa=empresa,
-        mes_ref__gte=tres_meses_atras,
-        valor_iss__gt=0
-    ).exists()
-    
-    if not tem_recolhimento:
-        alerta, created = Alerta.objects.get_or_create(
-            empresa=empresa,
-            tipo_alerta='SEM_RECOLHIMENTO',
-            status='ATIVO',
-            defaults={
-                'descricao': 'Empresa sem recolhimento de ISS nos últimos 3 meses',
-                'severidade': 'MEDIA'
-            }
-        )
-        return created
-    
-    return False
-
-def gerar_alerta_contrapartida_vencendo(contrapartida):
-    """
-    Gera alerta para contrapartida vencendo
-    """
-    alerta, created = Alerta.objects.get_or_create(
-        empresa=contrapartida.incentivo.empresa,
-        tipo_alerta='CONTRAPARTIDA_VENCENDO',
-        status='ATIVO',
-        defaults={
-            'descricao': f'Contrapartida vencendo em {contrapartida.data_vencimento}: {contrapartida.descricao}',
-            'severidade': 'ALTA'
-        }
-    )
-    return created
+    return {
+        'total_cnpjs': len(alteracoes),
+        'cnpjs': sorted(alteracoes),
+        'periodos': sorted(periodos)
+    }
 
-def formatar_response_upload(count, errors=None, tipo='registros'):
+def formatar_response_upload(count, errors=None, tipo='registros', alteracoes=None, contagem=None):
     """
     Formata resposta padrão para uploads
     """
@@ -153,7 +97,15 @@ def formatar_response_upload(count, errors=None, tipo='registros'):
         'total': count
     }
     
-    if errors and len(errors) <= 10:
-        response_data['errors'] = errors
+    if contagem is not None:
+        response_data.update(contagem)
+    
+    if alteracoes is not None:
+        response_data['alteracoes'] = resumir_alteracoes(alteracoes)
+    
+    if errors:
+        # Lista completa em /api/importacoes/<id>/erros/
+        response_data['errors'] = errors[:10]
+        response_data['total_erros'] = len(errors)
         
     return response_data
@@ -1,3 +1,5 @@
+import os
+import sys
 import pandas as pd
 import random
 from datetime import datetime, timedelta
@@ -27,8 +29,13 @@ portes = ['MEI', 'ME', 'EPP', 'MEDIA', 'GRANDE']
 bairros = ['Centro', 'Santa Cruz', 'Floresta', 'Cascavel Velho', 'Perímetro Urbano', 
            'Coqueiral', 'Brasmadeira', 'Lagoa', 'Pacaembu']
 
-# Ler CSV existente
-df_old = pd.read_csv('/home/vinicius/Documentos/qualquercoisa/Hackathon2025/api/media/empresas.csv')
+# Ler CSV existente (padrão: api/media/empresas.csv) e gravar ao lado deste script
+# Uso: python gerar_csv.py [entrada.csv] [saida.csv]
+DIRETORIO = os.path.dirname(os.path.abspath(__file__))
+entrada = sys.argv[1] if len(sys.argv) > 1 else os.path.join(DIRETORIO, '..', 'media', 'empresas.csv')
+saida = sys.argv[2] if len(sys.argv) > 2 else os.path.join(DIRETORIO, 'empresas_completo.csv')
+
+df_old = pd.read_csv(entrada)
 
 # Criar novo DataFrame com todas as colunas
 empresas_data = []
@@ -50,7 +57,7 @@ for _, row in df_old.iterrows():
     })
 
 df_empresas = pd.DataFrame(empresas_data)
-df_empresas.to_csv('empresas_completo.csv', index=False)
+df_empresas.to_csv(saida, index=False)
 
-print(f"✅ Gerado empresas_completo.csv com {len(df_empresas)} registros")
+print(f"✅ Gerado {saida} com {len(df_empresas)} registros")
 print(f"Colunas: {', '.join(df_empresas.columns)}")
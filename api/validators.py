@@ -2,6 +2,9 @@
 Validadores customizados para o projeto
 """
 import re
+import numpy as np
+import pandas as pd
+from django.conf import settings
 from django.core.exceptions import ValidationError
 from django.core.validators import RegexValidator
 
@@ -40,15 +43,72 @@ def validar_cnpj(cnpj):
     
     return cnpj
 
+PESOS_DV1 = np.array([5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2])
+PESOS_DV2 = np.array([6, 5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2])
+
+def digito_verificador(digitos, pesos):
+    """
+    Dígito verificador de cada linha de uma matriz de dígitos (uma linha
+    por CNPJ, com as colunas que entram no cálculo)
+    """
+    resto = (digitos * pesos).sum(axis=1) % 11
+    return np.where(resto < 2, 0, 11 - resto)
+
+def normalizar_cnpjs(serie):
+    """
+    Remove pontuação e espaços de uma coluna de CNPJs e completa com
+    zeros à esquerda os que perderam dígitos (ex.: lidos como número)
+    """
+    texto = serie.astype(str).str.replace(r'\.0$', '', regex=True)
+    digitos = texto.str.replace(r'[^0-9]', '', regex=True)
+    return digitos.where(digitos.str.len() == 0, digitos.str.zfill(14))
+
+def cnpjs_invalidos(serie):
+    """
+    Máscara das linhas com CNPJ inválido em uma coluna já normalizada,
+    conferindo os dois dígitos verificadores de uma vez
+    """
+    invalidos = serie.str.len().ne(14).to_numpy()
+    validos_tamanho = serie[~invalidos]
+    if len(validos_tamanho):
+        digitos = (
+            np.frombuffer(''.join(validos_tamanho).encode('ascii'), dtype=np.uint8)
+            .reshape(-1, 14).astype(np.int64) - ord('0')
+        )
+        repetidos = (digitos == digitos[:, :1]).all(axis=1)
+        dv1_errado = digitos[:, 12] != digito_verificador(digitos[:, :12], PESOS_DV1)
+        dv2_errado = digitos[:, 13] != digito_verificador(digitos[:, :13], PESOS_DV2)
+        invalidos[~invalidos] = repetidos | dv1_errado | dv2_errado
+    return pd.Series(invalidos, index=serie.index)
+
+# Extensões aceitas nos uploads (Parquet e Arrow requerem pyarrow)
+EXTENSOES_UPLOAD = ('.csv', '.parquet', '.arrow', '.feather')
+
 def validar_arquivo_csv(arquivo):
     """
-    Valida se o arquivo enviado é um CSV válido
+    Valida se o arquivo enviado é um CSV (ou Parquet/Arrow) válido
     """
-    if not arquivo.name.endswith('.csv'):
-        raise ValidationError('Apenas arquivos CSV são permitidos')
+    if not arquivo.name.lower().endswith(EXTENSOES_UPLOAD):
+        raise ValidationError('Apenas arquivos CSV, Parquet ou Arrow são permitidos')
     
-    if arquivo.size > 10 * 1024 * 1024:  # 10MB
-        raise ValidationError('Arquivo muito grande. Máximo 10MB')
+    return validar_tamanho_upload(arquivo)
+
+def validar_arquivo_pacote(arquivo):
+    """
+    Valida se o arquivo enviado é um pacote ZIP
+    """
+    if not arquivo.name.lower().endswith('.zip'):
+        raise ValidationError('Apenas arquivos ZIP são permitidos')
+    
+    return validar_tamanho_upload(arquivo)
+
+def validar_tamanho_upload(arquivo):
+    """
+    Valida o tamanho do arquivo enviado (settings.UPLOAD_TAMANHO_MAXIMO_MB)
+    """
+    limite_mb = settings.UPLOAD_TAMANHO_MAXIMO_MB
+    if arquivo.size > limite_mb * 1024 * 1024:
+        raise ValidationError(f'Arquivo muito grande. Máximo {limite_mb}MB')
     
     return arquivo
 
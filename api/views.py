@@ -4,31 +4,157 @@ from rest_framework.response import Response
 from rest_framework.permissions import AllowAny
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.filters import SearchFilter, OrderingFilter
-from django.db.models import Sum, Avg
-from django.http import HttpResponse
+from django.db.models import Sum, Avg, Count, Q
+from django.http import HttpResponse, StreamingHttpResponse
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.serializers.json import DjangoJSONEncoder
 from datetime import datetime
 import csv
+import json
 import logging
 
 from .models import (
     Empresa, Incentivo, ArrecadacaoISS, ArrecadacaoIPTU,
-    Contrapartida, Alerta, CalculoImpacto, Auditoria
+    Contrapartida, Alerta, CalculoImpacto, Auditoria, Tarefa, ImportacaoArquivo
 )
 from .serializers import (
     EmpresaSerializer, IncentivoSerializer,
     ArrecadacaoISSSerializer, ArrecadacaoIPTUSerializer,
     ContrapartidaSerializer, AlertaSerializer, CalculoImpactoSerializer,
-    AuditoriaSerializer, UploadCSVSerializer
+    AuditoriaSerializer, TarefaSerializer, ImportacaoArquivoSerializer, SimulacaoSerializer, UploadCSVSerializer
 )
-from .calculadora import CalculadoraImpactoFiscal
-from .services import CSVUploadService, AlertaService
+from .calculo_lote import CalculadoraImpactoLote
+from .acumulados import total_acumulado_empresas
+from .alteracoes import registrar_alteracao
+from . import alertas, cache, colunar, tarefas
+from .services import CSVUploadService, AlertaService, CalculoImpactoService
 from .utils import criar_auditoria
+from .ingestao import linhas_com_erro, linhas_com_erro_pacote
+from .validators import validar_arquivo_csv, validar_arquivo_pacote
 
 logger = logging.getLogger(__name__)
 
 
+def obter_arquivo_csv(request, validar=validar_arquivo_csv):
+    """Arquivo enviado (CSV, Parquet ou Arrow) e validado: retorna (arquivo, None) ou (None, resposta de erro)"""
+    if 'file' not in request.FILES:
+        return None, Response(
+            {'error': 'Nenhum arquivo enviado'}, 
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    try:
+        return validar(request.FILES['file']), None
+    except DjangoValidationError as e:
+        return None, Response({'error': e.messages[0]}, status=status.HTTP_400_BAD_REQUEST)
+
+
+def forcar_reprocessamento(request):
+    """?forcar=1 reprocessa um arquivo idêntico a uma importação já concluída"""
+    return request.query_params.get('forcar', '0') in ('1', 'true')
+
+
+def recalcular_apos_upload(request, result):
+    """Recalcula impacto e alertas dos CNPJs alterados pelo upload (desligue com ?recalcular=0)"""
+    if request.query_params.get('recalcular', '1') in ('0', 'false'):
+        result['recalculo'] = {'status': 'NAO_SOLICITADO'}
+        return
+    if result.get('duplicado'):
+        result['recalculo'] = {'status': 'SEM_ALTERACOES', 'empresas': 0, 'alertas_gerados': 0}
+        return
+    result['recalculo'] = CalculoImpactoService.recalcular_incremental(result['alteracoes']['cnpjs'])
+
+
+def upload_em_streaming(request, arquivo, tipo, concluir):
+    """
+    Com ?progresso=1, responde em NDJSON com os eventos do upload (um JSON
+    por linha) e chama `concluir(resultado)` ao final; senão retorna None
+    """
+    if request.query_params.get('progresso', '0') not in ('1', 'true'):
+        return None
+    
+    def eventos():
+        for evento in CSVUploadService.eventos_upload(arquivo, tipo, forcar_reprocessamento(request)):
+            if evento['evento'] == 'concluido':
+                yield json.dumps({'evento': 'finalizando'}) + '\n'
+                try:
+                    concluir(evento['resultado'])
+                except Exception as e:
+                    evento = {'evento': 'erro', 'error': str(e)}
+            yield json.dumps(evento, cls=DjangoJSONEncoder) + '\n'
+    
+    return StreamingHttpResponse(eventos(), content_type='application/x-ndjson')
+
+
+def enfileirar_se_assincrono(request, tipo, parametros=None):
+    """Com ?assincrono=1, enfileira a tarefa e retorna a resposta 202; senão retorna None"""
+    if request.query_params.get('assincrono', '0') not in ('1', 'true'):
+        return None
+    tarefa, criada = tarefas.enfileirar(tipo, parametros)
+    return Response(
+        {
+            'message': 'Tarefa enfileirada' if criada else 'Tarefa já em andamento',
+            'tarefa_id': tarefa.pk,
+            'status': tarefa.status
+        },
+        status=status.HTTP_202_ACCEPTED
+    )
+
+
+class RegistraAlteracaoMixin:
+    """Propaga as escritas feitas pela API para acumulados e cache de impacto"""
+    altera_arrecadacao = True
+    
+    def perform_create(self, serializer):
+        instance = serializer.save()
+        registrar_alteracao([instance.empresa_id], acumulados=self.altera_arrecadacao)
+    
+    def perform_update(self, serializer):
+        cnpj_anterior = serializer.instance.empresa_id
+        instance = serializer.save()
+        registrar_alteracao([cnpj_anterior, instance.empresa_id], acumulados=self.altera_arrecadacao)
+    
+    def perform_destroy(self, instance):
+        cnpj = instance.empresa_id
+        instance.delete()
+        registrar_alteracao([cnpj], acumulados=self.altera_arrecadacao)
+
+
+class ExportacaoColunarMixin:
+    """Ação exportar: linhas filtradas em Parquet (padrão) ou Arrow (?formato=arrow)"""
+    
+    @action(detail=False, methods=['get'])
+    def exportar(self, request):
+        formato = request.query_params.get('formato', 'parquet')
+        if formato not in colunar.CONTENT_TYPES:
+            return Response(
+                {'error': 'formato deve ser parquet ou arrow'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            conteudo = colunar.exportar(self.filter_queryset(self.get_queryset()), formato)
+        except ImportError as e:
+            return Response({'error': str(e)}, status=status.HTTP_501_NOT_IMPLEMENTED)
+        
+        tabela = self.get_queryset().model._meta.db_table
+        response = HttpResponse(conteudo, content_type=colunar.CONTENT_TYPES[formato])
+        response['Content-Disposition'] = f'attachment; filename="{tabela}.{formato}"'
+        
+        criar_auditoria(
+            request.user, 'EXPORTACAO',
+            detalhes=f'Exportação {formato} de {tabela}',
+            ip_address=request.META.get('REMOTE_ADDR')
+        )
+        
+        return response
+
+
 class EmpresaViewSet(viewsets.ModelViewSet):
-    queryset = Empresa.objects.all()
+    # O GROUP BY da contagem descarta o Meta.ordering: a ordem da paginação é explícita
+    queryset = Empresa.objects.annotate(
+        total_incentivos_ativos=Count('incentivos', filter=Q(incentivos__status='ATIVO'))
+    ).order_by('razao_social', 'cnpj')
     serializer_class = EmpresaSerializer
     filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
     filterset_fields = ['cnae', 'bairro', 'porte']
@@ -40,19 +166,24 @@ class EmpresaViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['post'], url_path='upload-csv')
     def upload_csv(self, request):
         """Upload de CSV de empresas"""
-        if 'file' not in request.FILES:
-            return Response(
-                {'error': 'Nenhum arquivo enviado'}, 
-                status=status.HTTP_400_BAD_REQUEST
-            )
+        arquivo, erro = obter_arquivo_csv(request)
+        if erro:
+            return erro
         
-        try:
-            result = CSVUploadService.processar_empresas_csv(request.FILES['file'])
+        def auditar(result):
             criar_auditoria(
                 request.user, 'UPLOAD', 
                 detalhes='Upload CSV empresas', 
                 ip_address=request.META.get('REMOTE_ADDR')
             )
+        
+        resposta = upload_em_streaming(request, arquivo, 'EMPRESAS', auditar)
+        if resposta:
+            return resposta
+        
+        try:
+            result = CSVUploadService.processar_empresas_csv(arquivo, forcar=forcar_reprocessamento(request))
+            auditar(result)
             return Response(result, status=status.HTTP_201_CREATED)
             
         except Exception as e:
@@ -65,8 +196,7 @@ class EmpresaViewSet(viewsets.ModelViewSet):
     def detalhe_completo(self, request, cnpj=None):
         """Retorna detalhamento completo da empresa"""
         empresa = self.get_object()
-        calculadora = CalculadoraImpactoFiscal(cnpj)
-        calculo = calculadora.calcular_impacto_completo()
+        calculo = cache.obter_impacto(cnpj)
         
         data = {
             'empresa': EmpresaSerializer(empresa).data,
@@ -114,8 +244,7 @@ class EmpresaViewSet(viewsets.ModelViewSet):
     def exportar_relatorio_pdf(self, request, cnpj=None):
         """Gera relatório executivo em formato JSON (PDF em produção)"""
         empresa = self.get_object()
-        calculadora = CalculadoraImpactoFiscal(cnpj)
-        calculo = calculadora.calcular_impacto_completo()
+        calculo = cache.obter_impacto(cnpj)
         
         relatorio = {
             'empresa': EmpresaSerializer(empresa).data,
@@ -127,25 +256,31 @@ class EmpresaViewSet(viewsets.ModelViewSet):
         return Response(relatorio)
 
 
-class IncentivoViewSet(viewsets.ModelViewSet):
-    queryset = Incentivo.objects.all()
+class IncentivoViewSet(RegistraAlteracaoMixin, ExportacaoColunarMixin, viewsets.ModelViewSet):
+    queryset = Incentivo.objects.select_related('empresa')
     serializer_class = IncentivoSerializer
     filter_backends = [DjangoFilterBackend, SearchFilter]
     filterset_fields = ['tipo_incentivo', 'status']
     search_fields = ['empresa__cnpj', 'empresa__razao_social']
     permission_classes = [AllowAny]
+    altera_arrecadacao = False
     
     @action(detail=False, methods=['post'], url_path='upload-csv')
     def upload_csv(self, request):
         """Upload de CSV de incentivos"""
-        if 'file' not in request.FILES:
-            return Response(
-                {'error': 'Nenhum arquivo enviado'}, 
-                status=status.HTTP_400_BAD_REQUEST
-            )
+        arquivo, erro = obter_arquivo_csv(request)
+        if erro:
+            return erro
+        
+        resposta = upload_em_streaming(
+            request, arquivo, 'INCENTIVOS', lambda result: recalcular_apos_upload(request, result)
+        )
+        if resposta:
+            return resposta
         
         try:
-            result = CSVUploadService.processar_incentivos_csv(request.FILES['file'])
+            result = CSVUploadService.processar_incentivos_csv(arquivo, forcar=forcar_reprocessamento(request))
+            recalcular_apos_upload(request, result)
             return Response(result, status=status.HTTP_201_CREATED)
             
         except Exception as e:
@@ -155,8 +290,8 @@ class IncentivoViewSet(viewsets.ModelViewSet):
             )
 
 
-class ArrecadacaoISSViewSet(viewsets.ModelViewSet):
-    queryset = ArrecadacaoISS.objects.all()
+class ArrecadacaoISSViewSet(RegistraAlteracaoMixin, ExportacaoColunarMixin, viewsets.ModelViewSet):
+    queryset = ArrecadacaoISS.objects.select_related('empresa')
     serializer_class = ArrecadacaoISSSerializer
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['empresa__cnpj', 'mes_ref']
@@ -165,14 +300,19 @@ class ArrecadacaoISSViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['post'], url_path='upload-csv')
     def upload_csv(self, request):
         """Upload de CSV de arrecadação ISS"""
-        if 'file' not in request.FILES:
-            return Response(
-                {'error': 'Nenhum arquivo enviado'}, 
-                status=status.HTTP_400_BAD_REQUEST
-            )
+        arquivo, erro = obter_arquivo_csv(request)
+        if erro:
+            return erro
+        
+        resposta = upload_em_streaming(
+            request, arquivo, 'ISS', lambda result: recalcular_apos_upload(request, result)
+        )
+        if resposta:
+            return resposta
         
         try:
-            result = CSVUploadService.processar_iss_csv(request.FILES['file'])
+            result = CSVUploadService.processar_iss_csv(arquivo, forcar=forcar_reprocessamento(request))
+            recalcular_apos_upload(request, result)
             return Response(result, status=status.HTTP_201_CREATED)
             
         except Exception as e:
@@ -182,22 +322,27 @@ class ArrecadacaoISSViewSet(viewsets.ModelViewSet):
             )
 
 
-class ArrecadacaoIPTUViewSet(viewsets.ModelViewSet):
-    queryset = ArrecadacaoIPTU.objects.all()
+class ArrecadacaoIPTUViewSet(RegistraAlteracaoMixin, viewsets.ModelViewSet):
+    queryset = ArrecadacaoIPTU.objects.select_related('empresa')
     serializer_class = ArrecadacaoIPTUSerializer
     permission_classes = [AllowAny]
     
     @action(detail=False, methods=['post'], url_path='upload-csv')
     def upload_csv(self, request):
         """Upload de CSV de arrecadação IPTU"""
-        if 'file' not in request.FILES:
-            return Response(
-                {'error': 'Nenhum arquivo enviado'}, 
-                status=status.HTTP_400_BAD_REQUEST
-            )
+        arquivo, erro = obter_arquivo_csv(request)
+        if erro:
+            return erro
+        
+        resposta = upload_em_streaming(
+            request, arquivo, 'IPTU', lambda result: recalcular_apos_upload(request, result)
+        )
+        if resposta:
+            return resposta
         
         try:
-            result = CSVUploadService.processar_iptu_csv(request.FILES['file'])
+            result = CSVUploadService.processar_iptu_csv(arquivo, forcar=forcar_reprocessamento(request))
+            recalcular_apos_upload(request, result)
             return Response(result, status=status.HTTP_201_CREATED)
             
         except Exception as e:
@@ -208,7 +353,7 @@ class ArrecadacaoIPTUViewSet(viewsets.ModelViewSet):
 
 
 class AlertaViewSet(viewsets.ModelViewSet):
-    queryset = Alerta.objects.all()
+    queryset = Alerta.objects.select_related('empresa')
     serializer_class = AlertaSerializer
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['tipo_alerta', 'severidade', 'status']
@@ -216,8 +361,23 @@ class AlertaViewSet(viewsets.ModelViewSet):
     
     @action(detail=False, methods=['post'], url_path='gerar-alertas')
     def gerar_alertas(self, request):
-        """Gera alertas automáticos baseados em regras"""
-        result = AlertaService.gerar_todos_alertas()
+        """
+        Gera alertas automáticos baseados em regras (em segundo plano com ?assincrono=1);
+        ?tipos=BC_BAIXO,SEM_RECOLHIMENTO limita às regras informadas
+        """
+        tipos = [tipo for tipo in request.query_params.get('tipos', '').split(',') if tipo] or None
+        desconhecidos = sorted(set(tipos or []) - set(alertas.REGRAS))
+        if desconhecidos:
+            return Response(
+                {'error': f'Tipos de alerta sem regra: {", ".join(desconhecidos)}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        resposta = enfileirar_se_assincrono(request, 'GERAR_ALERTAS', {'tipos': tipos})
+        if resposta:
+            return resposta
+        
+        result = AlertaService.gerar_todos_alertas(tipos=tipos)
         return Response(result)
     
     @action(detail=True, methods=['post'])
@@ -232,8 +392,8 @@ class AlertaViewSet(viewsets.ModelViewSet):
         return Response({'message': 'Alerta resolvido com sucesso'})
 
 
-class CalculoImpactoViewSet(viewsets.ReadOnlyModelViewSet):
-    queryset = CalculoImpacto.objects.all()
+class CalculoImpactoViewSet(ExportacaoColunarMixin, viewsets.ReadOnlyModelViewSet):
+    queryset = CalculoImpacto.objects.select_related('empresa')
     serializer_class = CalculoImpactoSerializer
     filter_backends = [DjangoFilterBackend, OrderingFilter]
     filterset_fields = ['empresa__cnpj']
@@ -242,28 +402,77 @@ class CalculoImpactoViewSet(viewsets.ReadOnlyModelViewSet):
     
     @action(detail=False, methods=['post'], url_path='calcular-todos')
     def calcular_todos(self, request):
-        """Calcula impacto para todas as empresas com incentivo ativo"""
-        empresas = Empresa.objects.filter(incentivos__status='ATIVO').distinct()
-        count = 0
-        errors = []
+        """Calcula impacto para todas as empresas com incentivo ativo (em segundo plano com ?assincrono=1)"""
+        try:
+            workers = int(request.query_params.get('workers', settings.CALCULO_WORKERS))
+        except ValueError:
+            return Response(
+                {'error': 'Parâmetro workers deve ser um número inteiro'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
-        for empresa in empresas:
-            try:
-                calculadora = CalculadoraImpactoFiscal(empresa.cnpj)
-                calculadora.calcular_impacto_completo()
-                count += 1
-            except Exception as e:
-                errors.append(f"Erro em {empresa.cnpj}: {str(e)}")
-                logger.error(f"Erro ao calcular {empresa.cnpj}: {str(e)}")
-        
-        response_data = {
-            'message': f'Calculado para {count} empresas',
-            'total': count
+        resposta = enfileirar_se_assincrono(request, 'CALCULAR_TODOS', {'workers': workers})
+        if resposta:
+            return resposta
+        
+        return Response(CalculoImpactoService.calcular_todos(workers=workers))
+    
+    @action(detail=False, methods=['post'])
+    def simular(self, request):
+        """
+        Simula CF, AI, B/C, payback e VPL com parâmetros de incentivo
+        alterados, sem gravar nada
+        """
+        serializer = SimulacaoSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        dados = serializer.validated_data
+        
+        ajustes = {
+            campo: dados[campo]
+            for campo in ['percentual_desconto', 'valor_fixo_desconto', 'baseline_iss_12m', 'baseline_iptu_12m']
+            if campo in dados
         }
-        if errors and len(errors) <= 10:
-            response_data['errors'] = errors
+        lote = CalculadoraImpactoLote(cnpjs=dados.get('cnpjs'), periodo_fim=dados.get('periodo_fim'))
+        atual, simulado = lote.simular(ajustes, dados.get('tipos_incentivo'), dados['taxa_desconto'])
         
-        return Response(response_data)
+        resultados = CalculadoraImpactoLote.para_dicts(simulado)
+        for resultado, tipo, vpl, bc_atual in zip(resultados, simulado['tipo_incentivo'], simulado['vpl'], atual['bc_ratio']):
+            resultado['tipo_incentivo'] = tipo
+            resultado['vpl'] = float(vpl)
+            resultado['bc_ratio_atual'] = float(bc_atual)
+        
+        return Response({
+            'ajustes': {campo: float(valor) for campo, valor in ajustes.items()},
+            'taxa_desconto': float(dados['taxa_desconto']),
+            'atual': CalculadoraImpactoLote.resumo(atual),
+            'simulado': CalculadoraImpactoLote.resumo(simulado),
+            'resultados': resultados
+        })
+    
+    @action(detail=False, methods=['get'], url_path='serie-mensal')
+    def serie_mensal(self, request):
+        """
+        Série mensal de CF, AI, impacto líquido e B/C acumulados desde o
+        início do incentivo (?cnpjs=a,b,c e opcionalmente ?meses=N)
+        """
+        cnpjs = [cnpj.strip() for cnpj in request.query_params.get('cnpjs', '').split(',') if cnpj.strip()]
+        if not cnpjs:
+            return Response(
+                {'error': 'Informe ao menos um CNPJ em cnpjs'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            meses = int(request.query_params['meses']) if 'meses' in request.query_params else None
+            if meses is not None and meses < 1:
+                raise ValueError
+        except ValueError:
+            return Response(
+                {'error': 'Parâmetro meses deve ser um número inteiro positivo'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        resultado = CalculadoraImpactoLote(cnpjs=cnpjs).calcular_serie_mensal(meses)
+        return Response(CalculadoraImpactoLote.series_para_dicts(resultado))
     
     @action(detail=False, methods=['get'])
     def ranking(self, request):
@@ -272,7 +481,7 @@ class CalculoImpactoViewSet(viewsets.ReadOnlyModelViewSet):
         limite = int(request.query_params.get('limite', 10))
         
         ordem = '-bc_ratio' if tipo == 'melhores' else 'bc_ratio'
-        calculos = CalculoImpacto.objects.order_by(ordem)[:limite]
+        calculos = CalculoImpacto.objects.select_related('empresa').order_by(ordem)[:limite]
         
         return Response(CalculoImpactoSerializer(calculos, many=True).data)
 
@@ -295,6 +504,10 @@ class DashboardViewSet(viewsets.ViewSet):
         
         total_alertas = Alerta.objects.filter(status='ATIVO').count()
         
+        arrecadacao = total_acumulado_empresas(
+            Incentivo.objects.filter(status='ATIVO').values('empresa_id')
+        )
+        
         return Response({
             'total_incentivos_ativos': total_incentivos,
             'total_empresas': total_empresas,
@@ -302,6 +515,8 @@ class DashboardViewSet(viewsets.ViewSet):
             'arrecadacao_incremental_total': float(agregados['arrecadacao_incremental_total'] or 0),
             'impacto_liquido_total': float(agregados['impacto_liquido_total'] or 0),
             'bc_medio': float(agregados['bc_medio'] or 0),
+            'arrecadacao_iss_total': float(arrecadacao['iss']),
+            'arrecadacao_iptu_total': float(arrecadacao['iptu']),
             'total_alertas_ativos': total_alertas
         })
 
@@ -314,6 +529,62 @@ class ContrapartidaViewSet(viewsets.ModelViewSet):
 
 
 class AuditoriaViewSet(viewsets.ReadOnlyModelViewSet):
-    queryset = Auditoria.objects.all()
+    queryset = Auditoria.objects.select_related('usuario')
     serializer_class = AuditoriaSerializer
     permission_classes = [AllowAny]
+
+
+class TarefaViewSet(viewsets.ReadOnlyModelViewSet):
+    queryset = Tarefa.objects.all()
+    serializer_class = TarefaSerializer
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = ['tipo', 'status']
+    permission_classes = [AllowAny]
+
+
+class ImportacaoArquivoViewSet(viewsets.ReadOnlyModelViewSet):
+    queryset = ImportacaoArquivo.objects.all()
+    serializer_class = ImportacaoArquivoSerializer
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = ['tipo', 'status', 'hash_conteudo']
+    permission_classes = [AllowAny]
+    
+    @action(detail=False, methods=['post'], url_path='upload-pacote')
+    def upload_pacote(self, request):
+        """Upload de ZIP com empresas, incentivos, ISS e IPTU, gravados numa única transação"""
+        arquivo, erro = obter_arquivo_csv(request, validar_arquivo_pacote)
+        if erro:
+            return erro
+        
+        try:
+            result = CSVUploadService.processar_pacote(arquivo, forcar=forcar_reprocessamento(request))
+            criar_auditoria(
+                request.user, 'UPLOAD',
+                detalhes=f"Upload pacote: {', '.join(result['arquivos'])}",
+                ip_address=request.META.get('REMOTE_ADDR')
+            )
+            recalcular_apos_upload(request, result)
+            return Response(result, status=status.HTTP_201_CREATED)
+            
+        except Exception as e:
+            return Response(
+                {'error': str(e)}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+    
+    @action(detail=True, methods=['get'])
+    def erros(self, request, pk=None):
+        """Lista completa de erros da importação em CSV"""
+        importacao = self.get_object()
+        response = HttpResponse(content_type='text/csv')
+        response['Content-Disposition'] = f'attachment; filename="erros_importacao_{importacao.pk}.csv"'
+        
+        writer = csv.writer(response)
+        if importacao.tipo == 'PACOTE':
+            writer.writerow(['Arquivo', 'Linha', 'Erro'])
+            writer.writerows(linhas_com_erro_pacote(importacao.erros))
+        else:
+            writer.writerow(['Linha', 'Erro'])
+            writer.writerows(linhas_com_erro(importacao.erros))
+        
+        return response
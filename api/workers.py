@@ -0,0 +1,23 @@
+"""
+Pontos de entrada dos processos de cálculo paralelo
+
+Este módulo não importa models no carregamento: os processos são criados
+com 'spawn' e precisam rodar django.setup() antes de tocar no ORM.
+"""
+
+
+def inicializar():
+    """Prepara o Django no processo do pool (cada um abre sua própria conexão)"""
+    import django
+    django.setup()
+
+
+def calcular_bloco(cnpjs, periodo_fim):
+    """Calcula, sem gravar, os indicadores de impacto de um bloco de CNPJs"""
+    from django.db import connections
+    from .calculo_lote import CalculadoraImpactoLote
+
+    try:
+        return CalculadoraImpactoLote(cnpjs=cnpjs, periodo_fim=periodo_fim).calcular()
+    finally:
+        connections.close_all()
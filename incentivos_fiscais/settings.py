@@ -84,6 +84,46 @@ DATABASES = {
 #     }
 # }
 
+# Cache - resultados de impacto fiscal (locmem ou arquivo)
+# Para compartilhar entre workers, use:
+# IMPACTO_CACHE_BACKEND=django.core.cache.backends.filebased.FileBasedCache
+# IMPACTO_CACHE_LOCATION=/var/tmp/incentivos_impacto
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'impacto': {
+        'BACKEND': config('IMPACTO_CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('IMPACTO_CACHE_LOCATION', default='impacto'),
+        'TIMEOUT': config('IMPACTO_CACHE_TIMEOUT', default=86400, cast=int),
+        'OPTIONS': {
+            'MAX_ENTRIES': config('IMPACTO_CACHE_MAX_ENTRIES', default=10000, cast=int),
+        },
+    },
+}
+IMPACTO_CACHE_LRU_MAX = config('IMPACTO_CACHE_LRU_MAX', default=1024, cast=int)
+
+# Cálculo em lote - processos usados por calcular-todos (1 = sem paralelismo)
+CALCULO_WORKERS = config('CALCULO_WORKERS', default=1, cast=int)
+CALCULO_TAMANHO_BLOCO = config('CALCULO_TAMANHO_BLOCO', default=500, cast=int)
+
+# Uploads de CSV: tamanho máximo e linhas lidas por vez
+UPLOAD_TAMANHO_MAXIMO_MB = config('UPLOAD_TAMANHO_MAXIMO_MB', default=4096, cast=int)
+UPLOAD_TAMANHO_BLOCO = config('UPLOAD_TAMANHO_BLOCO', default=50000, cast=int)
+
+# Tarefas em execução há mais que isso são consideradas interrompidas
+TAREFA_TIMEOUT_MINUTOS = config('TAREFA_TIMEOUT_MINUTOS', default=60, cast=int)
+
+# Agendador (comando `agendador`): intervalo de cada tarefa periódica (0 desliga)
+# e atraso aleatório somado a cada reagendamento
+AGENDADOR_INTERVALOS_MINUTOS = {
+    'CALCULAR_TODOS': config('AGENDADOR_CALCULO_MINUTOS', default=60, cast=int),
+    'GERAR_ALERTAS': config('AGENDADOR_ALERTAS_MINUTOS', default=60, cast=int),
+    'AQUECER_CACHE': config('AGENDADOR_CACHE_MINUTOS', default=30, cast=int),
+    'COMPACTAR_CALCULOS': config('AGENDADOR_COMPACTACAO_MINUTOS', default=1440, cast=int),
+}
+AGENDADOR_JITTER_SEGUNDOS = config('AGENDADOR_JITTER_SEGUNDOS', default=60, cast=int)
+
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
     {'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator'},
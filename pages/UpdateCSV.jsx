@@ -3,19 +3,59 @@ import { useState } from "react";
 
 export default function UploadCSV() {
   const [msg, setMsg] = useState("");
+  const [progresso, setProgresso] = useState(null);
+  const [errosUrl, setErrosUrl] = useState("");
 
-  const uploadFile = async (endpoint) => {
+  const uploadFile = async (id, endpoint) => {
     setMsg("");
-    const file = document.getElementById(endpoint).files[0];
+    setProgresso(null);
+    setErrosUrl("");
+    const file = document.getElementById(id).files[0];
     const formData = new FormData();
     formData.append("file", file);
+
+    // ?progresso=1: a resposta chega em NDJSON, um evento por linha
+    const headers = {};
+    if (api.defaults.headers.common["Authorization"]) {
+      headers["Authorization"] = api.defaults.headers.common["Authorization"];
+    }
     try {
-      const res = await api.post(endpoint, formData, {
-        headers: { "Content-Type": "multipart/form-data" },
+      const res = await fetch(`${api.defaults.baseURL}${endpoint}?progresso=1`, {
+        method: "POST",
+        body: formData,
+        headers,
       });
-      setMsg(JSON.stringify(res.data));
+      if (!res.ok) {
+        const data = await res.json();
+        setMsg("Erro no upload: " + (data.error || res.statusText));
+        return;
+      }
+
+      const reader = res.body.getReader();
+      const decoder = new TextDecoder();
+      let pendente = "";
+      for (;;) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        pendente += decoder.decode(value, { stream: true });
+        const linhas = pendente.split("\n");
+        pendente = linhas.pop();
+        for (const linha of linhas.filter(Boolean)) {
+          const evento = JSON.parse(linha);
+          if (evento.evento === "progresso") {
+            setProgresso(evento);
+          } else if (evento.evento === "concluido") {
+            setMsg(JSON.stringify(evento.resultado));
+            if (evento.resultado.total_erros) {
+              setErrosUrl(`${api.defaults.baseURL}/importacoes/${evento.resultado.importacao_id}/erros/`);
+            }
+          } else if (evento.evento === "erro") {
+            setMsg("Erro no upload: " + evento.error);
+          }
+        }
+      }
     } catch (err) {
-      setMsg("Erro no upload: " + (err?.response?.data?.error || err.message));
+      setMsg("Erro no upload: " + err.message);
     }
   };
 
@@ -24,23 +64,32 @@ export default function UploadCSV() {
       <h2>Upload de Base CSV</h2>
       <div>
         <label>Empresas:
-          <input type="file" id="empresas" accept=".csv" />
-          <button onClick={() => uploadFile("/empresas/upload-csv/")}>Upload Empresas</button>
+          <input type="file" id="empresas" accept=".csv,.parquet,.arrow,.feather" />
+          <button onClick={() => uploadFile("empresas", "/empresas/upload-csv/")}>Upload Empresas</button>
         </label>
       </div>
       <div>
         <label>Incentivos:
-          <input type="file" id="incentivos" accept=".csv" />
-          <button onClick={() => uploadFile("/incentivos/upload-csv/")}>Upload Incentivos</button>
+          <input type="file" id="incentivos" accept=".csv,.parquet,.arrow,.feather" />
+          <button onClick={() => uploadFile("incentivos", "/incentivos/upload-csv/")}>Upload Incentivos</button>
         </label>
       </div>
       <div>
         <label>Arrecadação ISS:
-          <input type="file" id="arrecadacao-iss" accept=".csv" />
-          <button onClick={() => uploadFile("/arrecadacao-iss/upload-csv/")}>Upload ISS</button>
+          <input type="file" id="arrecadacao-iss" accept=".csv,.parquet,.arrow,.feather" />
+          <button onClick={() => uploadFile("arrecadacao-iss", "/arrecadacao-iss/upload-csv/")}>Upload ISS</button>
         </label>
       </div>
+      {progresso && (
+        <div style={{ marginTop: 10 }}>
+          Bloco {progresso.bloco}: {progresso.linhas_lidas.toLocaleString("pt-br")} linhas lidas,{" "}
+          {progresso.linhas_gravadas.toLocaleString("pt-br")} gravadas,{" "}
+          {progresso.linhas_inalteradas.toLocaleString("pt-br")} inalteradas, {progresso.erros} erros
+          {progresso.linhas_por_segundo && ` (${progresso.linhas_por_segundo.toLocaleString("pt-br")} linhas/s)`}
+        </div>
+      )}
       <div style={{ marginTop: 10, color: "#660" }}>{msg}</div>
+      {errosUrl && <a href={errosUrl}>Baixar lista completa de erros</a>}
     </div>
   );
 }